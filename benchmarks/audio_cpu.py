@@ -0,0 +1,96 @@
+"""比較兩種播放路徑每條串流的 CPU 用量
+
+PCM 路徑：FFmpeg 解碼成 PCM，Python 端每 20 毫秒用 libopus 編碼一次（與語音客戶端相同）
+Opus 路徑：FFmpeg 直接複製 Opus 封包，Python 端只負責讀取
+
+用法：
+    python benchmarks/audio_cpu.py <檔案/串流URL/YouTube連結> [秒數]
+
+FFmpeg 不在 PATH 中時可用環境變數 FFMPEG_PATH 指定。
+"""
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+
+
+def resolve(source):
+    """YouTube 連結先用 yt-dlp 取得串流URL與音訊編碼"""
+    if not source.startswith(('http://', 'https://')) or 'googlevideo.com' in source:
+        return source, None
+    import yt_dlp
+    opts = {'format': 'bestaudio[acodec=opus]/bestaudio/best', 'quiet': True, 'no_warnings': True, 'noplaylist': True}
+    with yt_dlp.YoutubeDL(opts) as ytdl:
+        info = ytdl.extract_info(source, download=False)
+    return info['url'], info.get('acodec')
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(name, make_source, frames, encoder=None):
+    source = make_source()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    children_start = children_cpu()
+
+    count = 0
+    for _ in range(frames):
+        data = source.read()
+        if not data:
+            break
+        if encoder is not None:
+            encoder.encode(data, encoder.SAMPLES_PER_FRAME)
+        count += 1
+
+    python_cpu = time.process_time() - cpu_start
+    # 結束 FFmpeg 後才會計入子程序的 CPU 時間
+    source.cleanup()
+    ffmpeg_cpu = children_cpu() - children_start
+    wall = time.perf_counter() - wall_start
+
+    audio_seconds = count * 0.02
+    total = python_cpu + ffmpeg_cpu
+    print(f"{name:<12} 音訊 {audio_seconds:7.1f}s  耗時 {wall:6.2f}s  "
+          f"Python {python_cpu:6.3f}s  FFmpeg {ffmpeg_cpu:6.3f}s  "
+          f"合計 {total:6.3f}s  每分鐘音訊 {total / audio_seconds * 60 if audio_seconds else 0:6.3f}s CPU")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    url, acodec = resolve(sys.argv[1])
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 60
+    frames = int(seconds / 0.02)
+    executable = os.getenv('FFMPEG_PATH', 'ffmpeg')
+    if acodec:
+        print(f"來源音訊編碼: {acodec}")
+
+    if not discord.opus.is_loaded():
+        try:
+            discord.opus._load_default()
+        except Exception:
+            pass
+    if not discord.opus.is_loaded():
+        print("找不到 libopus，無法測試 PCM 路徑的編碼成本")
+        encoder = None
+    else:
+        encoder = discord.opus.Encoder()
+
+    if encoder is not None:
+        run('pcm', lambda: discord.FFmpegPCMAudio(url, executable=executable, options='-vn'), frames, encoder)
+    if acodec is None or acodec.startswith('opus'):
+        run('opus-copy', lambda: discord.FFmpegOpusAudio(url, codec='copy', executable=executable, options='-vn'), frames)
+    run('opus-ffmpeg', lambda: discord.FFmpegOpusAudio(url, executable=executable, options='-vn'), frames)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+"""離線測試音樂功能用的假物件：yt-dlp、語音連線、頻道與訊息
+
+install() 之後 MusicCog 的解析與播放都不會連線到網路，也不會啟動 FFmpeg。
+"""
+import asyncio
+import base64
+import hashlib
+import itertools
+import threading
+import time
+import types
+
+import discord
+import yt_dlp
+
+FRAME = b'\xf8\xff\xfe'  # 一個靜音的 Opus 音框
+
+
+class StubYoutubeDL:
+    """取代 yt_dlp.YoutubeDL，依設定的延遲回傳合成的解析結果
+
+    - ytsearch:<字串>：一筆搜尋結果
+    - 含 list=<數量> 的網址：扁平播放清單，每隔 page_size 筆多等一次延遲（模擬翻頁）
+    - 其他網址：完整的影片資訊（Opus 音軌、之後才過期的串流URL）
+    """
+    latency = 0.0
+    playlist_page_size = 100
+    duration = 180
+    calls = 0
+
+    def __init__(self, opts=None):
+        self.opts = opts or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @classmethod
+    def configure(cls, latency=None, playlist_page_size=None, duration=None):
+        if latency is not None:
+            cls.latency = latency
+        if playlist_page_size is not None:
+            cls.playlist_page_size = playlist_page_size
+        if duration is not None:
+            cls.duration = duration
+
+    @staticmethod
+    def video_id(seed):
+        # 與 YouTube 相同的 11 字元ID，同一個搜尋字串永遠得到同一首歌
+        return base64.urlsafe_b64encode(hashlib.sha1(str(seed).encode()).digest())[:11].decode()
+
+    def extract_info(self, url, download=False, process=True, ie_key=None):
+        StubYoutubeDL.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if url.startswith('ytsearch'):
+            query = url.split(':', 1)[1]
+            video_id = self.video_id(query)
+            return {'_type': 'playlist', 'entries': [
+                {'id': video_id, 'title': query, 'url': f'https://www.youtube.com/watch?v={video_id}'}
+            ]}
+        if 'list=' in url:
+            return self._playlist(url)
+        video_id = url.rsplit('=', 1)[-1][:11]
+        return {
+            'id': video_id, 'title': f'Track {video_id}', 'duration': self.duration,
+            'webpage_url': f'https://www.youtube.com/watch?v={video_id}',
+            'thumbnail': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg', 'acodec': 'opus',
+            'url': f'https://rr1.googlevideo.com/videoplayback?expire={int(time.time()) + 21600}&id={video_id}',
+        }
+
+    def _playlist(self, url):
+        count = int(url.rsplit('list=', 1)[1].split('&')[0])
+        latency, page_size, duration = self.latency, self.playlist_page_size, self.duration
+
+        def entries():
+            for i in range(count):
+                if i and latency and i % page_size == 0:
+                    time.sleep(latency)
+                yield {'id': f'pl{i:09d}', 'title': f'Playlist track {i}', 'duration': duration,
+                       'url': f'https://www.youtube.com/watch?v=pl{i:09d}'}
+
+        return {'_type': 'playlist', 'id': f'PL{count}', 'title': f'Benchmark playlist ({count})', 'entries': entries()}
+
+
+class FakeAudioSource(discord.AudioSource):
+    """取代 FFmpegOpusAudio/FFmpegPCMAudio：不啟動 FFmpeg，回傳固定數量的音框"""
+
+    frames = 250  # 預設每首 5 秒
+
+    def __init__(self, url, **kwargs):
+        self.url = url
+        self.kwargs = kwargs
+        self.remaining = self.frames
+
+    def read(self):
+        if self.remaining <= 0:
+            return b''
+        self.remaining -= 1
+        return FRAME
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        self.remaining = 0
+
+
+class FakeVoiceClient:
+    """模擬語音連線：play() 在背景執行緒讀取音頻源，讀完或 stop() 時在該執行緒呼叫 after
+
+    realtime=False 時不等待 20 毫秒的音框間隔，一首歌讀完就立刻換下一首，用來測量換歌延遲。
+    每次 after 到下一個音頻源送出第一個音框的時間記錄在 gaps。
+    realtime=True 時與 discord.py 的 AudioPlayer 一樣依固定的 20 毫秒排程送出音框；
+    比排程晚超過一個音框的次數（聽眾會聽到斷音）記錄在 late_frames，最大的延遲記錄在 max_lateness。
+    """
+
+    def __init__(self, channel, loop, realtime=False):
+        self.channel = channel
+        self.loop = loop
+        self.realtime = realtime
+        self.source = None
+        self.connected = True
+        self.plays = 0
+        self.gaps = []
+        self.frames = 0
+        self.late_frames = 0
+        self.max_lateness = 0.0
+        self._ended_at = None
+        self._stop = None
+        self._paused = threading.Event()
+        self._paused.set()
+        self._active = False
+
+    def is_connected(self):
+        return self.connected
+
+    def is_playing(self):
+        return self._active and self._paused.is_set()
+
+    def is_paused(self):
+        return self._active and not self._paused.is_set()
+
+    def play(self, source, after=None):
+        if self._active:
+            raise discord.ClientException('Already playing audio.')
+        self.source = source
+        self.plays += 1
+        self._active = True
+        self._stop = threading.Event()
+        threading.Thread(target=self._consume, args=(source, after, self._stop), daemon=True).start()
+
+    def _consume(self, source, after, stop):
+        first = True
+        start, loops = time.perf_counter(), 0
+        while not stop.is_set():
+            if not self._paused.is_set():
+                self._paused.wait()
+                # 恢復播放後重新計算排程
+                start, loops = time.perf_counter(), 0
+            if not source.read():
+                break
+            self.frames += 1
+            if first:
+                first = False
+                if self._ended_at is not None:
+                    self.gaps.append(time.perf_counter() - self._ended_at)
+                    self._ended_at = None
+            if self.realtime:
+                loops += 1
+                delay = start + 0.02 * loops - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -0.02:
+                    self.late_frames += 1
+                    self.max_lateness = max(self.max_lateness, -delay)
+        source.cleanup()
+        # 與 discord.py 相同：先標記為已結束再呼叫 after，after 裡可以直接播放下一首
+        self._active = False
+        self._ended_at = time.perf_counter()
+        if after is not None and self.connected:
+            after(None)
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+        self._paused.set()
+
+    def pause(self):
+        self._paused.clear()
+
+    def resume(self):
+        self._paused.set()
+
+    async def disconnect(self, force=False):
+        self.connected = False
+        self.stop()
+
+    async def move_to(self, channel):
+        self.channel = channel
+
+
+class FakeMessage:
+    _ids = itertools.count(1)
+
+    def __init__(self, channel, content=None, embed=None, view=None):
+        self.id = next(self._ids)
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.view = view
+
+    async def edit(self, **kwargs):
+        self.channel.edits += 1
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+        return self
+
+    async def delete(self):
+        self.channel.deleted += 1
+
+
+class FakeChannel:
+    """記錄送出、編輯與刪除次數的文字/語音頻道"""
+    _ids = itertools.count(10 ** 6)
+
+    def __init__(self, loop=None, name='benchmark', realtime=False):
+        self.id = next(self._ids)
+        self.name = name
+        self.loop = loop
+        self.realtime = realtime
+        self.sends = 0
+        self.edits = 0
+        self.deleted = 0
+        self.members = []
+
+    async def send(self, content=None, **kwargs):
+        self.sends += 1
+        return FakeMessage(self, content, kwargs.get('embed'), kwargs.get('view'))
+
+    async def connect(self, **kwargs):
+        return FakeVoiceClient(self, self.loop or asyncio.get_running_loop(), self.realtime)
+
+
+class FakeBot:
+    """MusicCog 需要的最少機器人介面；發送排程不套用 Discord 的速率限制，只測量程式本身的成本"""
+
+    def __init__(self):
+        from utils.idle import IdleScheduler
+        from utils.outbound import OutboundScheduler
+
+        self.loop = asyncio.get_running_loop()
+        self.outbound = OutboundScheduler(rate=10 ** 9, per=1)
+        self.idle = IdleScheduler(self._idle_disconnect)
+        self.guilds = {}
+        self.cogs = {}
+        self.owner_id = 1
+
+    async def _idle_disconnect(self, guild_id):
+        pass
+
+    def add_listener(self, func, name=None):
+        pass
+
+    def remove_listener(self, func, name=None):
+        pass
+
+    def get_cog(self, name):
+        return self.cogs.get(name)
+
+    def get_guild(self, guild_id):
+        return self.guilds.get(guild_id)
+
+    def get_channel(self, channel_id):
+        return None
+
+    async def wait_until_ready(self):
+        pass
+
+    def close(self):
+        self.idle.stop()
+        self.outbound.close()
+
+
+def make_context(bot, guild_id, realtime=False):
+    """建立一個使用者已在語音頻道中的指令上下文"""
+    text_channel = FakeChannel(bot.loop, 'text')
+    voice_channel = FakeChannel(bot.loop, 'voice', realtime)
+    guild = types.SimpleNamespace(id=guild_id, name=f'Benchmark {guild_id}', voice_client=None)
+    bot.guilds[guild_id] = guild
+    author = types.SimpleNamespace(id=42, bot=False, voice=types.SimpleNamespace(channel=voice_channel))
+    ctx = types.SimpleNamespace(
+        bot=bot, guild=guild, author=author, channel=text_channel, voice_client=None,
+        message=types.SimpleNamespace(author=author, channel=text_channel),
+    )
+    ctx.send = text_channel.send
+    return ctx
+
+
+def install():
+    """把 yt-dlp 與 FFmpeg 音頻源換成假物件（必須在建立 MusicCog 之前呼叫）"""
+    yt_dlp.YoutubeDL = StubYoutubeDL
+    discord.FFmpegOpusAudio = FakeAudioSource
+    discord.FFmpegPCMAudio = FakeAudioSource
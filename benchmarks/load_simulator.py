@@ -0,0 +1,438 @@
+"""多伺服器負載模擬：逐步增加同時播放的伺服器數量，找出一個行程的容量
+
+真正的 bot.py 機器人（包含所有 cog）透過假閘道登入，事件都經過 discord.py 的解析與分派：
+聊天訊息與指令走 on_message / on_command，使用者加入語音與切換靜音走 on_voice_state_update，
+控制面板的按鈕以 INTERACTION_CREATE 送出。yt-dlp、FFmpeg 與語音連線換成 benchmarks/fakes.py 的假物件，
+語音連線依 20 毫秒的排程在背景執行緒讀取音框，和真正的語音連線一樣會受 GIL 與 CPU 影響。
+
+每一階段先讓新的伺服器加入語音並點歌，等全部開始播放後，以固定的事件組合（聊天、$$play、$$queue、
+$$skip、按鈕、語音狀態）持續送出事件 --step-seconds 秒，並記錄：
+    事件迴圈延遲（p50/p99/最大）與阻塞次數
+    行程 CPU 使用率與 RSS（包含在另一個執行緒執行的假閘道）
+    比排程晚超過一個音框的比例（聽眾會聽到斷音）
+    各類事件的延遲：聊天=閘道送出到 on_message；指令=閘道送出到指令完成；
+    按鈕=閘道送出到機器人回應互動；語音狀態=閘道送出到 on_voice_state_update
+    （指令會送出訊息，所以包含每個頻道的發送速率限制造成的排隊時間）
+
+用法：
+    python benchmarks/load_simulator.py
+    python benchmarks/load_simulator.py --guilds 10,50,100,200 --step-seconds 30 --event-rate 0.5
+    python benchmarks/load_simulator.py --mix chat=0.6,play=0.1,queue=0.1,skip=0.05,button=0.1,voice=0.05
+
+結果寫成 JSON（預設 benchmarks/results/load-<時間>.json）。
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+# 單一行程、只使用記憶體：停用分片、叢集、快照、磁碟快取與指標端點
+for name in ('SHARD_COUNT', 'SHARD_IDS', 'CLUSTER_IPC', 'FAKE_GATEWAY', 'MUSIC_SESSION_DB',
+             'MUSIC_DISK_CACHE_DIR', 'MUSIC_CACHE_DB', 'METRICS_PORT'):
+    os.environ.pop(name, None)
+
+import discord  # noqa: E402
+
+import fakes  # noqa: E402
+
+fakes.install()
+
+import bot as bot_module  # noqa: E402
+from utils.fake_gateway import FakeGateway, use_fake_gateway  # noqa: E402
+from utils.loop_monitor import LoopMonitor, percentile  # noqa: E402
+
+DEFAULT_MIX = {'chat': 0.45, 'play': 0.15, 'queue': 0.1, 'skip': 0.1, 'button': 0.15, 'voice': 0.05}
+CHAT_MESSAGES = ('今天晚上要打163嗎？', '好', '等我一下', '哈哈哈', '194 幾點開？')
+# 不包含 ⏹️（停止後伺服器就不再播放）與 ⏮️
+PANEL_BUTTONS = ('⏯️', '⏭️', '🔁', '🔄')
+
+
+class SimVoiceClient(fakes.FakeVoiceClient):
+    """註冊到 discord.py 連線狀態的假語音連線，guild.voice_client 與 ctx.voice_client 都會找到它"""
+
+    def __init__(self, channel):
+        super().__init__(channel, asyncio.get_running_loop(), realtime=True)
+        self.guild = channel.guild
+        self.guild._state._add_voice_client(self.guild.id, self)
+
+    async def disconnect(self, force=False):
+        await super().disconnect(force)
+        self.guild._state._remove_voice_client(self.guild.id)
+
+
+async def connect_voice(channel, **kwargs):
+    return SimVoiceClient(channel)
+
+
+class GatewayThread:
+    """在另一個執行緒的事件迴圈中執行假閘道，它的成本不會算進機器人的事件迴圈延遲"""
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='fake-gateway', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return asyncio.run_coroutine_threadsafe(self.gateway.start(), self.loop).result()
+
+    def dispatch(self, event, data):
+        asyncio.run_coroutine_threadsafe(self.gateway.dispatch(0, event, data), self.loop)
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.gateway.stop(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        # 沒有 /proc 時只能取得最大值（Linux 以 KB 為單位）
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"未知的事件: {name}（可用: {', '.join(DEFAULT_MIX)}）")
+        mix[name] = float(weight)
+    return mix
+
+
+class LoadSimulator:
+    """透過假閘道送出事件，並以機器人上的監聽器量測每個事件的處理延遲"""
+
+    def __init__(self, bot, gateway, gateway_thread, mix, song_pool=200):
+        self.bot = bot
+        self.gateway = gateway
+        self.gateway_thread = gateway_thread
+        self.events, self.weights = zip(*mix.items())
+        self.song_pool = song_pool
+        self.active = []
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.error_samples = []
+        self._messages = {}  # 訊息ID -> (事件類型, 送出時間)
+        self._voice = {}  # 伺服器ID -> 送出時間
+        self._buttons = {}  # 互動ID -> (按鈕, 送出時間)
+        self._muted = {}
+        self._setup_done = {}
+        bot.add_listener(self.on_message, 'on_message')
+        bot.add_listener(self.on_command_completion, 'on_command_completion')
+        bot.add_listener(self.on_command_error, 'on_command_error')
+        bot.add_listener(self.on_voice_state_update, 'on_voice_state_update')
+
+    @property
+    def music(self):
+        return self.bot.get_cog('MusicCog')
+
+    # ---- 量測 ----
+
+    async def on_message(self, message):
+        entry = self._messages.get(str(message.id))
+        if entry is not None and entry[0] == 'chat':
+            del self._messages[str(message.id)]
+            self.latencies['chat'].append(time.perf_counter() - entry[1])
+
+    async def on_command_completion(self, ctx):
+        entry = self._messages.pop(str(ctx.message.id), None)
+        if entry is not None:
+            self.latencies[f'cmd:{ctx.command.name}'].append(time.perf_counter() - entry[1])
+        future = self._setup_done.pop(str(ctx.message.id), None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    async def on_command_error(self, ctx, error):
+        self._messages.pop(str(ctx.message.id), None)
+        name = ctx.command.name if ctx.command else 'unknown'
+        self.errors[name] += 1
+        if len(self.error_samples) < 5:
+            self.error_samples.append(f"{name}: {error}")
+        future = self._setup_done.pop(str(ctx.message.id), None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    async def on_voice_state_update(self, member, before, after):
+        started = self._voice.pop(member.guild.id, None)
+        if started is not None:
+            self.latencies['voice_state'].append(time.perf_counter() - started)
+
+    def collect_buttons(self):
+        """按鈕的延遲以假閘道收到互動回應的時間計算"""
+        unanswered = 0
+        for interaction_id, (name, started) in list(self._buttons.items()):
+            responded = self.gateway.responded_at.get(interaction_id)
+            if responded is None:
+                unanswered += 1
+                continue
+            self.latencies[f'button:{name}'].append(responded - started)
+            del self._buttons[interaction_id]
+        self._buttons.clear()
+        return unanswered
+
+    # ---- 事件 ----
+
+    def send(self, guild, content, kind):
+        payload = self.gateway.message_payload(guild, content)
+        self._messages[payload['id']] = (kind, time.perf_counter())
+        self.gateway_thread.dispatch('MESSAGE_CREATE', payload)
+        return payload['id']
+
+    def voice(self, guild, channel_id, self_mute=False):
+        self._voice[int(guild['id'])] = time.perf_counter()
+        self.gateway_thread.dispatch('VOICE_STATE_UPDATE', self.gateway.voice_state(guild, channel_id, self_mute))
+
+    def press(self, guild):
+        player = self.music.players.get(int(guild['id'])) if self.music else None
+        message = player.control_message if player else None
+        if message is None:
+            return False
+        buttons = self.gateway.buttons(message.id)
+        choices = [name for name in PANEL_BUTTONS if name in buttons]
+        if not choices:
+            return False
+        name = random.choice(choices)
+        payload = self.gateway.button_press(message.id, buttons[name])
+        self._buttons[payload['id']] = (name, time.perf_counter())
+        self.gateway_thread.dispatch('INTERACTION_CREATE', payload)
+        return True
+
+    def fire(self, guild, event):
+        if event == 'chat':
+            self.send(guild, random.choice(CHAT_MESSAGES), 'chat')
+        elif event == 'play':
+            self.send(guild, f'$$play load song {random.randrange(self.song_pool)}', 'command')
+        elif event == 'queue':
+            self.send(guild, '$$queue', 'command')
+        elif event == 'skip':
+            self.send(guild, '$$skip', 'command')
+        elif event == 'button':
+            if not self.press(guild):
+                self.send(guild, '$$player', 'command')
+        elif event == 'voice':
+            guild_id = int(guild['id'])
+            self._muted[guild_id] = not self._muted.get(guild_id, False)
+            self.voice(guild, guild_id + 2, self._muted[guild_id])
+
+    async def setup_guild(self, guild, songs=3, timeout=60):
+        """使用者加入語音頻道並點幾首歌，等到開始播放"""
+        guild_id = int(guild['id'])
+        self.voice(guild, guild_id + 2)
+        discord_guild = self.bot.get_guild(guild_id)
+        deadline = time.monotonic() + timeout
+        while discord_guild.get_member(int(self.gateway.owner['id'])) is None or \
+                discord_guild.get_member(int(self.gateway.owner['id'])).voice is None:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"伺服器 {guild_id} 沒有收到語音狀態")
+            await asyncio.sleep(0.01)
+        for i in range(songs):
+            future = asyncio.get_running_loop().create_future()
+            message_id = self.send(guild, f'$$play load song {guild_id % self.song_pool + i}', 'setup')
+            self._setup_done[message_id] = future
+            await asyncio.wait_for(future, timeout)
+        self.active.append(guild)
+
+    async def run_step(self, guilds, duration, event_rate, setup_concurrency=20):
+        # 新加入的伺服器先開始播放，不計入這一階段的量測
+        new = [g for g in self.gateway.guilds[:guilds] if g not in self.active]
+        semaphore = asyncio.Semaphore(setup_concurrency)
+
+        async def setup(guild):
+            async with semaphore:
+                await self.setup_guild(guild)
+
+        setup_started = time.perf_counter()
+        await asyncio.gather(*(setup(guild) for guild in new))
+        setup_seconds = time.perf_counter() - setup_started
+
+        voice_clients = [vc for vc in self.bot.voice_clients if isinstance(vc, SimVoiceClient)]
+        frames_before = {vc: (vc.frames, vc.late_frames) for vc in voice_clients}
+        for vc in voice_clients:
+            vc.max_lateness = 0.0
+        self.latencies.clear()
+        self.errors.clear()
+        self.error_samples.clear()
+
+        monitor = LoopMonitor(threshold=0.1, interval=0.05, window=duration + 10, log_interval=duration)
+        monitor.start()
+        cpu_before, wall_before = cpu_seconds(), time.perf_counter()
+
+        fired = 0
+        total_rate = event_rate * len(self.active)
+        while time.perf_counter() - wall_before < duration:
+            await asyncio.sleep(random.expovariate(total_rate))
+            self.fire(random.choice(self.active), random.choices(self.events, self.weights)[0])
+            fired += 1
+
+        wall = time.perf_counter() - wall_before
+        cpu = cpu_seconds() - cpu_before
+        lag = monitor.summary()
+        monitor.stop()
+        # 等待最後送出的事件處理完
+        await asyncio.sleep(1)
+        unanswered = self.collect_buttons()
+
+        frames = late = 0
+        max_lateness = 0.0
+        for vc in voice_clients:
+            before = frames_before.get(vc, (0, 0))
+            frames += vc.frames - before[0]
+            late += vc.late_frames - before[1]
+            max_lateness = max(max_lateness, vc.max_lateness)
+
+        latency = {}
+        for kind, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            latency[kind] = {
+                'count': len(ordered),
+                'p50_ms': percentile(ordered, 0.5) * 1000,
+                'p90_ms': percentile(ordered, 0.9) * 1000,
+                'p99_ms': percentile(ordered, 0.99) * 1000,
+                'max_ms': ordered[-1] * 1000,
+            }
+        return {
+            'guilds': len(self.active),
+            'playing': sum(1 for vc in voice_clients if vc.is_playing()),
+            'setup_seconds': setup_seconds,
+            'events': fired,
+            'events_per_second': fired / wall,
+            'loop_lag_ms': {key: lag[key] * 1000 for key in ('p50', 'p90', 'p99', 'max')},
+            'loop_blocks': lag['blocks'],
+            'cpu_percent': cpu / wall * 100,
+            'rss_mb': rss_mb(),
+            'audio': {
+                'frames': frames,
+                'late_frames': late,
+                'late_ratio': late / frames if frames else 0.0,
+                'max_lateness_ms': max_lateness * 1000,
+            },
+            'latency': latency,
+            'unanswered_buttons': unanswered,
+            'errors': dict(self.errors),
+            'error_samples': list(self.error_samples),
+        }
+
+
+def format_step(result):
+    lag, audio = result['loop_lag_ms'], result['audio']
+    lines = [
+        f"伺服器 {result['guilds']:>4}（播放中 {result['playing']}）  事件 {result['events_per_second']:6.1f}/s  "
+        f"迴圈延遲 p50 {lag['p50']:6.1f}ms p99 {lag['p99']:7.1f}ms 最大 {lag['max']:7.1f}ms  "
+        f"CPU {result['cpu_percent']:5.1f}%  RSS {result['rss_mb']:6.1f}MB  "
+        f"斷音 {audio['late_ratio']:.2%}（最大延遲 {audio['max_lateness_ms']:.0f}ms）"
+    ]
+    for kind, stats in result['latency'].items():
+        lines.append(f"    {kind:<22} n={stats['count']:<5} p50 {stats['p50_ms']:8.1f}ms  "
+                     f"p90 {stats['p90_ms']:8.1f}ms  p99 {stats['p99_ms']:8.1f}ms  最大 {stats['max_ms']:8.1f}ms")
+    if result['unanswered_buttons']:
+        lines.append(f"    未回應的按鈕: {result['unanswered_buttons']}")
+    if result['errors']:
+        lines.append(f"    指令錯誤: {result['errors']}  {result['error_samples']}")
+    return '\n'.join(lines)
+
+
+def capacity(results, max_lag_ms, max_late_ratio):
+    """沒有明顯斷音且事件迴圈延遲在門檻內的最大伺服器數量"""
+    ok = [r['guilds'] for r in results
+          if r['loop_lag_ms']['p99'] <= max_lag_ms and r['audio']['late_ratio'] <= max_late_ratio]
+    return max(ok, default=0)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--guilds', type=lambda v: sorted(int(x) for x in v.split(',') if x),
+                        default=[5, 20, 50], help='每一階段同時播放的伺服器數量')
+    parser.add_argument('--step-seconds', type=float, default=20, help='每一階段送出事件的時間')
+    parser.add_argument('--event-rate', type=float, default=0.5, help='每個伺服器每秒的事件數')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='事件比例，例如 chat=0.5,play=0.2,...')
+    parser.add_argument('--track-seconds', type=float, default=60, help='每首歌的長度')
+    parser.add_argument('--latency-ms', type=float, default=50, help='假 yt-dlp 每次解析的延遲')
+    parser.add_argument('--max-lag-ms', type=float, default=50, help='計算容量時容許的事件迴圈延遲 p99')
+    parser.add_argument('--max-late-ratio', type=float, default=0.01, help='計算容量時容許的斷音比例')
+    parser.add_argument('--seed', type=int, default=1, help='事件順序的亂數種子')
+    parser.add_argument('--output', help='結果 JSON 路徑（預設 benchmarks/results/load-<時間>.json）')
+    parser.add_argument('--verbose', action='store_true', help='顯示機器人本身的輸出')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    fakes.StubYoutubeDL.configure(latency=args.latency_ms / 1000, duration=int(args.track_seconds))
+    fakes.FakeAudioSource.frames = int(args.track_seconds * 50)
+    discord.VoiceChannel.connect = connect_voice
+
+    gateway = FakeGateway(guild_count=max(args.guilds), shard_count=1)
+    gateway.verbose = False
+    gateway_thread = GatewayThread(gateway)
+    use_fake_gateway(gateway_thread.start())
+
+    out = sys.stdout
+    bot = bot_module.bot
+    results = []
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        async with bot:
+            await bot_module.load_extensions()
+            runner = asyncio.create_task(bot.start('fake-token'))
+            await asyncio.wait_for(bot.wait_until_ready(), 60)
+            print(f"機器人已登入假閘道，{len(bot.guilds)} 個伺服器", file=out)
+
+            simulator = LoadSimulator(bot, gateway, gateway_thread, args.mix)
+            for guilds in args.guilds:
+                result = await simulator.run_step(guilds, args.step_seconds, args.event_rate)
+                results.append(result)
+                print(format_step(result), file=out)
+
+            for vc in list(bot.voice_clients):
+                await vc.disconnect()
+            await bot_module.close_bot()
+            await runner
+    gateway_thread.stop()
+
+    limit = capacity(results, args.max_lag_ms, args.max_late_ratio)
+    print(f"\n容量估計: {limit} 個同時播放的伺服器"
+          f"（迴圈延遲 p99 ≤ {args.max_lag_ms:g}ms，斷音 ≤ {args.max_late_ratio:.0%}）")
+
+    output_path = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f"load-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'options': {
+                'step_seconds': args.step_seconds, 'event_rate': args.event_rate, 'mix': args.mix,
+                'track_seconds': args.track_seconds, 'latency_ms': args.latency_ms,
+            },
+            'capacity': limit,
+            'steps': results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {output_path}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
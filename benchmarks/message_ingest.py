@@ -0,0 +1,62 @@
+"""測量 bot.on_message 每秒可以處理的訊息數
+
+不連線到 Discord：直接以假的訊息物件呼叫 on_message，送出的訊息只計數不傳送。
+
+用法：
+    python benchmarks/message_ingest.py [每種情境的訊息數]
+"""
+import asyncio
+import os
+import sys
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import bot as bot_module
+
+
+class FakeChannel:
+    id = 1
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+        return types.SimpleNamespace(id=self.sent, channel=self)
+
+
+def make_message(content, channel, is_bot=False):
+    author = types.SimpleNamespace(id=42, bot=is_bot)
+    guild = types.SimpleNamespace(id=7, voice_client=None)
+    return types.SimpleNamespace(content=content, author=author, guild=guild, channel=channel)
+
+
+async def measure(name, message, count):
+    on_message = bot_module.on_message
+    start = time.perf_counter()
+    for _ in range(count):
+        await on_message(message)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<14} {count / elapsed:>12,.0f} 則/秒  ({elapsed / count * 1e6:.2f} µs/則)")
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    channel = FakeChannel()
+    # 說明訊息只計算處理成本，不受發送排程的速率限制影響
+    bot_module.bot.outbound.rate = bot_module.bot.outbound.per = 10 ** 9
+
+    await measure('一般聊天', make_message('今天晚上要打163嗎？', channel), count)
+    await measure('機器人訊息', make_message('$$play test', channel, is_bot=True), count)
+    await measure('$$ 指令列表', make_message('$$', channel), count // 10)
+    await measure('$$help', make_message('$$help', channel), count // 10)
+    await asyncio.sleep(0)
+    bot_module.bot.outbound.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
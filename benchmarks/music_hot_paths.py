@@ -0,0 +1,352 @@
+"""離線測量 MusicCog 熱路徑的延遲與吞吐量
+
+不連線到 Discord、YouTube，也不啟動 FFmpeg：yt-dlp、語音連線與頻道都換成 benchmarks/fakes.py 的假物件，
+發送排程不套用速率限制，所以量到的是機器人本身的處理成本（加上設定的假解析延遲）。
+
+情境：
+    enqueue      $$play（搜尋字串，一半命中快取），多個伺服器同時加歌
+    playlist     $$playlist 匯入，到開始播放的時間與每秒加入的歌曲數
+    advance      換歌：上一首結束到下一首送出第一個音框的時間
+    queue        $$queue 顯示隊列第一頁
+    show_player  送出新的控制面板
+    update_player  狀態改變後重繪控制面板（不合併編輯）
+
+用法：
+    python benchmarks/music_hot_paths.py
+    python benchmarks/music_hot_paths.py --guilds 1,50 --queue-lengths 10,10000 --latency-ms 20
+    python benchmarks/music_hot_paths.py --only advance,update_player --compare benchmarks/results/上次.json
+
+結果寫成 JSON（預設 benchmarks/results/music-<時間>.json）；--compare 與之前的結果比較，
+p50 或 p99 變慢超過 --tolerance 時列出並以代碼 1 結束。
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+# 只測量記憶體中的路徑：停用快照、磁碟快取、快取資料庫與指標端點
+for name in ('MUSIC_SESSION_DB', 'MUSIC_DISK_CACHE_DIR', 'MUSIC_CACHE_DB', 'METRICS_PORT'):
+    os.environ.pop(name, None)
+
+import fakes  # noqa: E402
+
+fakes.install()
+
+from cogs.MusicCog import MusicCog  # noqa: E402
+from utils.loop_monitor import percentile  # noqa: E402
+from utils.player import Track  # noqa: E402
+
+SCENARIOS = ('enqueue', 'playlist', 'advance', 'queue', 'show_player', 'update_player')
+
+
+def summarize(scenario, params, samples, elapsed, count=None, **extra):
+    """把一組延遲樣本（秒）整理成一筆結果，時間單位為毫秒"""
+    ordered = sorted(samples)
+    count = count if count is not None else len(ordered)
+    return {
+        'scenario': scenario,
+        'params': params,
+        'count': count,
+        'throughput': count / elapsed if elapsed > 0 else 0.0,
+        'mean_ms': sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+        'p50_ms': percentile(ordered, 0.5) * 1000,
+        'p90_ms': percentile(ordered, 0.9) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+        'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+        **extra,
+    }
+
+
+@contextlib.asynccontextmanager
+async def music_cog():
+    bot = fakes.FakeBot()
+    cog = MusicCog(bot)
+    bot.cogs['MusicCog'] = cog
+    try:
+        yield bot, cog
+    finally:
+        for player in list(cog.players.values()):
+            if player.voice_client is not None:
+                await player.voice_client.disconnect()
+        cog.cog_unload()
+        bot.close()
+        await asyncio.sleep(0)
+
+
+def resolved_track(cog, index):
+    """已有有效串流URL的歌曲（與快取命中時相同）"""
+    info = fakes.StubYoutubeDL().extract_info(f'https://www.youtube.com/watch?v=bm{index:09d}')
+    cog.metadata_cache.put_info(info)
+    return Track.from_info(info)
+
+
+def fill_queue(cog, guild_id, length, resolved=0):
+    """隊列前 resolved 首已解析串流URL，其餘只有播放清單的基本資料"""
+    player = cog.get_player(guild_id)
+    # 倒序寫入快取，快取容量不足時被淘汰的是隊列後段
+    warm = [resolved_track(cog, i) for i in reversed(range(min(resolved, length)))][::-1]
+    for track in warm:
+        player.enqueue(track)
+    for i in range(len(warm), length):
+        player.enqueue(Track.from_entry({'id': f'pl{i:09d}', 'title': f'Queued track {i}', 'duration': 180}))
+    return player
+
+
+async def bench_enqueue(guilds, repeat, **_):
+    samples = []
+    async with music_cog() as (bot, cog):
+        async def run_guild(guild_id):
+            ctx = fakes.make_context(bot, guild_id, realtime=True)
+            for i in range(repeat):
+                # 每首歌出現兩次：第二次命中搜尋與歌曲資訊快取
+                started = time.perf_counter()
+                await cog.play.callback(cog, ctx, query=f'benchmark song {guild_id} {i // 2}')
+                samples.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_guild(guild_id) for guild_id in range(1, guilds + 1)))
+        elapsed = time.perf_counter() - started
+        queued = sum(len(player.queue) for player in cog.players.values())
+    return summarize('enqueue', {'guilds': guilds}, samples, elapsed, queued_tracks=queued)
+
+
+async def bench_playlist(guilds, playlist_size, **_):
+    totals, first_audio = [], []
+    async with music_cog() as (bot, cog):
+        async def run_guild(guild_id):
+            ctx = fakes.make_context(bot, guild_id, realtime=True)
+            started = time.perf_counter()
+            task = asyncio.create_task(
+                cog.playlist.callback(cog, ctx, f'https://www.youtube.com/playlist?list={playlist_size}')
+            )
+            while not task.done():
+                vc = cog.players[guild_id].voice_client if guild_id in cog.players else None
+                if vc is not None and vc.plays:
+                    first_audio.append(time.perf_counter() - started)
+                    break
+                await asyncio.sleep(0.001)
+            await task
+            totals.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_guild(guild_id) for guild_id in range(1, guilds + 1)))
+        elapsed = time.perf_counter() - started
+        added = sum(len(player.queue) + (player.current is not None) for player in cog.players.values())
+    ordered = sorted(first_audio)
+    return summarize(
+        'playlist', {'guilds': guilds, 'playlist_size': playlist_size}, totals, elapsed, count=added,
+        first_audio_p50_ms=percentile(ordered, 0.5) * 1000, first_audio_p99_ms=percentile(ordered, 0.99) * 1000,
+    )
+
+
+async def bench_advance(guilds, queue_length, repeat, **_):
+    # 每首歌只有幾個音框且不等待 20 毫秒間隔，播完立刻換下一首
+    fakes.FakeAudioSource.frames = 3
+    try:
+        async with music_cog() as (bot, cog):
+            contexts = {}
+            for guild_id in range(1, guilds + 1):
+                ctx = contexts[guild_id] = fakes.make_context(bot, guild_id)
+                player = fill_queue(cog, guild_id, max(queue_length, repeat + 2), resolved=repeat + 2)
+                await cog.ensure_voice(ctx)
+                player.ctx = ctx
+
+            started = time.perf_counter()
+            await asyncio.gather(*(cog.play_next(guild_id) for guild_id in contexts))
+            while any(cog.players[g].voice_client.plays <= repeat for g in contexts):
+                await asyncio.sleep(0.001)
+            elapsed = time.perf_counter() - started
+            samples = []
+            for guild_id in contexts:
+                vc = cog.players[guild_id].voice_client
+                samples.extend(vc.gaps[:repeat])
+                await vc.disconnect()
+    finally:
+        fakes.FakeAudioSource.frames = 250
+    return summarize('advance', {'guilds': guilds, 'queue_length': queue_length}, samples, elapsed)
+
+
+async def _with_playing_player(queue_length, body):
+    async with music_cog() as (bot, cog):
+        ctx = fakes.make_context(bot, 1, realtime=True)
+        player = fill_queue(cog, 1, queue_length)
+        player.voice_client = await ctx.author.voice.channel.connect()
+        player.ctx = ctx
+        track = resolved_track(cog, 0)
+        player.current = track
+        player.start_track(track)
+        return await body(bot, cog, ctx, player)
+
+
+async def bench_queue(queue_length, repeat, **_):
+    async def body(bot, cog, ctx, player):
+        samples = []
+        started = time.perf_counter()
+        for _ in range(repeat):
+            t = time.perf_counter()
+            await cog.queue.callback(cog, ctx)
+            samples.append(time.perf_counter() - t)
+        return samples, time.perf_counter() - started
+
+    samples, elapsed = await _with_playing_player(queue_length, body)
+    return summarize('queue', {'queue_length': queue_length}, samples, elapsed)
+
+
+async def bench_show_player(queue_length, repeat, **_):
+    async def body(bot, cog, ctx, player):
+        samples = []
+        started = time.perf_counter()
+        for _ in range(repeat):
+            t = time.perf_counter()
+            await cog.show_player(ctx)
+            samples.append(time.perf_counter() - t)
+        return samples, time.perf_counter() - started
+
+    samples, elapsed = await _with_playing_player(queue_length, body)
+    return summarize('show_player', {'queue_length': queue_length}, samples, elapsed)
+
+
+async def bench_update_player(queue_length, repeat, **_):
+    async def body(bot, cog, ctx, player):
+        # 不合併編輯：每次更新都擷取快照、比較並重繪
+        cog.panel.min_interval = 0
+        await cog.show_player(ctx)
+        samples = []
+        started = time.perf_counter()
+        for i in range(repeat):
+            player.set_loop(not player.loop)
+            t = time.perf_counter()
+            await cog.update_player(1)
+            samples.append(time.perf_counter() - t)
+        return samples, time.perf_counter() - started, dict(cog.panel.stats)
+
+    samples, elapsed, stats = await _with_playing_player(queue_length, body)
+    return summarize('update_player', {'queue_length': queue_length}, samples, elapsed,
+                     edits=stats['edits'], unchanged=stats['unchanged'])
+
+
+def plan(args):
+    """依參數展開要執行的 (情境, 函式, 參數)"""
+    runs = []
+    for scenario in args.only:
+        if scenario in ('enqueue', 'playlist'):
+            for guilds in args.guilds:
+                runs.append((scenario, {'guilds': guilds}))
+        elif scenario == 'advance':
+            for guilds in args.guilds:
+                for queue_length in args.queue_lengths:
+                    runs.append((scenario, {'guilds': guilds, 'queue_length': queue_length}))
+        else:
+            for queue_length in args.queue_lengths:
+                runs.append((scenario, {'queue_length': queue_length}))
+    return runs
+
+
+def format_result(result):
+    params = ' '.join(f"{key}={value}" for key, value in result['params'].items())
+    line = (f"{result['scenario']:<14} {params:<34} n={result['count']:<6} "
+            f"{result['throughput']:>10,.1f}/s  p50 {result['p50_ms']:8.3f}ms  p90 {result['p90_ms']:8.3f}ms  "
+            f"p99 {result['p99_ms']:8.3f}ms  max {result['max_ms']:8.3f}ms")
+    if 'first_audio_p50_ms' in result:
+        line += f"  首個音框 p50 {result['first_audio_p50_ms']:.1f}ms"
+    if 'edits' in result:
+        line += f"  編輯 {result['edits']}"
+    return line
+
+
+def result_key(result):
+    return result['scenario'], tuple(sorted(result['params'].items()))
+
+
+def compare(previous_path, results, tolerance):
+    """與之前的結果比較，回傳變慢超過 tolerance 的項目數"""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = {result_key(r): r for r in json.load(f)['results']}
+    regressions = 0
+    print(f"\n與 {previous_path} 比較（容許 {tolerance:.0%}）:")
+    for result in results:
+        before = previous.get(result_key(result))
+        if before is None:
+            continue
+        changes = []
+        for field in ('p50_ms', 'p99_ms'):
+            if before[field] > 0:
+                change = result[field] / before[field] - 1
+                changes.append(f"{field[:3]} {change:+.0%}")
+                if change > tolerance:
+                    regressions += 1
+                    changes[-1] += ' ⚠️'
+        params = ' '.join(f"{key}={value}" for key, value in result['params'].items())
+        print(f"  {result['scenario']:<14} {params:<34} " + '  '.join(changes))
+    return regressions
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', type=lambda v: [s for s in v.split(',') if s], default=list(SCENARIOS),
+                        help='只執行這些情境（逗號分隔）')
+    parser.add_argument('--guilds', type=int_list, default=[1, 20], help='同時使用的伺服器數量')
+    parser.add_argument('--queue-lengths', type=int_list, default=[10, 1000, 10000], help='隊列長度')
+    parser.add_argument('--repeat', type=int, default=100, help='每個伺服器/情境的重複次數')
+    parser.add_argument('--playlist-size', type=int, default=500, help='播放清單的歌曲數')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='假 yt-dlp 每次解析（與播放清單每頁）的延遲')
+    parser.add_argument('--output', help='結果 JSON 路徑（預設 benchmarks/results/music-<時間>.json）')
+    parser.add_argument('--compare', help='與之前的結果 JSON 比較')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='比較時容許變慢的比例')
+    parser.add_argument('--verbose', action='store_true', help='顯示機器人本身的輸出')
+    args = parser.parse_args()
+
+    unknown = set(args.only) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知的情境: {', '.join(sorted(unknown))}（可用: {', '.join(SCENARIOS)}）")
+    fakes.StubYoutubeDL.configure(latency=args.latency_ms / 1000)
+
+    functions = {name: globals()[f'bench_{name}'] for name in SCENARIOS}
+    results = []
+    for scenario, params in plan(args):
+        kwargs = {'repeat': args.repeat, 'playlist_size': args.playlist_size, **params}
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            result = await functions[scenario](**kwargs)
+        results.append(result)
+        print(format_result(result))
+
+    output_path = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f"music-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'options': {
+                'repeat': args.repeat, 'playlist_size': args.playlist_size, 'latency_ms': args.latency_ms,
+            },
+            'results': results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n結果已寫入 {output_path}")
+
+    if args.compare:
+        regressions = compare(args.compare, results, args.tolerance)
+        if regressions:
+            print(f"{regressions} 項變慢超過 {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -3,8 +3,14 @@ import os
 import asyncio
 import pytz
 import time
+from datetime import datetime
 from dotenv import load_dotenv
 from discord.ext import commands, tasks
+from utils.outbound import OutboundScheduler
+from utils.idle import IdleScheduler
+from utils.cluster import ClusterClient, parse_shard_ids
+from utils.metrics import registry, COMMAND_SECONDS
+from utils.loop_monitor import LoopMonitor
 
 load_dotenv()
 
@@ -15,96 +21,137 @@ intents.voice_states = True
 intents.guilds = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='$$', intents=intents)
+COMMAND_PREFIX = '$$'
+
+def create_bot():
+    """設定 SHARD_COUNT 時使用 AutoShardedBot（auto 表示使用 Discord 建議的分片數量）
+
+    叢集模式下由 launcher.py 設定 SHARD_COUNT / SHARD_IDS，每個行程只負責自己的分片，
+    音樂播放與閒置排程等伺服器狀態也就自然依分片分散在各行程中。
+    """
+    shard_count = os.getenv('SHARD_COUNT')
+    if not shard_count:
+        return commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
+    return commands.AutoShardedBot(
+        command_prefix=COMMAND_PREFIX,
+        intents=intents,
+        shard_count=None if shard_count == 'auto' else int(shard_count),
+        shard_ids=parse_shard_ids(os.getenv('SHARD_IDS')),
+    )
+
+bot = create_bot()
+bot.cluster = None  # 叢集模式下與啟動器的連線
 bot.timezone = pytz.timezone('Asia/Taipei')
 bot.start_time = time.time()  # Track when the bot started
-bot.voice_last_activity = {}  # Track last activity time for each server
+bot.outbound = OutboundScheduler()  # 所有 cog 共用的訊息發送排程（每頻道令牌桶 + 優先順序）
+bot.loop_monitor = LoopMonitor()  # 事件迴圈延遲與阻塞偵測
+
+# 視為語音活動的音樂指令
+MUSIC_COMMANDS = frozenset({
+    'join', 'play', 'playlist', 'pause', 'resume', 'skip', 'queue', 'clear', 'loop',
+    'leave', 'player', 'progress', 'shuffle', 'previous', 'history', 'stop', 'refresh',
+})
+
+def build_command_list_embed():
+    embed = discord.Embed(
+        title="可用指令列表",
+        description="以下是所有可用的指令：",
+        color=discord.Color.blue()
+    )
+    
+    embed.add_field(
+        name="🎵 音樂指令",
+        value="""
+        `$$join` - 加入語音頻道
+        `$$play <歌曲名稱或URL>` - 播放音樂
+        `$$playlist <List's URL>` - 播放清單音樂
+        `$$pause` - 暫停播放
+        `$$resume` - 繼續播放
+        `$$skip` - 跳過當前歌曲
+        `$$queue` - 查看播放隊列
+        `$$clear` - 清空播放隊列
+        `$$loop` - 切換循環模式
+        `$$leave` - 離開語音頻道
+        """,
+        inline=False
+    )
+    return embed
+
+def build_help_embed():
+    embed = discord.Embed(title="機器人指令幫助", description="以下是可用的命令列表", color=0x00ff00)
+    
+    # 音樂指令
+    embed.add_field(name="音樂指令", value="$$play [歌名或URL] - 播放音樂\n$$skip - 跳過當前歌曲\n$$pause - 暫停播放\n$$resume - 繼續播放\n$$stop - 停止播放並清空隊列\n$$queue - 顯示播放隊列\n$$clear - 清空播放隊列\n$$player - 顯示音樂播放器控制面板\n$$loop - 切換循環模式", inline=False)
+    return embed
+
+# 說明訊息只在啟動時建立一次，之後直接送出（不要修改這些物件）
+PREBUILT_EMBEDS = {
+    COMMAND_PREFIX: build_command_list_embed(),
+    COMMAND_PREFIX + 'help': build_help_embed(),
+}
+
+def touch_from_chat(guild_id, channel_id):
+    """在播放器綁定的文字頻道聊天也算語音活動（其他頻道的訊息不影響閒置期限）"""
+    music = bot.get_cog('MusicCog')
+    player = music.players.get(guild_id) if music else None
+    if player is not None and player.ctx is not None and player.ctx.channel.id == channel_id:
+        bot.idle.touch(guild_id)
 
 @bot.event
 async def on_message(message):
     if message.author.bot:
         return
+    guild = message.guild
+    if guild is not None and guild.id in bot.idle:
+        touch_from_chat(guild.id, message.channel.id)
 
-    # 更新語音頻道活動時間
-    if message.guild and message.guild.id in bot.voice_last_activity:
-        guild_id = message.guild.id
-        voice_client = message.guild.voice_client
-        if voice_client and voice_client.is_connected():
-            bot.voice_last_activity[guild_id] = time.time()
-
-    if message.content == '$$':
-        embed = discord.Embed(
-            title="可用指令列表",
-            description="以下是所有可用的指令：",
-            color=discord.Color.blue()
-        )
-        
-        embed.add_field(
-            name="🎵 音樂指令",
-            value="""
-            `$$join` - 加入語音頻道
-            `$$play <歌曲名稱或URL>` - 播放音樂
-            `$$playlist <List's URL>` - 播放清單音樂
-            `$$pause` - 暫停播放
-            `$$resume` - 繼續播放
-            `$$skip` - 跳過當前歌曲
-            `$$queue` - 查看播放隊列
-            `$$clear` - 清空播放隊列
-            `$$loop` - 切換循環模式
-            `$$leave` - 離開語音頻道
-            """,
-            inline=False
-        )
-         
-        await message.channel.send(embed=embed)
+    # 絕大多數訊息不是指令，只做一次前綴檢查就返回
+    content = message.content
+    if not content.startswith(COMMAND_PREFIX):
         return
 
-    elif message.content == "$$help":
-        # 建立嵌入式訊息
-        embed = discord.Embed(title="機器人指令幫助", description="以下是可用的命令列表", color=0x00ff00)
-        
-        # 音樂指令
-        embed.add_field(name="音樂指令", value="$$play [歌名或URL] - 播放音樂\n$$skip - 跳過當前歌曲\n$$pause - 暫停播放\n$$resume - 繼續播放\n$$stop - 停止播放並清空隊列\n$$queue - 顯示播放隊列\n$$clear - 清空播放隊列\n$$player - 顯示音樂播放器控制面板\n$$loop - 切換循環模式", inline=False)
-        
-        # 發送嵌入式訊息
-        await message.channel.send(embed=embed)
+    embed = PREBUILT_EMBEDS.get(content)
+    if embed is not None:
+        await bot.outbound.send(message.channel, embed=embed)
+        return
 
     await bot.process_commands(message)
 
 @bot.event
 async def on_voice_state_update(member, before, after):
     """當用戶在語音頻道中的狀態改變時觸發"""
+    guild_id = member.guild.id
     if member.bot:
+        if member == bot.user and after.channel is None:
+            # 機器人已離開語音頻道
+            bot.idle.remove(guild_id)
         return
         
-    if member.guild.id in bot.voice_last_activity:
-        # 更新該伺服器的最後活動時間
-        bot.voice_last_activity[member.guild.id] = time.time()
-
-@tasks.loop(seconds=60)
-async def check_voice_activity():
-    """定期檢查語音頻道活動，如果30分鐘內無活動則退出"""
-    current_time = time.time()
-    timeout_duration = 30 * 60  # 30分鐘超時
+    if guild_id in bot.idle:
+        voice_client = member.guild.voice_client
+        if voice_client and voice_client.is_connected() and \
+                not any(not m.bot for m in voice_client.channel.members):
+            # 頻道裡已經沒有其他人，立即視為閒置
+            bot.idle.expire_now(guild_id)
+        else:
+            # 更新該伺服器的最後活動時間
+            bot.idle.touch(guild_id)
+
+async def disconnect_idle(guild_id):
+    """閒置期限到達時離開語音頻道"""
+    guild = bot.get_guild(guild_id)
+    voice_client = guild.voice_client if guild else None
+    if not voice_client or not voice_client.is_connected():
+        return
     
-    for guild in bot.guilds:
-        if guild.id in bot.voice_last_activity:
-            voice_client = guild.voice_client
-            
-            # 檢查機器人是否在語音頻道中
-            if voice_client and voice_client.is_connected():
-                last_activity = bot.voice_last_activity[guild.id]
-                
-                # 如果超過30分鐘無活動，退出頻道
-                if current_time - last_activity > timeout_duration:
-                    await voice_client.disconnect()
-                    print(f"已自動退出 {guild.name} 的語音頻道 (30分鐘無活動)")
-                    del bot.voice_last_activity[guild.id]
-
-@check_voice_activity.before_loop
-async def before_check_voice_activity():
-    """等待機器人啟動完成再開始檢查"""
-    await bot.wait_until_ready()
+    # 先清除音樂播放狀態，避免斷線後繼續播放下一首
+    music = bot.get_cog('MusicCog')
+    if music:
+        music.destroy_player(guild_id)
+    await voice_client.disconnect()
+    print(f"已自動退出 {guild.name} 的語音頻道 ({bot.idle.timeout_for(guild_id) / 60:.0f}分鐘無活動)")
+
+bot.idle = IdleScheduler(disconnect_idle)  # 每個伺服器的閒置期限
 
 @bot.event
 async def on_ready():
@@ -116,58 +163,196 @@ async def on_ready():
         name="$$ | $$help"
     )
     await bot.change_presence(activity=activity)
-    
-    # 啟動自動檢查語音活動的任務
-    check_voice_activity.start()
+
+EXTENSION_ACTIONS = {
+    'load': ('load_extension', 'Loaded', 'loading'),
+    'unload': ('unload_extension', 'Unloaded', 'unloading'),
+    'reload': ('reload_extension', 'Reloaded', 'reloading'),
+}
+
+async def extension_action(action, extension):
+    method, done, doing = EXTENSION_ACTIONS[action]
+    try:
+        await getattr(bot, method)(f"cogs.{extension}")
+        return f"{done} {extension} done."
+    except Exception as e:
+        return f"Error {doing} {extension}: {str(e)}"
+
+def format_cluster_results(results, format_result=str):
+    return "\n".join(
+        f"[cluster {item['cluster']}] " + (format_result(item['result']) if 'result' in item else f"錯誤: {item['error']}")
+        for item in results
+    )
+
+async def run_extension_action(ctx, action, extension):
+    """叢集模式下對所有行程執行，並彙整每個行程的結果"""
+    if bot.cluster is None:
+        await ctx.send(await extension_action(action, extension))
+        return
+    results = await bot.cluster.broadcast(action, extension)
+    await ctx.send(format_cluster_results(results))
 
 # 載入指令程式檔案
 @bot.command()
 @commands.is_owner() 
 async def load(ctx, extension):
-    try:
-        await bot.load_extension(f"cogs.{extension}")
-        await ctx.send(f"Loaded {extension} done.")
-    except Exception as e:
-        await ctx.send(f"Error loading {extension}: {str(e)}")
+    await run_extension_action(ctx, 'load', extension)
 
 # 卸載指令檔案
 @bot.command()
 @commands.is_owner() 
 async def unload(ctx, extension):
-    try:
-        await bot.unload_extension(f"cogs.{extension}")
-        await ctx.send(f"Unloaded {extension} done.")
-    except Exception as e:
-        await ctx.send(f"Error unloading {extension}: {str(e)}")
+    await run_extension_action(ctx, 'unload', extension)
 
 
 # 重新載入程式檔案
 @bot.command()
 @commands.is_owner() 
 async def reload(ctx, extension):
-    try:
-        await bot.reload_extension(f"cogs.{extension}")
-        await ctx.send(f"Reloaded {extension} done.")
-    except Exception as e:
-        await ctx.send(f"Error reloading {extension}: {str(e)}")
+    await run_extension_action(ctx, 'reload', extension)
+
+@bot.command()
+@commands.is_owner()
+async def outbound(ctx):
+    """顯示訊息發送排程的隊列深度與速率限制統計"""
+    stats = bot.outbound.stats
+    depth = bot.outbound.queue_depth()
+    lines = [f"排隊中: " + " / ".join(f"{name} {count}" for name, count in depth.items())]
+    lines.extend(f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}" for name, value in stats.items())
+    await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+@bot.command()
+@commands.is_owner()
+async def looplag(ctx, stack: str = None):
+    """顯示最近的事件迴圈延遲百分位數與阻塞紀錄，looplag stack 顯示最近一次阻塞的堆疊"""
+    monitor = bot.loop_monitor
+    if not monitor.enabled:
+        await ctx.send("事件迴圈監視已停用（LOOP_LAG_THRESHOLD=0）")
+        return
+    summary = monitor.summary()
+    lines = [
+        f"最近 {monitor.window / 60:g} 分鐘（{summary['samples']} 個樣本）: "
+        f"p50 {summary['p50'] * 1000:.1f}ms / p90 {summary['p90'] * 1000:.1f}ms / "
+        f"p99 {summary['p99'] * 1000:.1f}ms / 最大 {summary['max'] * 1000:.0f}ms",
+        f"阻塞超過 {monitor.threshold * 1000:.0f}ms: {summary['blocks']} 次",
+    ]
+    reports = monitor.snapshot()
+    for report in reversed(reports):
+        when = datetime.fromtimestamp(report.at, bot.timezone).strftime('%m-%d %H:%M:%S')
+        lines.append(f"{when} 阻塞 {report.blocked:.2f}s，任務 {report.task or '無'}")
+    if stack == 'stack' and reports:
+        # 只保留最內層的幾個呼叫，避免超過訊息長度限制
+        lines.append("")
+        lines.append(reports[-1].stack[-1500:])
+    await ctx.send("```\n" + "\n".join(lines)[-1990:] + "\n```")
+
+@bot.command()
+@commands.guild_only()
+@commands.has_guild_permissions(manage_guild=True)
+async def idletimeout(ctx, minutes: str = None):
+    """查看或設定這個伺服器的語音閒置逾時（分鐘），default 恢復預設值
+
+    音樂指令、語音頻道的狀態變化，以及在播放器所在文字頻道的聊天都會重新計算期限。
+    """
+    guild_id = ctx.guild.id
+    if minutes is not None:
+        if minutes.lower() == 'default':
+            bot.idle.set_timeout(guild_id, None)
+        else:
+            try:
+                value = float(minutes)
+            except ValueError:
+                await ctx.send("請輸入分鐘數，或 default 恢復預設值")
+                return
+            if value <= 0:
+                await ctx.send("逾時必須大於 0 分鐘")
+                return
+            bot.idle.set_timeout(guild_id, value * 60)
+    await ctx.send(f"語音閒置逾時: {bot.idle.timeout_for(guild_id) / 60:g} 分鐘")
+
+def process_stats():
+    music = bot.get_cog('MusicCog')
+    return {
+        'shards': sorted(bot.shards) if isinstance(bot, commands.AutoShardedBot) else [bot.shard_id or 0],
+        'guilds': len(bot.guilds),
+        'voice': len(bot.voice_clients),
+        'players': len(music.players) if music else 0,
+        'latency': bot.latency,
+        'loop_lag_p99': bot.loop_monitor.summary()['p99'],
+        'uptime': time.time() - bot.start_time,
+        'pid': os.getpid(),
+    }
+
+def format_stats(stats):
+    return (
+        f"分片 {stats['shards'][0]}-{stats['shards'][-1]}，伺服器 {stats['guilds']}，語音 {stats['voice']}，"
+        f"播放器 {stats['players']}，延遲 {stats['latency'] * 1000:.0f}ms，"
+        f"迴圈延遲 p99 {stats.get('loop_lag_p99', 0) * 1000:.0f}ms，PID {stats['pid']}"
+    )
+
+@bot.command()
+@commands.is_owner()
+async def clusters(ctx):
+    """顯示每個行程（叢集）負責的分片與伺服器數量"""
+    if bot.cluster is None:
+        await ctx.send("```\n" + format_stats(process_stats()) + "\n```")
+        return
+    results = await bot.cluster.broadcast('stats')
+    total = sum(item['result']['guilds'] for item in results if 'result' in item)
+    await ctx.send("```\n" + format_cluster_results(results, format_stats) + f"\n合計伺服器: {total}\n```")
+
+async def close_bot():
+    bot.idle.stop()  # 停止閒置排程
+    bot.loop_monitor.stop()
+    await registry.stop()
+    await bot.close()
 
 @bot.command()
 @commands.is_owner()
 async def shutdown(ctx):
     await ctx.send("Shutdown...")
-    check_voice_activity.cancel()  # 取消定時任務
-    await bot.close()
+    if bot.cluster is not None:
+        # 由啟動器通知所有行程關閉（包含這個行程）
+        await bot.cluster.broadcast('shutdown')
+        return
+    await close_bot()
 
 # 更新音樂相關命令的處理器，記錄活動時間
 @bot.listen()
 async def on_command(ctx):
     """當命令被調用時更新語音活動時間"""
     # 只更新語音相關命令
-    music_commands = ['join', 'play', 'playlist', 'pause', 'resume', 
-                      'skip', 'queue', 'clear', 'loop', 'leave', 'player']
-    
-    if ctx.command.name in music_commands and ctx.guild:
-        bot.voice_last_activity[ctx.guild.id] = time.time()
+    if ctx.guild and ctx.command.name in MUSIC_COMMANDS:
+        bot.idle.touch(ctx.guild.id)
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.metrics_started = time.perf_counter()
+
+@bot.after_invoke
+async def record_command_time(ctx):
+    """記錄指令處理時間（包含等待解析與發送訊息），失敗的指令另外標記"""
+    started = getattr(ctx, 'metrics_started', None)
+    if started is not None:
+        COMMAND_SECONDS.observe(time.perf_counter() - started, ctx.command.name, 'error' if ctx.command_failed else 'ok')
+
+def collect_outbound_metrics():
+    stats = bot.outbound.stats
+    return [
+        ('bot_outbound_messages_total', 'counter', '訊息發送排程送出的請求', [
+            ({'result': key}, stats[key]) for key in ('sent', 'edited', 'failed')
+        ]),
+        ('bot_outbound_rate_limited_total', 'counter', '遇到的速率限制', [
+            ({'scope': 'route'}, stats['rate_limited']), ({'scope': 'global'}, stats['global_rate_limited']),
+        ]),
+        ('bot_outbound_queue_depth', 'gauge', '排隊中的訊息', [
+            ({'priority': name}, count) for name, count in bot.outbound.queue_depth().items()
+        ]),
+        ('bot_voice_connections', 'gauge', '語音連線數量', [({}, len(bot.voice_clients))]),
+        ('bot_latency_seconds', 'gauge', '閘道心跳延遲', [({}, bot.latency)]),
+    ]
+
+registry.collector('outbound', collect_outbound_metrics)
 
 # 一開始bot開機需載入全部程式檔案
 async def load_extensions():
@@ -184,10 +369,45 @@ async def load_extensions():
                 import traceback
                 traceback.print_exc()
 
+async def handle_shutdown():
+    # 先回覆啟動器，再關閉機器人
+    asyncio.create_task(close_bot())
+    return 'ok'
+
+async def handle_stats():
+    return process_stats()
+
+async def connect_cluster():
+    """叢集模式下連線到啟動器，讓擁有者指令可以套用到所有行程"""
+    address = os.getenv('CLUSTER_IPC')
+    if not address:
+        return
+    handlers = {
+        'load': lambda extension: extension_action('load', extension),
+        'unload': lambda extension: extension_action('unload', extension),
+        'reload': lambda extension: extension_action('reload', extension),
+        'shutdown': handle_shutdown,
+        'stats': handle_stats,
+    }
+    bot.cluster = ClusterClient(int(os.getenv('CLUSTER_ID', '0')), address, os.getenv('CLUSTER_TOKEN', ''), handlers, on_lost=close_bot)
+    await bot.cluster.start()
+
 async def main():
+    token = os.getenv("DISCORD_TOKEN")
+    fake_gateway = os.getenv('FAKE_GATEWAY')
+    if fake_gateway:
+        # 本機測試：連到假閘道而不是 Discord
+        from utils.fake_gateway import use_fake_gateway
+        use_fake_gateway(fake_gateway)
+        token = 'fake-token'
     async with bot:
+        bot.loop_monitor.start()
+        if registry.enabled:
+            # 叢集模式下每個行程使用 METRICS_PORT + 叢集編號，避免埠號衝突
+            await registry.start(int(registry.port) + int(os.getenv('CLUSTER_ID', '0')))
+        await connect_cluster()
         await load_extensions()
-        await bot.start(os.getenv("DISCORD_TOKEN"))
+        await bot.start(token)
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
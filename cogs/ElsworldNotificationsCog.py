@@ -1,89 +1,168 @@
 import discord
-import pytz
+import asyncio
 import os
-from datetime import datetime
 from dotenv import load_dotenv
-from discord.ext import commands, tasks
+from discord.ext import commands
+from utils.schedule import ScheduleEngine
+from utils.fanout import NotificationFanout
+from utils.notification_config import NotificationConfig, Subscription, ConfigError
 
 load_dotenv()
-NOTIFICATION_TIMES_163 = [
-    (7, 0), (11, 0), (15, 0), 
-    (19, 0), (23, 0), (3, 0), 
-]
-NOTIFICATION_TIMES_194 = [
-    (9, 0), (13, 0), (17, 0), 
-    (21, 0), (1, 0), (5, 0),
-]
-
-_163_IMAGE_PATH = r"C:\Users\Kevin\Downloads\DCbot\cogs\163.png"
-_194_IMAGE_PATH = r"C:\Users\Kevin\Downloads\DCbot\cogs\194.png"
+
+# 副本時間、圖片與訂閱頻道都寫在設定檔中，修改後會自動重新載入
+CONFIG_PATH = os.getenv(
+    'ELSWORLD_CONFIG',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "elsworld_notifications.json")
+)
+
+def load_subscriptions():
+    """讀取環境變數中的通知訂閱，這些訂閱套用到所有副本
+
+    ELSWORLD_SUBSCRIPTIONS 格式為 "頻道ID:身分組ID,頻道ID:身分組ID"，
+    另外也支援原本的 ELSWORLD_CHANNEL_ID / ELSWORLD_ROLE_ID。
+    """
+    subscriptions = []
+    for item in os.getenv('ELSWORLD_SUBSCRIPTIONS', '').split(','):
+        if not item.strip():
+            continue
+        try:
+            channel_id, role_id = item.split(':', 1)
+            subscriptions.append(Subscription(int(channel_id), int(role_id)))
+        except ValueError:
+            print(f"無法解析通知訂閱設定: {item}")
+
+    channel_id, role_id = os.getenv('ELSWORLD_CHANNEL_ID'), os.getenv('ELSWORLD_ROLE_ID')
+    if channel_id and role_id:
+        subscriptions.append(Subscription(int(channel_id), int(role_id)))
+    return subscriptions
 
 class ElsworldNotificationsCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self._163_notification.start()
-        self._194_notification.start()
-
-    @tasks.loop(minutes=1)
-    async def _163_notification(self):
-        now = datetime.now(pytz.timezone('Asia/Taipei'))
-        current_time = (now.hour, now.minute)
-        
-        if current_time in NOTIFICATION_TIMES_163:
-            channel = self.bot.get_channel(int(os.getenv('ELSWORLD_CHANNEL_ID')))
-            role = discord.utils.get(channel.guild.roles, id=int(os.getenv('ELSWORLD_ROLE_ID')))
-            
-            if channel and role:
-                try:
-                    embed = discord.Embed(
-                        title="163-普雷加斯的迷宮",
-                        description=f"{current_time[0]}:{current_time[1]}0囉！該打163了！",
-                        color=discord.Color.gold()
-                    )
-                    if os.path.exists(_163_IMAGE_PATH):
-                        file = discord.File(_163_IMAGE_PATH, filename="163.png")
-                        embed.set_image(url="attachment://163.png")
-                        await channel.send(f"{role.mention}", embed=embed, file=file)
-                    else:
-                        await channel.send(f"{role.mention}", embed=embed)
-                        
-                except Exception as e:
-                    print(f"Error sending dungeon notification: {e}")
-
-    @tasks.loop(minutes=1)
-    async def _194_notification(self):
-        now = datetime.now(pytz.timezone('Asia/Taipei'))
-        current_time = (now.hour, now.minute)
-        
-        if current_time in NOTIFICATION_TIMES_194:
-            channel = self.bot.get_channel(int(os.getenv('ELSWORLD_CHANNEL_ID')))
-            role = discord.utils.get(channel.guild.roles, id=int(os.getenv('ELSWORLD_ROLE_ID')))
-            
-            if channel and role:
-                try:
-                    embed = discord.Embed(
-                        title="194-鋼鐵城壁",
-                        description=f"{current_time[0]}:{current_time[1]}0囉！該打194了！",
-                        color=discord.Color.gold()
-                    )
-                    if os.path.exists(_194_IMAGE_PATH):
-                        file = discord.File(_194_IMAGE_PATH, filename="194.png")
-                        embed.set_image(url="attachment://194.png")
-                        await channel.send(f"{role.mention}", embed=embed, file=file)
-                    else:
-                        await channel.send(f"{role.mention}", embed=embed)
-                        
-                except Exception as e:
-                    print(f"Error sending dungeon notification: {e}")
-
-    @_163_notification.before_loop
-    @_194_notification.before_loop
-    async def before_notifications(self):
+        self.env_subscriptions = load_subscriptions()
+        self.config_poll = float(os.getenv('ELSWORLD_CONFIG_POLL', '10'))
+        self.config = NotificationConfig.load(CONFIG_PATH, self.env_subscriptions)
+        # 最後一次嘗試載入的設定檔版本，設定檔有錯誤時也會更新，避免重複報錯
+        self._seen_mtime = self.config.mtime
+        self.fanout = NotificationFanout(self.bot.outbound.send)
+        # 重新載入 cog 時從上一個引擎處理到的分鐘接續，避免同一分鐘的通知發出兩次
+        self.engine = ScheduleEngine(self.config.index, self.config.timezone, self.send_notification,
+                                     resume=getattr(self.bot, 'schedule_last_minute', None))
+        self._schedule_task = asyncio.create_task(self.run_schedules())
+        self._watch_task = asyncio.create_task(self.watch_config()) if self.config_poll > 0 else None
+
+    async def run_schedules(self):
         await self.bot.wait_until_ready()
+        await self.engine.run()
+
+    def reload_config(self):
+        """重新載入設定檔，成功時一次換上新的設定與排程索引
+
+        設定檔有錯誤時保留原本的設定，排程不會中斷。
+        """
+        try:
+            self._seen_mtime = os.path.getmtime(CONFIG_PATH)
+        except OSError:
+            pass
+        try:
+            config = NotificationConfig.load(CONFIG_PATH, self.env_subscriptions)
+        except ConfigError as e:
+            print(f"通知設定檔有錯誤，繼續使用原本的設定: {e}")
+            raise
+        self.config = config
+        self.engine.replace(config.index, config.timezone)
+        print(f"已重新載入通知設定: {len(config.dungeons)} 個副本，{len(config.subscriptions)} 個訂閱")
+        return config
+
+    async def watch_config(self):
+        """定期檢查設定檔的修改時間，有變更就重新載入"""
+        while True:
+            await asyncio.sleep(self.config_poll)
+            try:
+                mtime = os.path.getmtime(CONFIG_PATH)
+            except OSError:
+                continue
+            if mtime != self._seen_mtime:
+                try:
+                    self.reload_config()
+                except ConfigError:
+                    pass
+
+    def resolve_targets(self, subscriptions):
+        """把訂閱轉成 (訂閱, 頻道, 提及身分組) 的列表，找不到的頻道或身分組略過"""
+        targets = []
+        for sub in subscriptions:
+            channel = self.bot.get_channel(sub.channel_id)
+            if channel is None or (sub.guild_id is not None and channel.guild.id != sub.guild_id):
+                print(f"找不到通知頻道 {sub.channel_id}")
+                continue
+            if sub.role_id is None:
+                targets.append((sub, channel, None))
+                continue
+            role = channel.guild.get_role(sub.role_id)
+            if role is None:
+                print(f"找不到身分組 {sub.role_id}")
+                continue
+            targets.append((sub, channel, role.mention))
+        return targets
+
+    async def send_notification(self, entry, local_time):
+        dungeon = entry.data
+        # 觸發時使用最新的訂閱設定
+        targets = self.resolve_targets(self.config.subscribers(dungeon['name']))
+        if not targets:
+            return
+
+        embed = discord.Embed(
+            title=dungeon['title'],
+            description=f"{local_time.hour}:{local_time.minute:02d}囉！該打{dungeon['name']}了！",
+            color=discord.Color.gold()
+        )
+        # 使用同一張圖片的頻道一起發送，圖片只上傳一次
+        groups = {}
+        for sub, channel, content in targets:
+            groups.setdefault(sub.image or dungeon['image'], []).append((channel, content))
+        for image, group in groups.items():
+            name = dungeon['name'] if image == dungeon['image'] else f"{dungeon['name']} ({os.path.basename(image)})"
+            await self.fanout.broadcast(
+                name, group, embed,
+                image_path=image, filename=f"{dungeon['name']}{os.path.splitext(image)[1]}" if image else None
+            )
+
+    @commands.command(name='reloadnotify')
+    @commands.is_owner()
+    async def reload_notify(self, ctx):
+        """立即重新載入副本通知設定檔"""
+        try:
+            config = self.reload_config()
+        except ConfigError as e:
+            await ctx.send(f"設定檔有錯誤，繼續使用原本的設定: {e}")
+            return
+        upcoming = self.engine.next_occurrence()
+        message = f"已重新載入: {len(config.dungeons)} 個副本，{len(config.subscriptions)} 個訂閱"
+        if upcoming:
+            local, entries = upcoming
+            message += f"\n下一次通知: {local:%m/%d %H:%M} {', '.join(entry.name for entry in entries)}"
+        await ctx.send(message)
+
+    @commands.command(name='notifystats')
+    @commands.is_owner()
+    async def notify_stats(self, ctx):
+        """顯示最近一次副本通知的發送結果"""
+        lines = [f"訂閱頻道: {len(self.config.subscriptions)}"]
+        lines.extend(report.summary() for report in self.fanout.last_reports.values())
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    def cog_unload(self):
+        self._schedule_task.cancel()
+        if self.engine.last is not None:
+            self.bot.schedule_last_minute = self.engine.last
+        if self._watch_task is not None:
+            self._watch_task.cancel()
 
     @commands.Cog.listener()
     async def on_ready(self):
         print(f"{self.__class__.__name__} is ready!")
 
 async def setup(bot: commands.Bot):
-    await bot.add_cog(ElsworldNotificationsCog(bot))
\ No newline at end of file
+    await bot.add_cog(ElsworldNotificationsCog(bot))
@@ -11,6 +11,19 @@ import re
 from itertools import islice
 import os
 import subprocess
+from utils.extractor import ExtractionService, ExtractionCancelled
+from utils.metadata_cache import MetadataCache, normalize_query
+from utils.singleflight import SingleFlight
+from utils.prefetch import StreamPrefetcher
+from utils.playlist_ingest import PlaylistIngestor
+from utils.player import GuildPlayer, Track
+from utils.audio import PrebufferedSource, GapTracker
+from utils.track_cache import TrackCache
+from utils.panel import PanelRenderer, PanelSnapshot, build_panel_embed
+from utils.progress import ProgressScheduler
+from utils.outbound import PRIORITY_PLAYER, PRIORITY_STATUS
+from utils.session_store import SessionStore
+from utils.metrics import registry, TIME_TO_FIRST_AUDIO, PLAY_FAILURES
 
 class MusicControlView(View):
     def __init__(self, cog, ctx):
@@ -28,8 +41,9 @@ class MusicControlView(View):
     @discord.ui.button(emoji="⏯️", style=discord.ButtonStyle.gray)
     async def play_pause_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer()
-        if self.cog.voice_clients.get(self.ctx.guild.id):
-            vc = self.cog.voice_clients[self.ctx.guild.id]
+        player = self.cog.players.get(self.ctx.guild.id)
+        if player and player.voice_client:
+            vc = player.voice_client
             if vc.is_paused():
                 await self.cog.resume(self.ctx)
             else:
@@ -71,87 +85,129 @@ class MusicControlView(View):
     async def update_player(self):
         if not self.message:
             return
-        
-        guild_id = self.ctx.guild.id
-        embed = discord.Embed(title="🎵 音樂播放器", color=discord.Color.purple())
-        
-        # 檢查機器人是否在語音頻道中
-        if guild_id not in self.cog.voice_clients or not self.cog.voice_clients.get(guild_id):
-            embed.description = "目前沒有播放任何歌曲"
-            await self.message.edit(embed=embed)
-            return
-        
-        # 檢查是否有當前播放的歌曲
-        current = self.cog.current.get(guild_id)
-        if not current:
-            # 嘗試檢查語音客戶端是否仍在播放
-            vc = self.cog.voice_clients.get(guild_id)
-            if vc and (vc.is_playing() or vc.is_paused()):
-                # 正在播放但current為空，嘗試從隊列獲取信息
-                embed.description = "正在播放音樂，但無法獲取歌曲信息。"
-                await self.message.edit(embed=embed)
-                print(f"警告: {guild_id} 正在播放但無法獲取歌曲信息")
-                return
-            else:
-                # 真的沒有播放任何歌曲
-                embed.description = "目前沒有播放任何歌曲"
-                await self.message.edit(embed=embed)
-                return
-        
-        # 播放狀態
-        vc = self.cog.voice_clients.get(guild_id)
-        if not vc:
-            embed.description = "機器人不在語音頻道中"
-            await self.message.edit(embed=embed)
+        await self.cog.update_panel(self.message, self.ctx.guild.id)
+
+class QueueJumpModal(discord.ui.Modal, title="跳到指定頁"):
+    page = discord.ui.TextInput(label="頁碼", max_length=6)
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+        self.page.placeholder = f"1 - {view.page_count()}"
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            page = int(str(self.page.value).strip())
+        except ValueError:
+            await interaction.response.send_message("請輸入數字頁碼", ephemeral=True)
             return
-        
-        status = "▶️"
-        
-        # 循環狀態
-        loop_status = "🔁 循環模式: 開啟" if self.cog.loop_mode.get(guild_id, False) else "🔁 循環模式: 關閉"
-        
-        # 進度條
-        progress_info = self.cog.get_progress_info(guild_id)
-        if progress_info:
-            current_time, duration, percentage = progress_info
-            progress_bar = self.cog.create_progress_bar(percentage)
+        await self.view.show_page(interaction, page - 1)
+
+class QueueView(View):
+    """分頁顯示播放隊列，每頁只讀取該頁的歌曲，不管隊列多長都只有一則訊息"""
+
+    TITLE_LIMIT = 60
+
+    def __init__(self, cog, ctx, page_size=None):
+        super().__init__(timeout=180)
+        self.cog = cog
+        self.ctx = ctx
+        self.page_size = page_size or int(os.getenv('MUSIC_QUEUE_PAGE_SIZE', '10'))
+        self.page = 0
+        self.message = None
+    
+    async def interaction_check(self, interaction):
+        # 只有發起命令的使用者可以翻頁
+        if interaction.user.id != self.ctx.author.id:
+            await interaction.response.send_message("只有發起指令的人可以翻頁", ephemeral=True)
+            return False
+        return True
+
+    def queue(self):
+        player = self.cog.players.get(self.ctx.guild.id)
+        return player.queue if player else ()
+
+    def page_count(self):
+        return max(1, -(-len(self.queue()) // self.page_size))
+
+    @classmethod
+    def format_title(cls, title):
+        """截斷過長的標題並跳脫 Markdown，避免破壞排版"""
+        title = ' '.join((title or '未知歌曲').split())
+        if len(title) > cls.TITLE_LIMIT:
+            title = title[:cls.TITLE_LIMIT - 1].rstrip() + '…'
+        return discord.utils.escape_markdown(title)
+
+    def build_embed(self):
+        queue = self.queue()
+        total = len(queue)
+        pages = self.page_count()
+        # 隊列可能在翻頁期間變短
+        self.page = min(max(self.page, 0), pages - 1)
+        start = self.page * self.page_size
+        end = min(start + self.page_size, total)
+        
+        embed = discord.Embed(title="🎶 播放隊列", color=discord.Color.purple())
+        if total == 0:
+            embed.description = "播放隊列是空的!"
         else:
-            current_time = "00:00"
-            duration = "00:00"
-            progress_bar = "`──────────────────────`"
-        
-        # 當前歌曲資訊
-        title = current.get('title', '未知歌曲')
-        url = current.get('webpage_url', '')
-        
-        embed.description = f"**正在播放:** [{title}]({url})\n\n{loop_status}\n\n{status}  {current_time}  {progress_bar}  {duration}"
-        
-        # 如果有縮圖
-        if 'thumbnail' in current and current['thumbnail']:
-            embed.set_thumbnail(url=current['thumbnail'])
-        
-        # 展示隊列中的下一首歌曲
-        queue = self.cog.queues.get(guild_id, [])
-        if queue and len(queue) > 0:
-            next_songs = list(islice(queue, 0, 3))
-            queue_text = "\n".join([f"{i+1}. {song.get('title', '未知歌曲')}" for i, song in enumerate(next_songs)])
-            if len(queue) > 3:
-                queue_text += f"\n... 還有 {len(queue) - 3} 首歌"
-            embed.add_field(name="播放隊列", value=queue_text, inline=False)
+            # 只讀取這一頁的歌曲
+            embed.description = "\n".join(
+                f"`{i + 1}.` {self.format_title(queue[i].title)}" for i in range(start, end)
+            )
+        embed.set_footer(text=f"第 {self.page + 1} / {pages} 頁・共 {total} 首歌")
         
-        await self.message.edit(embed=embed)
+        self.first_button.disabled = self.previous_button.disabled = self.page == 0
+        self.next_button.disabled = self.last_button.disabled = self.page >= pages - 1
+        self.jump_button.disabled = pages <= 1
+        return embed
+
+    async def show_page(self, interaction, page):
+        self.page = page
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    @discord.ui.button(emoji="⏮️", style=discord.ButtonStyle.gray)
+    async def first_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, 0)
+
+    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.gray)
+    async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page - 1)
+
+    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.gray)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page + 1)
+
+    @discord.ui.button(emoji="⏭️", style=discord.ButtonStyle.gray)
+    async def last_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page_count() - 1)
+
+    @discord.ui.button(emoji="🔢", style=discord.ButtonStyle.gray)
+    async def jump_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(QueueJumpModal(self))
+
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except Exception:
+                pass
 
 class MusicCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.voice_clients = {}
-        self.queues = {}
-        self.current = {}
-        self.start_times = {}
-        self.durations = {}
-        self.loop_mode = {}  # 新增循環模式
-        self.player_contexts = {}  # 儲存控制面板上下文
-        self.control_messages = {}  # 儲存控制面板訊息
+        self.players = {}  # 每個伺服器一個 GuildPlayer，第一次使用時建立
+        self.closed = False  # 卸載後舊實例不再換歌
+        # 每個伺服器保留的播放歷史數量（上一首功能使用）
+        self.history_size = int(os.getenv('MUSIC_HISTORY_SIZE', '20'))
+        # 在目前歌曲結束前幾秒啟動下一首的 FFmpeg，以及預先緩衝的音框數（每框20毫秒）
+        self.prespawn_seconds = float(os.getenv('MUSIC_PRESPAWN_SECONDS', '5'))
+        self.prebuffer_frames = int(os.getenv('MUSIC_PREBUFFER_FRAMES', '50'))
+        # 連續幾首無法播放時停止自動換歌（例如 YouTube 或 yt-dlp 暫時無法使用），隊列保留
+        self.max_play_failures = int(os.getenv('MUSIC_MAX_PLAY_FAILURES', '5'))
+        self.gap_tracker = GapTracker()
+        self.prepared_hits = 0
+        self.prepared_misses = 0
         
         # 設置ffmpeg路徑 - 優先檢查特定路徑，然後嘗試系統環境變數中的ffmpeg
         self.ffmpeg_path = None
@@ -196,9 +252,18 @@ class MusicCog(commands.Cog):
         
         print(f"最終使用的ffmpeg路徑: {self.ffmpeg_path}")
         
+        # 播放模式：auto 在來源已是 Opus 時直接複製封包，pcm 一律解碼後由 Python 重新編碼，
+        # opus 一律交給 FFmpeg 輸出 Opus（非 Opus 來源由 FFmpeg 轉碼）
+        self.audio_mode = os.getenv('MUSIC_AUDIO_MODE', 'auto').lower()
+        if self.audio_mode not in ('auto', 'opus', 'pcm'):
+            print(f"未知的播放模式 {self.audio_mode}，改用 auto")
+            self.audio_mode = 'auto'
+        self.source_counts = {'opus_copy': 0, 'opus_transcode': 0, 'pcm': 0}
+        
         # YT-DLP 配置
         self.ytdl_opts = {
-            'format': 'bestaudio/best',
+            # 優先選擇 Opus 音軌，才能不經轉碼直接送出
+            'format': 'bestaudio/best' if self.audio_mode == 'pcm' else 'bestaudio[acodec=opus]/bestaudio/best',
             'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
             'restrictfilenames': True,
             'noplaylist': True,
@@ -215,6 +280,32 @@ class MusicCog(commands.Cog):
         # 如果找到ffmpeg，則設置ffmpeg路徑
         if self.ffmpeg_path:
             self.ytdl_opts['ffmpeg_location'] = os.path.dirname(self.ffmpeg_path)
+        
+        # 所有 yt-dlp 解析都交給執行緒池，避免阻塞事件迴圈
+        self.extractor = ExtractionService(self.ytdl_opts)
+        # 搜尋字串/影片ID 的歌曲資訊快取
+        self.metadata_cache = MetadataCache()
+        # 相同歌曲/搜尋的並行解析只執行一次
+        self.inflight = SingleFlight()
+        # 隊列只保存歌曲基本資料，串流URL在播放前才預先解析
+        self.prefetcher = StreamPrefetcher(self.upcoming_songs, self.ensure_stream)
+        # 播放清單邊翻頁邊加入隊列
+        self.playlist_ingestor = PlaylistIngestor(self.extractor, self.build_playlist_song, self.enqueue_song)
+        # 控制面板的編輯會合併，內容沒變時不編輯
+        self.panel = PanelRenderer(
+            edit=lambda message, **kwargs: self.bot.outbound.edit(message, priority=PRIORITY_PLAYER, **kwargs)
+        )
+        # 所有正在播放的控制面板共用一個進度更新排程
+        self.progress_updates = ProgressScheduler(self.update_player, self.progress_is_active)
+        # 常播歌曲存到本機（設定 MUSIC_DISK_CACHE_DIR 才啟用）
+        self.track_cache = TrackCache(executable=self.ffmpeg_path or "ffmpeg")
+        # 播放狀態快照（設定 MUSIC_SESSION_DB 才啟用），重新啟動或重新載入後接著播放
+        self.sessions = SessionStore()
+        self.restore_concurrency = int(os.getenv('MUSIC_SESSION_RESTORE_CONCURRENCY', '2'))
+        self.sessions.start(self.players)
+        self._restore_task = asyncio.create_task(self.restore_sessions()) if self.sessions.enabled else None
+        # 抓取 /metrics 時才讀取的隊列、語音與面板狀態
+        registry.collector('music', self.collect_metrics)
             
         # 註冊按鈕處理函數
         self.bot.add_listener(self.button_callback, "on_interaction")
@@ -237,236 +328,539 @@ class MusicCog(commands.Cog):
         elif custom_id == "loop":
             await self.handle_loop(interaction)
     
+    async def reply(self, ctx, content=None, **kwargs):
+        """透過共用的發送排程回覆指令"""
+        return await self.bot.outbound.send(ctx.channel, content, **kwargs)
+    
+    async def announce(self, ctx, line):
+        """送出狀態訊息，連續的狀態會合併成同一則訊息"""
+        return await self.bot.outbound.status(ctx.channel, line)
+    
+    def get_player(self, guild_id):
+        """取得伺服器的播放器，不存在時建立"""
+        player = self.players.get(guild_id)
+        if player is None:
+            player = self.players[guild_id] = GuildPlayer(guild_id, history_size=self.history_size)
+            self.restore_queue(player)
+        return player
+
+    def restore_queue(self, player):
+        """把快照中的隊列放回新建立的播放器，目前的歌曲排在最前面並記住播放位置"""
+        session = self.sessions.load(player.guild_id)
+        if session is None:
+            return None
+        if session.current is not None:
+            player.queue.append(session.current)
+            player.resume_at = (session.current, session.offset)
+        player.queue.extend(session.queue)
+        player.loop = session.loop
+        player.version += 1
+        return session
+
+    async def restore_sessions(self):
+        """啟動後在背景恢復中斷前正在播放的伺服器
+
+        只有仍有成員在語音頻道中（或語音連線還在，例如重新載入 cog）的伺服器會立即重新連線播放，
+        其餘伺服器的隊列等到下次有人使用音樂指令時才讀取；不屬於這個行程（分片）的伺服器直接略過。
+        """
+        await self.bot.wait_until_ready()
+        limit = asyncio.Semaphore(self.restore_concurrency)
+
+        async def restore(guild, voice_channel_id, text_channel_id):
+            async with limit:
+                try:
+                    await self.resume_session(guild, voice_channel_id, text_channel_id)
+                except Exception as e:
+                    print(f"恢復 {guild.name} 的播放狀態時發生錯誤: {e}")
+
+        tasks = []
+        for guild_id, voice_channel_id, text_channel_id, playing in self.sessions.index():
+            guild = self.bot.get_guild(guild_id)
+            if guild is None or not playing or guild_id in self.players:
+                continue
+            voice_client = guild.voice_client
+            channel = guild.get_channel(voice_channel_id) if voice_channel_id else None
+            if (voice_client and voice_client.is_connected()) or \
+                    (channel is not None and any(not m.bot for m in channel.members)):
+                tasks.append(restore(guild, voice_channel_id, text_channel_id))
+        if tasks:
+            print(f"正在恢復 {len(tasks)} 個伺服器的播放")
+            await asyncio.gather(*tasks)
+
+    async def resume_session(self, guild, voice_channel_id, text_channel_id):
+        if guild.id in self.players:
+            return  # 已經有人使用音樂指令
+        player = self.get_player(guild.id)
+        if not player.queue:
+            return
+        vc = guild.voice_client
+        if vc is None or not vc.is_connected():
+            channel = guild.get_channel(voice_channel_id)
+            if channel is None:
+                return
+            vc = await channel.connect()
+        elif vc.is_playing() or vc.is_paused():
+            # 重新載入 cog 後語音連線仍在，停止舊實例留下的音頻源
+            vc.stop()
+        player.voice_client = vc
+        await self.play_next(guild.id)
+        if player.current is None:
+            return
+        text_channel = self.bot.get_channel(text_channel_id) if text_channel_id else None
+        if text_channel is not None:
+            await self.bot.outbound.send(
+                text_channel, f"♻️ 已恢復播放 **{player.current.title}**，隊列中還有 {len(player.queue)} 首歌曲",
+                priority=PRIORITY_STATUS
+            )
+
+    def destroy_player(self, guild_id):
+        """停止伺服器所有背景工作並移除播放器狀態"""
+        self.playlist_ingestor.cancel(guild_id)
+        self.prefetcher.cancel(guild_id)
+        self.inflight.cancel(guild_id)
+        self.extractor.cancel(guild_id)
+        self.progress_updates.unwatch(guild_id)
+        self.sessions.discard(guild_id)
+        
+        player = self.players.pop(guild_id, None)
+        if player is not None:
+            self.discard_prepared(player)
+            if player.control_message is not None:
+                # 控制面板不會再更新，取消排定的編輯並釋放記錄的內容
+                self.panel.forget(player.control_message)
+            player.clear()
+            player.reset_track()
+        return player
+
+    async def ensure_voice(self, ctx):
+        """確保機器人在使用者所在的語音頻道中"""
+        player = self.get_player(ctx.guild.id)
+        voice_channel = ctx.author.voice.channel
+        
+        # 也接受由 $$join 建立的連線
+        vc = player.voice_client or ctx.voice_client
+        if vc is None or not vc.is_connected():
+            vc = await voice_channel.connect()
+        elif vc.channel != voice_channel:
+            await vc.move_to(voice_channel)
+        player.voice_client = vc
+        return player
+    
+    def _interaction_player(self, interaction):
+        player = self.players.get(interaction.guild_id)
+        if not player or not player.ctx or not player.voice_client:
+            return None
+        return player
+
     async def handle_play_pause(self, interaction):
         """處理播放/暫停按鈕"""
-        if not self.ctx or not self.ctx.voice_client:
+        player = self._interaction_player(interaction)
+        if not player:
             await interaction.response.send_message("目前沒有播放歌曲！", ephemeral=True)
             return
             
-        if self.ctx.voice_client.is_paused():
-            self.ctx.voice_client.resume()
+        if player.voice_client.is_paused():
+            player.voice_client.resume()
+            player.mark_resumed()
+            self.progress_updates.watch(player.guild_id)
             await interaction.response.send_message("▶️ 已繼續播放", ephemeral=True)
-        elif self.ctx.voice_client.is_playing():
-            self.ctx.voice_client.pause()
+        elif player.voice_client.is_playing():
+            player.voice_client.pause()
+            player.mark_paused()
             await interaction.response.send_message("⏸️ 已暫停播放", ephemeral=True)
         else:
             await interaction.response.send_message("沒有歌曲正在播放", ephemeral=True)
             
         # 更新控制面板
-        await self.update_player()
+        await self.update_player(player.guild_id)
     
     async def handle_stop(self, interaction):
         """處理停止按鈕"""
-        if not self.ctx or not self.ctx.voice_client:
+        player = self._interaction_player(interaction)
+        if not player:
             await interaction.response.send_message("目前沒有播放歌曲！", ephemeral=True)
             return
             
-        self.ctx.voice_client.stop()
+        player.clear()
+        player.voice_client.stop()
         await interaction.response.send_message("⏹️ 已停止播放並清空隊列", ephemeral=True)
         
         # 更新控制面板
-        await self.update_player()
+        await self.update_player(player.guild_id)
     
     async def handle_next(self, interaction):
         """處理下一首按鈕"""
-        if not self.ctx or not self.ctx.voice_client or not self.ctx.voice_client.is_playing():
+        player = self._interaction_player(interaction)
+        if not player or not player.voice_client.is_playing():
             await interaction.response.send_message("目前沒有播放歌曲！", ephemeral=True)
             return
             
-        self.ctx.voice_client.stop()  # 停止當前歌曲，會自動播放下一首
+        player.voice_client.stop()  # 停止當前歌曲，會自動播放下一首
         await interaction.response.send_message("⏩ 已跳到下一首", ephemeral=True)
     
     async def handle_previous(self, interaction):
         """處理上一首按鈕"""
-        # 因為我們沒有保存播放歷史，所以這個功能比較有限
-        # 簡單實現：如果有當前歌曲，重新開始播放
-        if not self.ctx or not self.ctx.voice_client or not self.current.get(self.ctx.guild.id):
+        player = self._interaction_player(interaction)
+        if not player:
             await interaction.response.send_message("目前沒有播放歌曲！", ephemeral=True)
             return
         
-        # 停止當前歌曲
-        self.ctx.voice_client.stop()
-        
-        # 將當前歌曲重新加入隊列最前面
-        if self.current.get(self.ctx.guild.id):
-            temp_song = self.current[self.ctx.guild.id]
-            if self.ctx.guild.id not in self.queues:
-                self.queues[self.ctx.guild.id] = []
-            self.queues[self.ctx.guild.id].appendleft(temp_song)
-            await self.play_next(self.ctx.guild.id)
-            await interaction.response.send_message("⏮️ 重新播放當前歌曲", ephemeral=True)
+        previous = await self.rewind(player)
+        if previous:
+            await interaction.response.send_message(f"⏮️ 返回上一首: {previous.title}", ephemeral=True)
         else:
             await interaction.response.send_message("無法返回上一首歌曲", ephemeral=True)
     
     async def handle_loop(self, interaction):
         """處理循環模式按鈕"""
-        await self.toggle_loop(self.ctx)
+        player = self._interaction_player(interaction)
+        if player:
+            await self.toggle_loop(player.ctx)
     
-    async def update_player(self, interaction=None):
+    async def update_player(self, guild_id):
         """更新播放器控制面板"""
-        if not self.ctx or not self.control_messages.get(self.ctx.guild.id):
+        player = self.players.get(guild_id)
+        if not player or not player.ctx or not player.control_message:
             return
-            
-        try:
-            view = MusicControlView(self, self.ctx)
-            view.message = self.control_messages[self.ctx.guild.id]
-            await view.update_player()
-        except Exception as e:
-            print(f"更新播放器錯誤: {e}")
+        await self.update_panel(player.control_message, guild_id)
     
-    async def create_player_embed(self):
-        """創建播放器嵌入消息"""
-        embed = discord.Embed(
-            title="🎵 音樂播放器",
-            color=discord.Color.blue()
+    def progress_is_active(self, guild_id):
+        """控制面板是否需要自動更新進度（暫停或閒置時不需要）"""
+        player = self.players.get(guild_id)
+        return bool(
+            player and player.control_message and player.current
+            and player.voice_client and player.voice_client.is_playing()
         )
+    
+    async def update_panel(self, message, guild_id):
+        """要求重繪某則控制面板訊息，實際編輯由 PanelRenderer 合併"""
+        await self.panel.update(message, lambda: self.panel_snapshot(guild_id))
+    
+    def panel_snapshot(self, guild_id):
+        """擷取控制面板目前應顯示的內容"""
+        progress = None
+        progress_info = self.get_progress_info(guild_id)
+        if progress_info:
+            current_time, duration, percentage = progress_info
+            progress = (current_time, duration, self.create_progress_bar(percentage))
+        return PanelSnapshot.capture(self.players.get(guild_id), progress)
+    
+    async def resolve_video(self, video_id, owner=None, kind='url'):
+        """依影片ID取得歌曲資料，優先使用快取，只在串流URL過期時重新解析
+
+        kind 只用來分類解析時間的指標（url 或 playlist_entry）。
+        """
+        metadata = self.metadata_cache.get_metadata(video_id)
+        if metadata is not None:
+            stream = self.metadata_cache.get_stream(video_id)
+            if stream:
+                url, acodec = stream
+                return Track(id=video_id, url=url, acodec=acodec, **metadata)
+        
+        # 不同伺服器同時要求同一首歌時只解析一次，每個呼叫者拿到自己的副本
+        track = await self.inflight.do(f"video:{video_id}", lambda: self._extract_video(video_id, kind), owner=owner)
+        return track.copy() if track else None
+
+    async def _extract_video(self, video_id, kind='url'):
+        info = await self.extractor.extract(f"https://www.youtube.com/watch?v={video_id}", kind=kind)
+        if not info or 'url' not in info or 'title' not in info:
+            return None
         
-        if not self.ctx or not hasattr(self.ctx, 'guild') or not self.current.get(self.ctx.guild.id):
-            embed.description = "目前沒有播放歌曲"
-            return embed
-            
-        embed.description = f"**正在播放:** {self.current[self.ctx.guild.id]['title']}"
-        
-        # 計算進度
-        elapsed_time = int(time.time() - self.start_times.get(self.ctx.guild.id, 0))
-        elapsed_str = str(timedelta(seconds=elapsed_time))
-        if elapsed_str.startswith('0:'):
-            elapsed_str = elapsed_str[2:]  # 移除前置的 '0:'
-            
-        # 總時長
-        if self.durations.get(self.ctx.guild.id, 0) > 0:
-            total_str = str(timedelta(seconds=self.durations[self.ctx.guild.id]))
-            if total_str.startswith('0:'):
-                total_str = total_str[2:]  # 移除前置的 '0:'
-                 
-            # 計算進度條
-            progress_bar_length = 20
-            filled_length = min(progress_bar_length, int(progress_bar_length * elapsed_time / self.durations[self.ctx.guild.id]))
-            bar = '▰' * filled_length + '▱' * (progress_bar_length - filled_length)
-            
-            # 計算百分比
-            percentage = min(100, int((elapsed_time / self.durations[self.ctx.guild.id]) * 100)) if self.durations[self.ctx.guild.id] > 0 else 0
-            
-            embed.add_field(
-                name="進度", 
-                value=f"`{elapsed_str} / {total_str}`\n`{bar}`", 
-                inline=False
-            )
-        else:
-            embed.add_field(
-                name="進度", 
-                value=f"已播放: `{elapsed_str}`\n無法獲取總時長", 
-                inline=False
-            )
+        self.metadata_cache.put_info(info)
+        return Track.from_info(info)
+
+    async def search_video(self, query, owner=None):
+        """搜尋歌曲並回傳第一個結果的影片ID，沒有結果時回傳None"""
+        async def _search():
+            search_result = await self.extractor.extract(f"ytsearch:{query}")
+            if not search_result or not search_result.get('entries'):
+                return None
+            video_id = search_result['entries'][0].get('id')
+            if video_id:
+                self.metadata_cache.put_query(query, video_id)
+            return video_id
+        
+        return await self.inflight.do(f"search:{normalize_query(query)}", _search, owner=owner)
+
+    async def ensure_stream(self, track, owner=None):
+        """確保歌曲有仍然有效的串流URL，必要時即時解析"""
+        if not track.id:
+            # 沒有影片ID的歌曲只能使用加入時的URL
+            return track.url
         
-        # 顯示循環狀態
-        loop_status = "開啟 🔁" if self.loop_mode.get(self.ctx.guild.id, False) else "關閉 ▶️"
-        embed.add_field(name="循環模式", value=loop_status)
+        if track.url and self.metadata_cache.stream_is_fresh(track.id, track.url):
+            return track.url
         
-        # 顯示隊列信息
-        queue_status = f"隊列中還有 {len(self.queues.get(self.ctx.guild.id, []))} 首歌曲"
-        embed.add_field(name="隊列", value=queue_status)
+        resolved = await self.resolve_video(track.id, owner=owner)
+        if not resolved:
+            return None
+        track.update(resolved)
+        return track.url
+
+    def upcoming_songs(self, guild_id, count):
+        """取得隊列中接下來的幾首歌"""
+        player = self.players.get(guild_id)
+        return player.upcoming(count) if player else []
+
+    def create_source(self, stream_url, player, acodec=None, local=False, start=0):
+        """建立音頻源，並在送出第一個音框時記錄歌曲之間的空白時間，start 是開始播放的秒數
+
+        來源已是 Opus 時使用 FFmpegOpusAudio 直接複製封包，省去 FFmpeg 解碼與 Python 端每 20 毫秒的 Opus 編碼。
+        """
+        # 設置FFmpeg選項
+        ffmpeg_options = {
+            'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
+            'options': '-vn'
+        }
+        if local:
+            # 本機檔案不需要重新連線
+            del ffmpeg_options['before_options']
+        if start:
+            # 在輸入端跳轉，不需要解碼前面的部分
+            ffmpeg_options['before_options'] = f"{ffmpeg_options.get('before_options', '')} -ss {start:.1f}".strip()
+        
+        # 在 Replit 環境中使用系統安裝的 ffmpeg
+        if os.environ.get('REPL_ID') or os.environ.get('REPL_SLUG'):
+            print("在 Replit 環境中播放音樂，使用系統 ffmpeg")
+            # Replit 環境自動安裝的 ffmpeg，不需要指定路徑
+            if 'executable' in ffmpeg_options:
+                del ffmpeg_options['executable']
+        elif self.ffmpeg_path and self.ffmpeg_path != "ffmpeg":
+            ffmpeg_options['executable'] = self.ffmpeg_path
+        
+        def on_first_frame():
+            # 在語音執行緒中呼叫
+            if player.ended_at is not None:
+                self.gap_tracker.record(time.monotonic() - player.ended_at)
+                player.ended_at = None
+            requested = player.audio_requested
+            if requested is not None:
+                player.audio_requested = None
+                TIME_TO_FIRST_AUDIO.observe(time.monotonic() - requested[1], requested[0])
+        
+        is_opus = (acodec or '').startswith('opus')
+        if self.audio_mode == 'opus' or (self.audio_mode == 'auto' and is_opus):
+            # 編碼已知（來自 yt-dlp），不需要再用 probe 多啟動一次 FFmpeg
+            codec = 'copy' if is_opus else None
+            self.source_counts['opus_copy' if is_opus else 'opus_transcode'] += 1
+            source = discord.FFmpegOpusAudio(stream_url, codec=codec, **ffmpeg_options)
+        else:
+            self.source_counts['pcm'] += 1
+            source = discord.FFmpegPCMAudio(stream_url, **ffmpeg_options)
         
-        # 如果有歌曲封面，則添加
-        if 'thumbnail' in self.current.get(self.ctx.guild.id) and self.current[self.ctx.guild.id]['thumbnail']:
-            embed.set_thumbnail(url=self.current[self.ctx.guild.id]['thumbnail'])
+        return PrebufferedSource(source, on_first_frame)
+
+    def _on_track_end(self, guild_id, error):
+        """歌曲結束時在語音執行緒中呼叫"""
+        player = self.players.get(guild_id)
+        if player is not None:
+            player.ended_at = time.monotonic()
+        if error:
+            print(f"播放器錯誤: {error}")
+        if self.closed:
+            return
+        asyncio.run_coroutine_threadsafe(self.play_next(guild_id), self.bot.loop)
+
+    def schedule_prepare(self, player):
+        """安排在目前歌曲結束前啟動下一首的音頻源"""
+        self.discard_prepared(player)
+        if self.prespawn_seconds <= 0 or not player.duration:
+            return
+        player.prepare_task = asyncio.create_task(self._prepare_next(player))
+
+    async def _prepare_next(self, player):
+        try:
+            # 暫停時剩餘時間不變，會一直等到真正接近結尾
+            while True:
+                remaining = player.remaining()
+                if remaining is None:
+                    return
+                delay = remaining - self.prespawn_seconds
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
             
-        return embed
+            track = player.peek_next()
+            if track is None:
+                return
+            
+            # 只查索引不計入命中率，輪到這首歌真的播放時才計入
+            cached_path = self.track_cache.peek(track.id)
+            if cached_path:
+                source = self.create_source(cached_path, player, 'opus', local=True)
+            else:
+                stream_url = await self.ensure_stream(track, owner=player.guild_id)
+                if not stream_url:
+                    return
+                source = self.create_source(stream_url, player, track.acodec)
+            try:
+                # 讓 FFmpeg 先完成連線與解封裝，並緩衝開頭的音框
+                await asyncio.to_thread(source.prebuffer, self.prebuffer_frames)
+            except BaseException:
+                self.bot.loop.run_in_executor(None, source.cleanup)
+                raise
+            player.prepared = (track, source, cached_path is not None)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # 準備失敗時，輪到這首歌才即時建立音頻源
+            print(f"預先啟動下一首歌時發生錯誤: {e}")
+        finally:
+            if player.prepare_task is asyncio.current_task():
+                player.prepare_task = None
+
+    def take_prepared(self, player, track):
+        """取出為這首歌準備好的音頻源，不相符時丟棄"""
+        prepared = player.prepared
+        player.prepared = None
+        if prepared is None:
+            return None
+        prepared_track, source, cached = prepared
+        if prepared_track is track:
+            if cached:
+                self.track_cache.record_hit(track.id)
+            return source
+        # 隊列在準備後被改變（跳過、隨機排序、清空等）
+        self.bot.loop.run_in_executor(None, source.cleanup)
+        return None
+
+    def cache_track(self, track):
+        """記錄播放次數，常播的歌曲在播放期間於背景存到本機"""
+        if self.track_cache.record_play(track.id) and track.url:
+            self.track_cache.fill(track.id, track.url, track.acodec, track.duration)
+
+    def discard_prepared(self, player):
+        """取消準備中的任務並關閉已準備的音頻源"""
+        if player.prepare_task is not None and not player.prepare_task.done():
+            player.prepare_task.cancel()
+        player.prepare_task = None
+        if player.prepared is not None:
+            _, source, _ = player.prepared
+            player.prepared = None
+            self.bot.loop.run_in_executor(None, source.cleanup)
 
     async def play_next(self, guild_id):
-        if self.voice_clients.get(guild_id) and self.voice_clients[guild_id].is_connected():
-            # 檢查是否處於循環模式
-            if self.loop_mode.get(guild_id, False) and self.current.get(guild_id):
-                # 將當前歌曲添加到隊列的最前面
-                if guild_id not in self.queues:
-                    self.queues[guild_id] = []
-                self.queues[guild_id].insert(0, self.current[guild_id])
+        player = self.players.get(guild_id)
+        if self.closed or not player or not player.is_connected() or player.advancing:
+            # 已有另一個 play_next 正在準備下一首（例如歌曲結束時剛好有人點歌）
+            return
+        
+        # 播放失敗時繼續嘗試下一首（迴圈而不是遞迴），最後只送出一則摘要
+        failures = []
+        started = False
+        # 在第一個 await 之前標記，之後同時到達的 play_next 與 $$play 的 is_busy() 都會看到
+        player.advancing = True
+        try:
+            while not self.closed:
+                # 從隊列中取出下一首歌（循環模式時重複目前的歌曲）
+                next_song = player.next_track()
+                if next_song is None:
+                    # 隊列中沒有更多歌曲
+                    print(f"隊列中沒有更多歌曲")
+                    player.reset_track()
+                    # 要求的歌曲都無法播放，不記錄開始播放的延遲
+                    player.audio_requested = None
+                    break
             
-            if guild_id in self.queues and len(self.queues[guild_id]) > 0:
-                # 從隊列中取出下一首歌
-                next_song = self.queues[guild_id].pop(0)
-                self.current[guild_id] = next_song
-                
-                # 更新開始時間和持續時間
-                self.start_times[guild_id] = datetime.now()
-                self.durations[guild_id] = next_song.get('duration', 0)
-                
-                print(f"開始播放: {next_song.get('title', '未知')} - 持續時間: {next_song.get('duration', 0)}秒")
-                
-                # 播放音樂
                 try:
-                    # 設置FFmpeg選項
-                    ffmpeg_options = {
-                        'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-                        'options': '-vn'
-                    }
-                    
-                    # 在 Replit 環境中使用系統安裝的 ffmpeg
-                    if os.environ.get('REPL_ID') or os.environ.get('REPL_SLUG'):
-                        print("在 Replit 環境中播放音樂，使用系統 ffmpeg")
-                        # Replit 環境自動安裝的 ffmpeg，不需要指定路徑
-                        if 'executable' in ffmpeg_options:
-                            del ffmpeg_options['executable']
-                    elif self.ffmpeg_path and self.ffmpeg_path != "ffmpeg":
-                        ffmpeg_options['executable'] = self.ffmpeg_path
-                    
-                    # 創建音頻源
-                    try:
-                        source = discord.FFmpegPCMAudio(next_song['url'], **ffmpeg_options)
-                        print("成功創建音頻源")
-                    except Exception as e:
-                        error_msg = str(e)
-                        print(f"創建音頻源時出錯: {error_msg}")
-                        
-                        # 發送錯誤訊息到頻道
-                        if guild_id in self.player_contexts:
-                            await self.player_contexts[guild_id].send(f"播放時發生錯誤: {error_msg[:200]}")
-                        raise
-                    
-                    # 播放音頻
-                    self.voice_clients[guild_id].play(
-                        source, 
-                        after=lambda e: asyncio.run_coroutine_threadsafe(
-                            self.play_next(guild_id), self.bot.loop
-                        )
-                    )
-                    
-                    # 更新控制面板
-                    if guild_id in self.player_contexts and guild_id in self.control_messages:
-                        ctx = self.player_contexts[guild_id]
-                        view = MusicControlView(self, ctx)
-                        view.message = self.control_messages[guild_id]
-                        await view.update_player()
-                    else:
-                        # 如果沒有控制面板但有上下文，則創建一個
-                        if guild_id in self.player_contexts:
-                            await self.show_player(self.player_contexts[guild_id])
+                    await self._start_track(player, next_song)
+                    started = True
+                    break
                 except Exception as e:
                     print(f"播放音樂時發生錯誤: {e}")
-                    
-                    if guild_id in self.player_contexts:
-                        await self.player_contexts[guild_id].send(f"播放時發生錯誤: {str(e)}")
-                    
-                    # 嘗試播放下一首
-                    await self.play_next(guild_id)
+                    PLAY_FAILURES.inc()
+                    failures.append((next_song, e))
+                    # 失敗的歌曲不應在循環模式中重複
+                    player.current = None
+                    if len(failures) >= self.max_play_failures:
+                        player.reset_track()
+                        player.audio_requested = None
+                        break
+        finally:
+            player.advancing = False
+        
+        if failures and player.ctx:
+            await self.announce(player.ctx, self._failure_summary(failures, player, started))
+        
+        # 更新控制面板（失敗不影響已經開始的播放）
+        try:
+            if started and player.ctx and not player.control_message:
+                # 如果沒有控制面板但有上下文，則創建一個
+                await self.show_player(player.ctx)
             else:
-                # 隊列中沒有更多歌曲
-                print(f"隊列中沒有更多歌曲")
-                self.current[guild_id] = None
-                self.start_times[guild_id] = None
-                self.durations[guild_id] = None
-                
-                # 更新控制面板
-                if guild_id in self.player_contexts and guild_id in self.control_messages:
-                    ctx = self.player_contexts[guild_id]
-                    view = MusicControlView(self, ctx)
-                    view.message = self.control_messages[guild_id]
-                    await view.update_player()
+                await self.update_player(guild_id)
+        except Exception as e:
+            print(f"更新播放器錯誤: {e}")
+
+    def _failure_summary(self, failures, player, started):
+        titles = "、".join(song.title or '未知歌曲' for song, _ in failures[:3])
+        if len(failures) > 3:
+            titles += f" 等 {len(failures)} 首"
+        line = f"⚠️ 無法播放 {titles}: {str(failures[-1][1])[:200]}"
+        if not started and player.queue and len(failures) >= self.max_play_failures:
+            line += f"\n連續 {len(failures)} 首無法播放，已停止自動播放（隊列中還有 {len(player.queue)} 首），用 $$play 點歌時會繼續"
+        return line
+
+    async def _start_track(self, player, next_song):
+        """建立音頻源並開始播放一首歌，失敗時拋出例外"""
+        guild_id = player.guild_id
+        player.current = next_song
+        # 從快照恢復的歌曲接著中斷時的位置播放
+        offset = 0
+        if player.resume_at is not None:
+            if player.resume_at[0] is next_song:
+                offset = player.resume_at[1]
+            player.resume_at = None
+        
+        # 優先使用在上一首結束前就啟動好的音頻源
+        source = self.take_prepared(player, next_song)
+        cached_path = None
+        if source is not None:
+            self.prepared_hits += 1
+        else:
+            self.prepared_misses += 1
+            cached_path = await self.track_cache.lookup(next_song.id)
+        
+        if source is None and cached_path:
+            # 常播歌曲直接讀取本機檔案，不需要解析串流
+            source = self.create_source(cached_path, player, 'opus', local=True, start=offset)
+        elif source is None:
+            # 即時取得串流URL（通常已由預先解析準備好）
+            stream_url = await self.ensure_stream(next_song, owner=guild_id)
+            if not stream_url:
+                raise RuntimeError(f"無法取得 {next_song.title or '未知歌曲'} 的串流")
+            
+            # 創建音頻源
+            try:
+                source = self.create_source(stream_url, player, next_song.acodec, start=offset)
+                print("成功創建音頻源")
+            except Exception as e:
+                print(f"創建音頻源時出錯: {e}")
+                raise
+        
+        print(f"開始播放: {next_song.title or '未知'} - 持續時間: {next_song.duration}秒")
+        
+        # 播放音頻
+        player.voice_client.play(
+            source, 
+            after=lambda e: self._on_track_end(guild_id, e)
+        )
+        
+        # 更新開始時間和持續時間
+        player.start_track(next_song, offset)
+        self.cache_track(next_song)
+        self.progress_updates.watch(guild_id)
+        # 開始播放新歌曲也算語音活動（取代逐則聊天訊息的活動檢查）
+        self.bot.idle.touch(guild_id)
+        
+        # 在歌曲結束前預先解析接下來的歌曲，並預先啟動下一首的音頻源
+        self.prefetcher.schedule(guild_id, player.remaining())
+        self.schedule_prepare(player)
 
     @commands.command(name='join')
     async def join(self, ctx):
         if not ctx.message.author.voice:
-            await ctx.send("你必須先加入一個語音頻道!")
+            await self.reply(ctx, "你必須先加入一個語音頻道!")
             return
             
         channel = ctx.message.author.voice.channel
@@ -480,34 +874,32 @@ class MusicCog(commands.Cog):
                 await asyncio.sleep(2)
                 
             voice_client = await channel.connect()
-            await ctx.send(f"已加入 {channel.name}!")
+            self.get_player(ctx.guild.id).voice_client = voice_client
+            await self.announce(ctx, f"已加入 {channel.name}!")
             
         except Exception as e:
-            await ctx.send(f"加入頻道時發生錯誤: {str(e)}")
+            await self.reply(ctx, f"加入頻道時發生錯誤: {str(e)}")
             print(f"Voice connection error: {str(e)}")
 
     @commands.command(name='play')
     async def play(self, ctx, *, query=None):
         """播放歌曲"""
         if not ctx.author.voice:
-            await ctx.send('你必須加入一個語音頻道才能使用這個指令')
+            await self.reply(ctx, '你必須加入一個語音頻道才能使用這個指令')
             return
         
         if not query:
-            await ctx.send('請提供歌曲名稱或URL')
+            await self.reply(ctx, '請提供歌曲名稱或URL')
             return
         
-        voice_channel = ctx.author.voice.channel
         guild_id = ctx.guild.id
+        started = time.monotonic()
         
         # 加入語音頻道
-        if guild_id not in self.voice_clients or not self.voice_clients[guild_id].is_connected():
-            self.voice_clients[guild_id] = await voice_channel.connect()
-        elif self.voice_clients[guild_id].channel != voice_channel:
-            await self.voice_clients[guild_id].move_to(voice_channel)
+        player = await self.ensure_voice(ctx)
         
         # 顯示正在搜尋的訊息
-        searching_msg = await ctx.send(f'🔍 正在搜尋: {query}')
+        searching_msg = await self.reply(ctx, f'🔍 正在搜尋: {query}')
         
         # 處理YouTube Music連結
         if 'music.youtube.com' in query:
@@ -519,138 +911,138 @@ class MusicCog(commands.Cog):
             # 改進URL檢測正則表達式，包含更多YouTube URL格式
             is_url = re.match(r'^(https?://)?(www\.|music\.)?(youtube\.com/watch\?v=|youtu\.be/|youtube\.com/playlist\?list=)([a-zA-Z0-9_-]+)', query)
             
-            with yt_dlp.YoutubeDL(self.ytdl_opts) as ytdl:
-                if not is_url:
-                    # 搜尋模式時，先檢查搜尋結果是否為空
-                    search_result = ytdl.extract_info(f"ytsearch:{query}", download=False)
-                    if not search_result or 'entries' not in search_result or not search_result['entries'] or len(search_result['entries']) == 0:
-                        await searching_msg.edit(content=f'❌ 無法找到符合 "{query}" 的結果')
-                        return
-                    info = search_result['entries'][0]
-                else:
-                    # 直接URL模式
-                    info = ytdl.extract_info(query, download=False)
+            # 先查快取：搜尋字串/連結 -> 影片ID
+            video_id = self.metadata_cache.get_video_id(query)
+            
+            if video_id is None and not is_url:
+                # 搜尋模式時，先檢查搜尋結果是否為空
+                video_id = await self.search_video(query, owner=guild_id)
+                if not video_id:
+                    await self.bot.outbound.edit(searching_msg, content=f'❌ 無法找到符合 "{query}" 的結果')
+                    return
+            
+            if video_id:
+                # 影片ID -> 歌曲資訊，只有串流URL過期時才重新解析
+                song_info = await self.resolve_video(video_id, owner=guild_id)
+                if not song_info:
+                    await self.bot.outbound.edit(searching_msg, content=f'❌ 無法解析該影片信息')
+                    return
+            else:
+                # 直接URL模式
+                info = await self.inflight.do(f"url:{query}", lambda: self.extractor.extract(query), owner=guild_id)
                 
-            # 處理播放清單URL的情況
-            if info and 'entries' in info:
-                # 這是一個播放清單
-                await searching_msg.edit(content=f'⚠️ 這似乎是一個播放清單。請使用 `$$playlist {query}` 來播放整個清單，或選擇單個視頻來播放。')
-                return
+                # 處理播放清單URL的情況
+                if info and 'entries' in info:
+                    # 這是一個播放清單
+                    await self.bot.outbound.edit(searching_msg, content=f'⚠️ 這似乎是一個播放清單。請使用 `$$playlist {query}` 來播放整個清單，或選擇單個視頻來播放。')
+                    return
 
-            # 檢查info是否有效
-            if not info:
-                await searching_msg.edit(content=f'❌ 無法解析該影片信息')
-                return
+                # 檢查info是否有效
+                if not info:
+                    await self.bot.outbound.edit(searching_msg, content=f'❌ 無法解析該影片信息')
+                    return
 
-            # 確保必要的字段存在
-            if 'url' not in info or 'title' not in info:
-                await searching_msg.edit(content=f'❌ 影片信息不完整，無法播放')
-                return
-            
-            song_info = {
-                'url': info['url'],
-                'title': info['title'],
-                'duration': info.get('duration', 0),
-                'webpage_url': info.get('webpage_url', ''),
-                'thumbnail': info.get('thumbnail', '')  # 加入縮圖URL
-            }
+                # 確保必要的字段存在
+                if 'url' not in info or 'title' not in info:
+                    await self.bot.outbound.edit(searching_msg, content=f'❌ 影片信息不完整，無法播放')
+                    return
+                
+                self.metadata_cache.put_info(info)
+                song_info = Track.from_info(info)
             
             # 將歌曲添加到隊列
-            if guild_id not in self.queues:
-                self.queues[guild_id] = []
-            self.queues[guild_id].append(song_info)
+            player.enqueue(song_info)
             
             # 更新搜尋訊息
-            await searching_msg.edit(content=f'✅ 已將 **{song_info["title"]}** 添加到隊列')
+            await self.bot.outbound.edit(searching_msg, content=f'✅ 已將 **{song_info.title}** 添加到隊列')
             
             # 保存當前上下文以便更新控制面板
-            self.player_contexts[guild_id] = ctx
+            player.ctx = ctx
             
             # 如果沒有正在播放的歌曲，則播放這首歌
-            if not self.voice_clients[guild_id].is_playing() and not self.voice_clients[guild_id].is_paused():
+            if not player.is_busy():
+                player.audio_requested = ('play', started)
                 await self.play_next(guild_id)
+            else:
+                # 新歌可能落在預先解析的範圍內
+                self.prefetcher.schedule(guild_id, player.remaining())
                 
             # 無論如何都重新顯示控制面板
             await self.refresh_player(ctx)
                     
+        except ExtractionCancelled:
+            await self.bot.outbound.edit(searching_msg, content=f'⏹️ 已取消搜尋: {query}')
         except Exception as e:
             error_msg = str(e)
-            await searching_msg.edit(content=f'❌ 發生錯誤: {error_msg[:1500] if len(error_msg) > 1500 else error_msg}')
+            await self.bot.outbound.edit(searching_msg, content=f'❌ 發生錯誤: {error_msg[:1500] if len(error_msg) > 1500 else error_msg}')
             print(f"播放歌曲時發生錯誤: {e}")
 
     @commands.command(name='leave')
     async def leave(self, ctx):
         """離開語音頻道"""
-        guild_id = ctx.guild.id
+        player = self.players.get(ctx.guild.id)
         
-        if guild_id in self.voice_clients and self.voice_clients[guild_id].is_connected():
-            await self.voice_clients[guild_id].disconnect()
-            self.voice_clients[guild_id] = None
-            self.queues[guild_id] = []
-            self.current[guild_id] = None
-            self.start_times[guild_id] = None
-            self.durations[guild_id] = None
-            await ctx.send('已離開語音頻道')
+        if player and player.is_connected():
+            # 先移除狀態再斷線，避免 after 回呼播放下一首
+            self.destroy_player(ctx.guild.id)
+            await player.voice_client.disconnect()
+            await self.announce(ctx, '已離開語音頻道')
             
             # 更新控制面板
-            if guild_id in self.player_contexts and guild_id in self.control_messages:
-                try:
-                    view = MusicControlView(self, self.player_contexts[guild_id])
-                    view.message = self.control_messages[guild_id]
-                    await view.update_player()
-                except Exception as e:
-                    print(f"更新播放器控制面板時發生錯誤: {e}")
+            if player.ctx and player.control_message:
+                await self.update_panel(player.control_message, ctx.guild.id)
         else:
-            await ctx.send('機器人不在語音頻道中')
+            self.destroy_player(ctx.guild.id)
+            await self.reply(ctx, '機器人不在語音頻道中')
 
     @commands.command(name='pause')
     async def pause(self, ctx):
         """暫停音樂"""
         if ctx.voice_client and ctx.voice_client.is_playing():
             ctx.voice_client.pause()
-            await ctx.send("音樂已暫停!")
+            self.get_player(ctx.guild.id).mark_paused()
+            await self.announce(ctx, "音樂已暫停!")
             # 更新控制面板
-            await self.update_player()
+            await self.update_player(ctx.guild.id)
 
     @commands.command(name='resume')
     async def resume(self, ctx):
         """繼續播放"""
         if ctx.voice_client and ctx.voice_client.is_paused():
             ctx.voice_client.resume()
-            await ctx.send("繼續播放!")
+            self.get_player(ctx.guild.id).mark_resumed()
+            self.progress_updates.watch(ctx.guild.id)
+            await self.announce(ctx, "繼續播放!")
             # 更新控制面板
-            await self.update_player()
+            await self.update_player(ctx.guild.id)
 
     @commands.command(name='queue')
     async def queue(self, ctx):
         """顯示播放隊列"""
-        if len(self.queues.get(ctx.guild.id, [])) == 0:
-            await ctx.send('播放隊列是空的!')
+        player = self.players.get(ctx.guild.id)
+        if not player or len(player.queue) == 0:
+            await self.reply(ctx, '播放隊列是空的!')
             return
         
-        queue_list = '\n'.join([f'{i+1}. {song["title"]}' for i, song in enumerate(self.queues[ctx.guild.id])])
-        
-        if len(queue_list) > 2000:
-            chunks = [queue_list[i:i+2000] for i in range(0, len(queue_list), 2000)]
-            for chunk in chunks:
-                await ctx.send(chunk)
-        else:
-            await ctx.send(f'當前播放隊列:\n{queue_list}')
+        view = QueueView(self, ctx)
+        view.message = await self.reply(ctx, embed=view.build_embed(), view=view)
 
     @commands.command(name='skip')
     async def skip(self, ctx):
         """跳過當前歌曲"""
         if ctx.voice_client and (ctx.voice_client.is_playing() or ctx.voice_client.is_paused()):
             ctx.voice_client.stop()
-            await ctx.send('已跳過當前歌曲!')
+            await self.announce(ctx, '已跳過當前歌曲!')
 
     @commands.command(name='clear')
     async def clear(self, ctx):
         """清空播放隊列"""
-        self.queues[ctx.guild.id] = []
-        await ctx.send('播放隊列已清空!')
+        player = self.players.get(ctx.guild.id)
+        if player:
+            player.clear()
+        await self.announce(ctx, '播放隊列已清空!')
         # 更新控制面板
-        await self.update_player()
+        await self.update_player(ctx.guild.id)
 
     @commands.command(name='loop')
     async def loop(self, ctx):
@@ -665,108 +1057,73 @@ class MusicCog(commands.Cog):
     @commands.command(name='progress')
     async def progress(self, ctx):
         """顯示當前歌曲播放進度"""
-        if not ctx.voice_client or not self.current.get(ctx.guild.id) or not self.start_times.get(ctx.guild.id):
-            await ctx.send("目前沒有播放歌曲！")
+        player = self.players.get(ctx.guild.id)
+        if not ctx.voice_client or not player or not player.current or player.started_at is None:
+            await self.reply(ctx, "目前沒有播放歌曲！")
             return
             
         # 直接調用播放器命令以顯示完整控制面板
         await self.player(ctx)
 
-    async def process_playlist_entries(self, ctx, entries, start_idx, end_idx):
-        """處理播放清單中的歌曲"""
-        success_count = 0
-        failed_songs = []
-        guild_id = ctx.guild.id
+    async def build_playlist_song(self, entry, owner=None):
+        """把播放清單項目轉成歌曲資料，失敗時回傳None"""
+        # 確保entry有id字段
+        if not entry.get('id'):
+            return None
         
-        for i, entry in enumerate(entries[start_idx:end_idx]):
-            try:
-                if entry is None:
-                    continue
-                    
-                # 確保entry有id字段
-                if 'id' not in entry:
-                    failed_songs.append(entry.get('title', '未知歌曲'))
-                    continue
-                
-                video_url = f"https://www.youtube.com/watch?v={entry['id']}"
-                
-                try:
-                    video_info = await asyncio.get_event_loop().run_in_executor(
-                        None,
-                            lambda: yt_dlp.YoutubeDL(self.ytdl_opts).extract_info(video_url, download=False)
-                        )
-                        
-                    if not video_info or 'url' not in video_info or 'title' not in video_info:
-                        failed_songs.append(entry.get('title', f'ID: {entry.get("id", "未知")}'))
-                        continue
-                    
-                    song = {
-                        'url': video_info['url'],
-                            'title': video_info['title'],
-                            'duration': video_info.get('duration', 0),
-                            'webpage_url': video_info.get('webpage_url', ''),
-                            'thumbnail': video_info.get('thumbnail', '')
-                        }
-                        
-                    if guild_id not in self.queues:
-                        self.queues[guild_id] = []
-                            
-                    self.queues[guild_id].append(song)
-                    success_count += 1
-                
-                except Exception as inner_e:
-                    print(f"處理播放清單項目時發生錯誤: {inner_e}")
-                    failed_songs.append(entry.get('title', f'ID: {entry.get("id", "未知")}'))
-                    continue
-                
-            except Exception as e:
-                failed_songs.append(entry.get('title', f'ID: {entry.get("id", "未知")}'))
-                print(f"處理播放清單項目時發生錯誤: {e}")
-                continue
-                
-        return success_count, failed_songs
+        # 扁平解析已經有標題和長度時不需要額外請求，串流URL等到快播放時才解析
+        if entry.get('title') and entry.get('duration'):
+            return Track.from_entry(entry)
+        
+        # 缺少長度通常代表影片不可用或資訊不完整，完整解析一次確認
+        return await self.resolve_video(entry['id'], owner=owner, kind='playlist_entry')
 
-    async def process_remaining_songs(self, ctx, entries, start_idx):
-        """背景處理剩餘的歌曲"""
-        try:
-            total_remaining = len(entries) - start_idx
-            if total_remaining <= 0:
-                return
-                
-            success_count, failed_songs = await self.process_playlist_entries(ctx, entries, start_idx, len(entries))
-            
-            status_message = f"背景處理完成! 已額外加入 {success_count} 首歌曲到播放隊列"
-            if failed_songs:
-                status_message += f"\n無法處理 {len(failed_songs)} 首歌曲"
-            
-            await ctx.send(status_message)
-            
-        except Exception as e:
-            await ctx.send("背景處理其餘歌曲時發生錯誤")
-            print(f"背景處理錯誤: {str(e)}")
+    def enqueue_song(self, guild_id, song):
+        """把歌曲加入伺服器的播放隊列"""
+        self.get_player(guild_id).enqueue(song)
 
     @commands.command(name='playlist')
     async def playlist(self, ctx, url):
         """播放整個播放清單"""
         if not ctx.author.voice:
-            await ctx.send('你必須加入一個語音頻道才能使用這個指令')
+            await self.reply(ctx, '你必須加入一個語音頻道才能使用這個指令')
             return
 
-        voice_channel = ctx.author.voice.channel
         guild_id = ctx.guild.id
+        started = time.monotonic()
         
         # 加入語音頻道
-        if guild_id not in self.voice_clients or not self.voice_clients[guild_id].is_connected():
-            self.voice_clients[guild_id] = await voice_channel.connect()
-        elif self.voice_clients[guild_id].channel != voice_channel:
-            await self.voice_clients[guild_id].move_to(voice_channel)
+        player = await self.ensure_voice(ctx)
 
         # 處理YouTube Music連結
         if 'music.youtube.com' in url:
             url = url.replace('music.youtube.com', 'www.youtube.com')
             print(f"轉換YouTube Music URL: {url}")
 
-        await ctx.send("正在處理播放清單...")
+        # 整個匯入過程只使用這一則狀態訊息
+        status_msg = await self.reply(ctx, "正在處理播放清單...")
+        
+        # 保存上下文
+        player.ctx = ctx
+        
+        async def start_playback():
+            # 第一首歌加入隊列後立即開始播放，其餘歌曲繼續在背景加入
+            if player.is_connected() and not player.is_busy():
+                player.audio_requested = ('playlist', started)
+                await self.play_next(guild_id)
+                
+                # 自動顯示音樂播放器控制面板
+                await self.show_player(ctx)
+            else:
+                self.prefetcher.schedule(guild_id, player.remaining())
+        
+        async def report_progress(progress):
+            if progress.done:
+                return
+            content = f"📥 正在加入播放清單... 已加入 {progress.added} 首歌曲"
+            if progress.failed:
+                content += f"，無法處理 {progress.failed} 首"
+            await self.bot.outbound.edit(status_msg, content=content, priority=PRIORITY_STATUS)
         
         try:
             playlist_opts = self.ytdl_opts.copy()
@@ -775,118 +1132,158 @@ class MusicCog(commands.Cog):
                 'extract_flat': True,
             })
             
-            with yt_dlp.YoutubeDL(playlist_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                if not info:
-                    await ctx.send("❌ 無法解析播放清單信息")
-                    return
+            progress = await self.playlist_ingestor.ingest(
+                url,
+                opts=playlist_opts,
+                owner=guild_id,
+                on_first=start_playback,
+                on_progress=report_progress
+            )
+            
+            if progress.cancelled:
+                await self.bot.outbound.edit(status_msg, content="⏹️ 已取消處理播放清單")
+            elif progress.timed_out and progress.added == 0:
+                await self.bot.outbound.edit(status_msg, content="讀取播放清單逾時，請稍後再試。")
+            elif not progress.is_playlist:
+                await self.bot.outbound.edit(status_msg, content="這似乎不是一個播放清單連結。請使用 $$play 指令來播放單一歌曲。")
+            elif progress.added == 0:
+                await self.bot.outbound.edit(status_msg, content="無法從播放清單中找到任何可用的歌曲。")
+            else:
+                content = f"✅ 已加入 {progress.added} 首歌曲到播放隊列"
+                if progress.title:
+                    content = f"✅ 已將 **{progress.title}** 的 {progress.added} 首歌曲加入播放隊列"
+                if progress.failed:
+                    content += f"\n無法處理 {progress.failed} 首歌曲"
+                if progress.timed_out:
+                    content += "\n⚠️ 讀取播放清單逾時，只加入了已讀到的歌曲"
+                await self.bot.outbound.edit(status_msg, content=content)
+                print(f"播放清單匯入完成: {progress.added} 首，耗時 {progress.elapsed:.1f} 秒")
                 
-                if 'entries' in info:
-                    entries = [entry for entry in info['entries'] if entry is not None]
-                    total_songs = len(entries)
-                    
-                    if total_songs == 0:
-                        await ctx.send("無法從播放清單中找到任何可用的歌曲。")
-                        return
-                        
-                    initial_batch = min(5, total_songs)
-                    await ctx.send(f"開始處理前 {initial_batch} 首歌曲...")
-                    
-                    # 確保guild_id在隊列中存在
-                    if guild_id not in self.queues:
-                        self.queues[guild_id] = []
-                    
-                    success_count, failed_songs = await self.process_playlist_entries(ctx, entries, 0, initial_batch)
-                    
-                    status_message = f"已加入 {success_count} 首歌曲到播放隊列並開始播放!"
-                    if failed_songs:
-                        status_message += f"\n無法處理 {len(failed_songs)} 首歌曲"
-                    if total_songs > initial_batch:
-                        status_message += f"\n將在背景繼續處理剩餘 {total_songs - initial_batch} 首歌曲..."
-                    
-                    await ctx.send(status_message)
-                    
-                    # 保存上下文
-                    self.player_contexts[guild_id] = ctx
-                    
-                    # 開始播放
-                    if guild_id in self.voice_clients and not self.voice_clients[guild_id].is_playing() and guild_id in self.queues and len(self.queues[guild_id]) > 0:
-                        await self.play_next(guild_id)
-                        
-                        # 自動顯示音樂播放器控制面板
-                        await self.show_player(ctx)
-                    
-                    if total_songs > initial_batch:
-                        asyncio.create_task(self.process_remaining_songs(ctx, entries, initial_batch))
-                    
-                else:
-                    await ctx.send("這似乎不是一個播放清單連結。請使用 $$play 指令來播放單一歌曲。")
-                    
         except Exception as e:
             error_msg = str(e)
-            await ctx.send(f"處理播放清單時發生錯誤，請確認連結是否正確: {error_msg[:100]}")
+            await self.bot.outbound.edit(status_msg, content=f"處理播放清單時發生錯誤，請確認連結是否正確: {error_msg[:100]}")
             print(f"播放清單錯誤: {str(e)}")  # 為了調試添加詳細錯誤輸出
 
     @commands.command(name='shuffle')
     async def shuffle(self, ctx):
         """隨機播放隊列"""
-        if len(self.queues.get(ctx.guild.id, [])) > 1:
-            random.shuffle(self.queues[ctx.guild.id])
-            await ctx.send('播放隊列已隨機排序!')
+        player = self.players.get(ctx.guild.id)
+        if player and len(player.queue) > 1:
+            player.shuffle()
+            await self.announce(ctx, '播放隊列已隨機排序!')
         else:
-            await ctx.send('播放隊列中沒有足夠的歌曲來隨機排序!')
+            await self.reply(ctx, '播放隊列中沒有足夠的歌曲來隨機排序!')
 
     @commands.Cog.listener()
     async def on_ready(self):
         print(f"{self.__class__.__name__} is ready!")
         
+    def collect_metrics(self):
+        """提供給 /metrics 的即時狀態"""
+        queue_lengths = [len(player.queue) for player in self.players.values()]
+        playing = sum(1 for player in self.players.values()
+                      if player.voice_client is not None and player.voice_client.is_playing())
+        return [
+            ('bot_music_players', 'gauge', '有播放器的伺服器數量', [({}, len(self.players))]),
+            ('bot_music_playing', 'gauge', '正在播放的語音連線數量', [({}, playing)]),
+            ('bot_music_queued_tracks', 'gauge', '所有隊列中的歌曲數', [({}, sum(queue_lengths))]),
+            ('bot_music_max_queue_length', 'gauge', '最長的隊列', [({}, max(queue_lengths, default=0))]),
+            ('bot_ffmpeg_processes', 'gauge', '尚未關閉的 FFmpeg 音頻源', [({}, PrebufferedSource.open_count)]),
+            ('bot_extractions_pending', 'gauge', '排隊中或執行中的 yt-dlp 解析', [({}, self.extractor.pending())]),
+            ('bot_panel_edits_total', 'counter', '控制面板的更新次數', [
+                ({'result': key}, self.panel.stats[key]) for key in ('edits', 'coalesced', 'unchanged')
+            ]),
+        ]
+
     def cog_unload(self):
         """卸載Cog時停止任務"""
         # 取消注册按钮處理函数
         self.bot.remove_listener(self.button_callback, "on_interaction")
+        registry.remove_collector('music')
+        if self._restore_task is not None:
+            self._restore_task.cancel()
+        # 關閉解析執行緒池與快取資料庫
+        self.prefetcher.shutdown()
+        self.progress_updates.shutdown()
+        for player in self.players.values():
+            self.discard_prepared(player)
+        # 保存最新的播放位置後清空播放器：舊實例的 after 回呼不再播放下一首
+        # （解析執行緒池即將關閉），有快照時由新實例接手
+        self.closed = True
+        self.sessions.shutdown(self.players)
+        self.players.clear()
+        self.extractor.shutdown()
+        self.metadata_cache.close()
+        self.track_cache.shutdown()
 
     async def toggle_loop(self, ctx):
         """切換循環模式的內部方法"""
-        guild_id = ctx.guild.id
+        player = self.get_player(ctx.guild.id)
         
         # 切換循環模式
-        if guild_id not in self.loop_mode:
-            self.loop_mode[guild_id] = False
-        
-        self.loop_mode[guild_id] = not self.loop_mode[guild_id]
+        player.set_loop(not player.loop)
         
         # 發送通知
-        status = "開啟" if self.loop_mode[guild_id] else "關閉"
-        await ctx.send(f'🔁 循環模式已{status}')
+        status = "開啟" if player.loop else "關閉"
+        await self.announce(ctx, f'🔁 循環模式已{status}')
 
+    async def rewind(self, player):
+        """返回上一首歌，回傳該歌曲；沒有播放歷史時回傳None"""
+        if player.advancing or not player.is_connected():
+            return None
+        
+        previous = player.rewind()
+        if previous is None:
+            return None
+        
+        vc = player.voice_client
+        if vc.is_playing() or vc.is_paused():
+            # 停止後由 after 回呼播放隊列最前面的上一首歌
+            vc.stop()
+        else:
+            await self.play_next(player.guild_id)
+        return previous
+
+    @commands.command(name='previous')
     async def previous_song(self, ctx):
         """播放上一首歌曲"""
-        guild_id = ctx.guild.id
+        player = self.players.get(ctx.guild.id)
+        previous = await self.rewind(player) if player else None
         
-        # 目前還沒有實現記錄歷史播放列表的功能
-        # 這裡只是一個簡單的示例，實際上會返回一個訊息
-        await ctx.send("⏮️ 上一首功能尚未實現")
+        if previous:
+            # 串流URL仍有效時會直接重播，過期時才重新解析
+            await self.announce(ctx, f"⏮️ 返回上一首: {previous.title}")
+        else:
+            await self.reply(ctx, "⏮️ 沒有可以返回的上一首歌曲")
+
+    @commands.command(name='history')
+    async def history(self, ctx):
+        """顯示最近播放過的歌曲"""
+        player = self.players.get(ctx.guild.id)
+        if not player or not player.history:
+            await self.reply(ctx, '目前沒有播放歷史!')
+            return
+        
+        recent = list(reversed(player.history))[:10]
+        history_list = '\n'.join([f'{i+1}. {track.title}' for i, track in enumerate(recent)])
+        await self.reply(ctx, 
+            f'最近播放 ({len(player.history)}/{player.history.maxlen} 首，約 {player.history_bytes() / 1024:.1f} KB):\n{history_list}'
+        )
 
     def get_progress_info(self, guild_id):
         """取得當前播放進度信息"""
-        if (guild_id not in self.start_times or 
-            self.start_times[guild_id] is None or 
-            guild_id not in self.durations or 
-            self.durations[guild_id] is None or
-            self.durations[guild_id] <= 0):
+        player = self.players.get(guild_id)
+        if not player or player.started_at is None or player.duration <= 0:
             # 檢查是否正在播放但沒有時間信息
-            if (guild_id in self.voice_clients and 
-                self.voice_clients[guild_id] and 
-                (self.voice_clients[guild_id].is_playing() or self.voice_clients[guild_id].is_paused())):
+            if (player and player.voice_client and 
+                (player.voice_client.is_playing() or player.voice_client.is_paused())):
                 print(f"警告: 伺服器 {guild_id} 正在播放但無法獲取進度信息")
             return None
             
-        current_time = datetime.now() - self.start_times[guild_id]
-        elapsed_seconds = int(current_time.total_seconds())
+        elapsed_seconds = int(player.elapsed())
         
         # 確保不超過總時長
-        duration = self.durations[guild_id]
+        duration = player.duration
         if duration <= 0:
             return None
             
@@ -936,54 +1333,102 @@ class MusicCog(commands.Cog):
         """停止播放並清空隊列"""
         guild_id = ctx.guild.id
         
-        if guild_id in self.voice_clients and self.voice_clients[guild_id] and self.voice_clients[guild_id].is_playing():
-            self.voice_clients[guild_id].stop()
-            self.current[guild_id] = None
-            self.start_times[guild_id] = None
-            self.durations[guild_id] = None
-            
-        if guild_id in self.queues:
-            self.queues[guild_id] = []
+        # 取消這個伺服器仍在進行的解析
+        self.playlist_ingestor.cancel(guild_id)
+        self.prefetcher.cancel(guild_id)
+        self.inflight.cancel(guild_id)
+        self.extractor.cancel(guild_id)
+        
+        player = self.players.get(guild_id)
+        if player:
+            # 先清空隊列，停止後的 after 回呼就不會播放下一首
+            self.discard_prepared(player)
+            player.clear()
+            if player.voice_client and (player.voice_client.is_playing() or player.voice_client.is_paused()):
+                player.reset_track()
+                player.voice_client.stop()
             
-        await ctx.send("已停止播放並清空隊列")
+        await self.announce(ctx, "已停止播放並清空隊列")
         
         # 更新控制面板
-        if guild_id in self.player_contexts and guild_id in self.control_messages:
-            try:
-                ctx = self.player_contexts[guild_id]
-                view = MusicControlView(self, ctx)
-                view.message = self.control_messages[guild_id]
-                await view.update_player()
-            except Exception as e:
-                print(f"更新播放器控制面板時發生錯誤: {e}")
+        await self.update_player(guild_id)
+
+    @commands.command(name='cachestats')
+    @commands.is_owner()
+    async def cache_stats(self, ctx):
+        """顯示歌曲資訊快取的命中統計"""
+        stats = self.metadata_cache.stats
+        lines = [f"{name}: {value}" for name, value in stats.items()]
+        lines.append(f"命中率: {self.metadata_cache.hit_rate():.1%}")
+        lines.extend(f"inflight_{name}: {value}" for name, value in self.inflight.stats.items())
+        if self.track_cache.enabled:
+            disk = self.track_cache.stats
+            lines.append(
+                f"本機快取: {len(self.track_cache)} 首 / {self.track_cache.bytes_cached / 1024 / 1024:.1f} MB "
+                f"（上限 {self.track_cache.max_bytes / 1024 / 1024:.0f} MB，{self.track_cache.policy}）"
+            )
+            lines.append(
+                f"本機命中率: {self.track_cache.hit_rate():.1%} / 節省流量: {disk['bytes_saved'] / 1024 / 1024:.1f} MB / "
+                f"寫入: {disk['fills']} / 失敗: {disk['fill_failures']} / 淘汰: {disk['evictions']}"
+            )
+        if self.sessions.enabled:
+            sessions = self.sessions.stats
+            lines.append(
+                f"播放狀態快照: {len(self.sessions)} 個伺服器 / 寫入 {sessions['flushes']} 次（{sessions['rows_written']} 列、"
+                f"播放位置 {sessions['positions_written']} 次）/ "
+                f"已恢復: {sessions['restored']}"
+            )
+        await self.reply(ctx, "```\n" + "\n".join(lines) + "\n```")
+
+    @commands.command(name='audiostats')
+    @commands.is_owner()
+    async def audio_stats(self, ctx):
+        """顯示歌曲之間的空白時間統計"""
+        count, average, p50, p95, worst = self.gap_tracker.summary()
+        lines = [
+            f"切換次數: {count}",
+            f"預先啟動命中: {self.prepared_hits} / 未命中: {self.prepared_misses}",
+            f"播放模式: {self.audio_mode}",
+            f"音頻源 Opus直通: {self.source_counts['opus_copy']} / Opus轉碼: {self.source_counts['opus_transcode']} / PCM: {self.source_counts['pcm']}",
+        ]
+        if average is not None:
+            lines.append(
+                f"空白時間 平均 {average * 1000:.0f}ms / p50 {p50 * 1000:.0f}ms / "
+                f"p95 {p95 * 1000:.0f}ms / 最大 {worst * 1000:.0f}ms"
+            )
+        await self.reply(ctx, "```\n" + "\n".join(lines) + "\n```")
 
     @commands.command(name='refresh')
     async def refresh_player_cmd(self, ctx):
         """重新顯示音樂播放器控制面板在當前位置"""
-        guild_id = ctx.guild.id
+        player = self.players.get(ctx.guild.id)
         
-        if guild_id not in self.voice_clients or not self.voice_clients[guild_id].is_connected():
-            await ctx.send("機器人目前不在語音頻道中")
+        if not player or not player.is_connected():
+            await self.reply(ctx, "機器人目前不在語音頻道中")
             return
             
-        if guild_id not in self.current or not self.current[guild_id]:
-            await ctx.send("目前沒有播放任何歌曲")
+        if not player.current:
+            await self.reply(ctx, "目前沒有播放任何歌曲")
             return
             
         await self.refresh_player(ctx)
-        await ctx.send("已刷新播放器控制面板！", delete_after=2)
+        await self.reply(ctx, "已刷新播放器控制面板！", delete_after=2)
 
     async def refresh_player(self, ctx):
         """刷新播放器控制面板（刪除舊的並創建新的）"""
         guild_id = ctx.guild.id
         
+        player = self.players.get(guild_id)
+        
         # 如果已經有控制面板，嘗試刪除它
-        if guild_id in self.control_messages:
+        if player and player.control_message:
+            self.panel.forget(player.control_message)
             try:
-                await self.control_messages[guild_id].delete()
+                await player.control_message.delete()
                 print(f"已刪除舊的控制面板")
             except Exception as e:
                 print(f"刪除舊控制面板時發生錯誤: {e}")
+            player.control_message = None
         
         # 創建新的控制面板
         await self.show_player(ctx)
@@ -992,62 +1437,29 @@ class MusicCog(commands.Cog):
         """顯示音樂播放器控制面板"""
         guild_id = ctx.guild.id
         
+        player = self.players.get(guild_id)
+        
         # 確保只有在播放音樂時才顯示
-        if not self.voice_clients.get(guild_id) or not self.current.get(guild_id):
-            await ctx.send("目前沒有播放任何歌曲")
+        if not player or not player.voice_client or not player.current:
+            await self.reply(ctx, "目前沒有播放任何歌曲")
             return
         
         # 創建控制面板View
         view = MusicControlView(self, ctx)
         
         # 創建嵌入式訊息
-        embed = discord.Embed(title="🎵 音樂播放器", color=discord.Color.purple())
-        
-        current = self.current[guild_id]
-        
-        # 播放狀態
-        vc = self.voice_clients[guild_id]
-        status = "▶️"
-        
-        # 循環狀態
-        loop_status = "🔁 循環模式: 開啟" if self.loop_mode.get(guild_id, False) else "🔁 循環模式: 關閉"
-        
-        # 進度條
-        progress_info = self.get_progress_info(guild_id)
-        if progress_info:
-            current_time, duration, percentage = progress_info
-            progress_bar = self.create_progress_bar(percentage)
-        else:
-            current_time = "00:00"
-            duration = "00:00"
-            progress_bar = "`──────────────────────`"
-        
-        # 當前歌曲資訊
-        title = current.get('title', '未知歌曲')
-        url = current.get('webpage_url', '')
-        
-        embed.description = f"**正在播放:** [{title}]({url})\n\n{loop_status}\n\n{status}  {current_time}  {progress_bar}  {duration}"
-        
-        # 如果有縮圖
-        if 'thumbnail' in current and current['thumbnail']:
-            embed.set_thumbnail(url=current['thumbnail'])
-        
-        # 展示隊列中的下一首歌曲
-        queue = self.queues.get(guild_id, [])
-        if queue and len(queue) > 0:
-            next_songs = list(islice(queue, 0, 3))
-            queue_text = "\n".join([f"{i+1}. {song.get('title', '未知歌曲')}" for i, song in enumerate(next_songs)])
-            if len(queue) > 3:
-                queue_text += f"\n... 還有 {len(queue) - 3} 首歌"
-            embed.add_field(name="播放隊列", value=queue_text, inline=False)
+        snapshot = self.panel_snapshot(guild_id)
+        embed = build_panel_embed(snapshot)
         
         # 發送控制面板
-        control_message = await ctx.send(embed=embed, view=view)
+        control_message = await self.bot.outbound.send(ctx.channel, embed=embed, view=view, priority=PRIORITY_PLAYER)
         view.message = control_message
+        self.panel.remember(control_message, snapshot, embed)
         
         # 儲存上下文和訊息以便後續更新
-        self.player_contexts[guild_id] = ctx
-        self.control_messages[guild_id] = control_message
+        player.ctx = ctx
+        player.control_message = control_message
+        self.progress_updates.watch(guild_id)
 
 async def setup(bot):
     await bot.add_cog(MusicCog(bot))
@@ -0,0 +1,71 @@
+"""叢集模式啟動器：把分片分配給多個 bot.py 工作行程
+
+用法：
+    python launcher.py --clusters 4                 # 分片數量使用 Discord 建議值
+    python launcher.py --clusters 4 --shards 16
+    python launcher.py --fake-gateway --guilds 200 --clusters 2 --shards 4 --message-rate 50
+
+--fake-gateway 不連線到 Discord，改用本機的假閘道（見 utils/fake_gateway.py），
+可以用 curl -X POST <網址>/_fake/inject -d '{"content": "$$clusters"}' 注入指令。
+"""
+import argparse
+import asyncio
+import os
+
+import aiohttp
+from dotenv import load_dotenv
+
+from utils.cluster import ClusterLauncher
+from utils.fake_gateway import FakeGateway
+
+load_dotenv()
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bot.py')
+
+
+async def recommended_shards(token):
+    """向 Discord 查詢建議的分片數量"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            'https://discord.com/api/v10/gateway/bot', headers={'Authorization': f'Bot {token}'}
+        ) as response:
+            response.raise_for_status()
+            return (await response.json())['shards']
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clusters', type=int, default=int(os.getenv('CLUSTER_COUNT', os.cpu_count() or 1)),
+                        help='工作行程數量')
+    parser.add_argument('--shards', type=int, default=int(os.getenv('SHARD_COUNT', '0')) or None,
+                        help='分片總數（預設使用 Discord 建議值，假閘道時等於行程數量）')
+    parser.add_argument('--fake-gateway', action='store_true', help='使用本機的假閘道測試')
+    parser.add_argument('--guilds', type=int, default=20, help='假閘道的伺服器數量')
+    parser.add_argument('--message-rate', type=float, default=0.0, help='假閘道每秒產生的合成訊息數')
+    args = parser.parse_args()
+
+    env = {}
+    gateway = None
+    if args.fake_gateway:
+        shard_count = args.shards or args.clusters
+        gateway = FakeGateway(args.guilds, shard_count, args.message_rate)
+        url = await gateway.start()
+        env['FAKE_GATEWAY'] = url
+        print(f"[launcher] 假閘道: {url}（{args.guilds} 個伺服器）")
+    else:
+        shard_count = args.shards or await recommended_shards(os.getenv('DISCORD_TOKEN'))
+
+    launcher = ClusterLauncher(shard_count, args.clusters, BOT_SCRIPT, env=env)
+    try:
+        await launcher.run()
+    finally:
+        if gateway is not None:
+            print(gateway.summary())
+            await gateway.stop()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
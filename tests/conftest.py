@@ -0,0 +1,47 @@
+import asyncio
+import contextlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# 測試重複使用 benchmarks/fakes.py 的假物件
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+# 只使用記憶體：停用快照、磁碟快取、快取資料庫與指標端點
+for name in ('MUSIC_SESSION_DB', 'MUSIC_DISK_CACHE_DIR', 'MUSIC_CACHE_DB', 'METRICS_PORT'):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture
+def run():
+    """在新的事件迴圈中執行協程（不需要 pytest-asyncio）"""
+    return asyncio.run
+
+
+@pytest.fixture
+def music_cog():
+    """async with music_cog() as (bot, cog): 使用假 yt-dlp、語音連線與頻道的 MusicCog"""
+    import fakes
+    fakes.install()
+    from cogs.MusicCog import MusicCog
+
+    @contextlib.asynccontextmanager
+    async def create():
+        bot = fakes.FakeBot()
+        cog = MusicCog(bot)
+        bot.cogs['MusicCog'] = cog
+        try:
+            yield bot, cog
+        finally:
+            for player in list(cog.players.values()):
+                if player.voice_client is not None:
+                    await player.voice_client.disconnect()
+            if not cog.closed:
+                cog.cog_unload()
+            bot.close()
+            await asyncio.sleep(0)
+
+    return create
@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.extractor import ExtractionCancelled, ExtractionService, ExtractionTimeout
+
+
+def test_timed_out_call_keeps_its_slot_until_the_thread_finishes(run):
+    async def main():
+        service = ExtractionService({}, workers=1, timeout=0.05, max_pending=1)
+
+        def slow(ytdl, cancel_event):
+            time.sleep(0.3)
+            return 'slow'
+
+        def fast(ytdl, cancel_event):
+            return 'fast'
+
+        with pytest.raises(ExtractionTimeout):
+            await service.run(slow)
+        started = time.perf_counter()
+        result = await service.run(fast, timeout=5)
+        waited = time.perf_counter() - started
+        service.shutdown()
+        return result, waited
+
+    result, waited = run(main())
+    assert result == 'fast'
+    # 逾時的解析仍在執行緒中，新的請求要等它結束才拿到名額
+    assert waited > 0.15
+
+
+def test_owner_cancel_reports_cancelled(run):
+    async def main():
+        service = ExtractionService({}, workers=1, timeout=5)
+
+        def slow(ytdl, cancel_event):
+            cancel_event.wait(1)
+            return 'slow'
+
+        task = asyncio.create_task(service.run(slow, owner=7))
+        await asyncio.sleep(0.05)
+        assert service.cancel(7) == 1
+        with pytest.raises(ExtractionCancelled):
+            await task
+        service.shutdown()
+
+    run(main())
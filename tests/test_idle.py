@@ -0,0 +1,73 @@
+import asyncio
+
+from utils.idle import IdleScheduler, parse_guild_timeouts
+
+
+def test_parse_guild_timeouts_skips_invalid_items():
+    assert parse_guild_timeouts('1:60, 2:90.5,bad,3') == {1: 60.0, 2: 90.5}
+    assert parse_guild_timeouts('') == {}
+
+
+def test_deadlines_fire_in_order_and_touch_postpones(run):
+    async def main():
+        fired = []
+
+        async def on_idle(guild_id):
+            fired.append(guild_id)
+
+        idle = IdleScheduler(on_idle, timeout=0.2, guild_timeouts={2: 0.08})
+        idle.touch(1)
+        idle.touch(2)
+        idle.touch(3)
+        await asyncio.sleep(0.12)
+        # 3 在到期前有新的活動
+        idle.touch(3)
+        await asyncio.sleep(0.12)
+        # 1 已經到期，3 的期限被延後了
+        assert fired == [2, 1]
+        await asyncio.sleep(0.2)
+        idle.stop()
+        return fired, idle
+
+    fired, idle = run(main())
+    assert fired == [2, 1, 3]
+    assert len(idle) == 0
+
+
+def test_remove_and_expire_now(run):
+    async def main():
+        fired = []
+
+        async def on_idle(guild_id):
+            fired.append(guild_id)
+
+        idle = IdleScheduler(on_idle, timeout=10, guild_timeouts={})
+        idle.touch(1)
+        idle.touch(2)
+        idle.remove(1)
+        idle.expire_now(2)
+        await asyncio.sleep(0.01)
+        remaining = idle.deadline(1)
+        idle.stop()
+        return fired, remaining
+
+    fired, remaining = run(main())
+    assert fired == [2]
+    assert remaining is None
+
+
+def test_set_timeout_reschedules_existing_deadline(run):
+    async def main():
+        fired = []
+
+        async def on_idle(guild_id):
+            fired.append(guild_id)
+
+        idle = IdleScheduler(on_idle, timeout=10, guild_timeouts={})
+        idle.touch(1)
+        idle.set_timeout(1, 0.01)
+        await asyncio.sleep(0.05)
+        idle.stop()
+        return fired
+
+    assert run(main()) == [1]
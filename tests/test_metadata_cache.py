@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+from utils.metadata_cache import MetadataCache, normalize_query, stream_expiry, video_id_from_url
+
+INFO = {
+    'id': 'dQw4w9WgXcQ', 'title': 'Song', 'duration': 212, 'thumbnail': 'thumb',
+    'url': 'https://rr1.googlevideo.com/videoplayback?expire=4102444800&id=1', 'acodec': 'opus',
+}
+
+
+def test_query_and_url_helpers():
+    assert normalize_query('  Never   Gonna\tGIVE ') == 'never gonna give'
+    assert video_id_from_url('https://youtu.be/dQw4w9WgXcQ') == 'dQw4w9WgXcQ'
+    assert video_id_from_url('https://www.youtube.com/watch?list=x&v=dQw4w9WgXcQ') == 'dQw4w9WgXcQ'
+    assert video_id_from_url('never gonna give you up') is None
+    assert stream_expiry(INFO['url'], 60) == 4102444800
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = MetadataCache(max_entries=2, db_path='')
+    cache.put_metadata('a', {'title': 'A'})
+    cache.put_metadata('b', {'title': 'B'})
+    cache.get_metadata('a')
+    cache.put_metadata('c', {'title': 'C'})
+    assert cache.get_metadata('b') is None
+    assert cache.get_metadata('a')['title'] == 'A'
+
+
+def test_put_info_fills_every_layer_and_stale_streams_are_dropped():
+    cache = MetadataCache(db_path='', stream_margin=300)
+    cache.put_stream('a', 'https://example.com/a?expire=%d' % (time.time() + 60))
+    assert cache.get_stream('a') is None
+    cache.put_info(INFO, 'song')
+    assert cache.get_stream('dQw4w9WgXcQ') == (INFO['url'], 'opus')
+    assert cache.get_video_id('  SONG ') == 'dQw4w9WgXcQ'
+
+
+def test_writes_are_batched_into_one_flush(tmp_path, run):
+    path = str(tmp_path / 'cache.db')
+
+    async def main():
+        cache = MetadataCache(db_path=path, flush_interval=0.05)
+        for i in range(10):
+            cache.put_info(dict(INFO, id=f'video{i:06d}', title=f'Song {i}'), f'song {i}')
+        # 還沒寫入資料庫前也讀得到
+        assert cache.stats['flushes'] == 0
+        assert cache.get_metadata('video000003')['title'] == 'Song 3'
+        await asyncio.sleep(0.1)
+        stats = dict(cache.stats)
+        cache.close()
+        return stats
+
+    stats = run(main())
+    assert stats['flushes'] == 1
+    assert stats['rows_written'] == 20
+
+    # 新的實例（例如重新啟動後）從資料庫讀取
+    cache = MetadataCache(db_path=path)
+    assert cache.get_video_id('Song 7') == 'video000007'
+    assert cache.get_metadata('video000007')['title'] == 'Song 7'
+    assert cache.stats['metadata_disk_hits'] == 1
+    cache.close()
+
+
+def test_close_flushes_pending_rows(tmp_path, run):
+    path = str(tmp_path / 'cache.db')
+
+    async def main():
+        cache = MetadataCache(db_path=path, flush_interval=60)
+        cache.put_info(INFO, 'song')
+        cache.close()
+
+    run(main())
+    cache = MetadataCache(db_path=path)
+    assert cache.get_video_id('song') == 'dQw4w9WgXcQ'
+    cache.close()
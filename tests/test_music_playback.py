@@ -0,0 +1,109 @@
+import asyncio
+
+import fakes
+from utils.extractor import ExtractionError
+from utils.player import Track
+
+
+def queued(count):
+    return [Track.from_entry({'id': f'pl{i:09d}', 'title': f'Track {i}', 'duration': 180}) for i in range(count)]
+
+
+async def connected_player(bot, cog, tracks):
+    # realtime：依 20 毫秒的音框間隔播放，歌曲不會在測試中途播完
+    ctx = fakes.make_context(bot, 1, realtime=True)
+    player = await cog.ensure_voice(ctx)
+    player.ctx = ctx
+    for track in tracks:
+        player.enqueue(track)
+    return ctx, player
+
+
+def test_unresolvable_queue_stops_after_consecutive_failures(run, music_cog):
+    async def main():
+        async with music_cog() as (bot, cog):
+            async def broken(track, owner=None):
+                raise ExtractionError('yt-dlp 無法使用')
+
+            cog.ensure_stream = broken
+            ctx, player = await connected_player(bot, cog, queued(1500))
+            await cog.play_next(1)
+            await asyncio.sleep(0.05)
+            return cog, ctx, player
+
+    cog, ctx, player = run(main())
+    # 沒有遞迴也沒有逐首錯誤訊息：停下來，只送出一則摘要，剩下的隊列保留
+    assert len(player.queue) == 1500 - cog.max_play_failures
+    assert player.current is None
+    assert ctx.channel.sends == 1
+
+
+def test_failed_tracks_are_skipped_with_one_summary(run, music_cog):
+    async def main():
+        async with music_cog() as (bot, cog):
+            original = cog.ensure_stream
+
+            async def flaky(track, owner=None):
+                if track.id in ('pl000000000', 'pl000000001'):
+                    return None
+                return await original(track, owner=owner)
+
+            cog.ensure_stream = flaky
+            ctx, player = await connected_player(bot, cog, queued(5))
+            await cog.play_next(1)
+            await asyncio.sleep(0.05)
+            assert player.voice_client.is_playing()
+            return ctx, player
+
+    ctx, player = run(main())
+    assert player.current.id == 'pl000000002'
+    assert len(player.queue) == 2
+    # 一則失敗摘要加上控制面板
+    assert ctx.channel.sends == 2
+
+
+def test_unloaded_cog_does_not_advance(run, music_cog):
+    async def main():
+        async with music_cog() as (bot, cog):
+            ctx, player = await connected_player(bot, cog, queued(3))
+            await cog.play_next(1)
+            vc = player.voice_client
+            cog.cog_unload()
+            # 舊實例的 after 回呼在歌曲結束時觸發
+            vc.stop()
+            await asyncio.sleep(0.2)
+            await vc.disconnect()
+            return cog, player, vc
+
+    cog, player, vc = run(main())
+    assert cog.players == {}
+    assert vc.plays == 1
+    assert len(player.queue) == 2
+
+
+def test_play_during_slow_lookup_does_not_start_a_second_track(run, music_cog):
+    async def main():
+        async with music_cog() as (bot, cog):
+            ctx, player = await connected_player(bot, cog, queued(2))
+            lookup = cog.track_cache.lookup
+
+            async def slow_lookup(video_id):
+                await asyncio.sleep(0.05)
+                return await lookup(video_id)
+
+            cog.track_cache.lookup = slow_lookup
+            first = asyncio.create_task(cog.play_next(1))
+            await asyncio.sleep(0)
+            # 第一首還在查詢快取時有人點歌：應該只加入隊列
+            busy = player.is_busy()
+            await cog.play_next(1)
+            await first
+            await asyncio.sleep(0.05)
+            assert player.voice_client.is_playing()
+            return busy, player
+
+    busy, player = run(main())
+    assert busy
+    assert player.voice_client.plays == 1
+    assert player.current.id == 'pl000000000'
+    assert [track.id for track in player.queue] == ['pl000000001']
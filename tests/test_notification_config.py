@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from utils.notification_config import ConfigError, NotificationConfig, Subscription, parse_days, parse_time
+
+
+def write_config(tmp_path, data):
+    path = tmp_path / 'notifications.json'
+    path.write_text(json.dumps(data), encoding='utf-8')
+    return str(path)
+
+
+VALID = {
+    'timezone': 'Asia/Taipei',
+    'dungeons': [
+        {'name': '163', 'title': '163-普雷加斯的迷宮', 'image': '163.png', 'times': ['03:00', '15:00']},
+        {'name': '194', 'times': ['01:00'], 'days': ['sat', 'sun']},
+    ],
+    'subscriptions': [
+        {'guild': 1, 'channel': 10, 'role': 100},
+        {'channel': '20', 'dungeons': ['163'], 'image': 'custom.png'},
+    ],
+}
+
+
+def test_parse_helpers():
+    assert parse_time('07:05') == (7, 5)
+    assert parse_days(['Mon', 'sunday', 2]) == [0, 6, 2]
+    assert parse_days(None) is None
+    for value in ('24:00', '7', 'ab:cd'):
+        with pytest.raises(ConfigError):
+            parse_time(value)
+    with pytest.raises(ConfigError):
+        parse_days(['funday'])
+
+
+def test_valid_config_is_compiled(tmp_path):
+    extra = [Subscription(10, 100), Subscription(30, None)]
+    config = NotificationConfig.load(write_config(tmp_path, VALID), extra_subscriptions=extra)
+    assert set(config.dungeons) == {'163', '194'}
+    assert config.dungeons['194']['title'] == '194'
+    assert config.dungeons['163']['image'] == str(tmp_path / '163.png')
+    # 與設定檔重複的環境變數訂閱不會加入第二次
+    assert [sub.channel_id for sub in config.subscriptions] == [10, 20, 30]
+    assert [sub.channel_id for sub in config.subscribers('163')] == [10, 20, 30]
+    assert [sub.channel_id for sub in config.subscribers('194')] == [10, 30]
+
+
+@pytest.mark.parametrize('change, message', [
+    ({'timezone': 'Mars/Olympus'}, '時區'),
+    ({'dungeons': [{'name': '163'}]}, 'name 或 times'),
+    ({'dungeons': [{'name': '163', 'times': ['25:00']}]}, '時間'),
+    ({'dungeons': [{'name': '163', 'times': ['01:00']}, {'name': '163', 'times': ['02:00']}]}, '重複'),
+    ({'subscriptions': [{'channel': 1, 'dungeons': ['999']}]}, '不存在的副本'),
+    ({'subscriptions': [{'channel': 'general'}]}, 'channel'),
+    ({'subscriptions': ['oops']}, '訂閱'),
+])
+def test_invalid_config_is_rejected(tmp_path, change, message):
+    with pytest.raises(ConfigError, match=message):
+        NotificationConfig.load(write_config(tmp_path, {**VALID, **change}))
+
+
+def test_unreadable_config_is_rejected(tmp_path):
+    path = tmp_path / 'broken.json'
+    path.write_text('{', encoding='utf-8')
+    with pytest.raises(ConfigError):
+        NotificationConfig.load(str(path))
+    with pytest.raises(ConfigError):
+        NotificationConfig.load(str(tmp_path / 'missing.json'))
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+
+import fakes
+from utils.outbound import OutboundScheduler, PRIORITY_PLAYER, PRIORITY_STATUS
+
+
+def test_pending_edits_to_one_message_are_coalesced(run):
+    async def main():
+        outbound = OutboundScheduler(rate=1, per=0.05, status_window=30)
+        channel = fakes.FakeChannel()
+        message = await outbound.send(channel, 'a')
+        # 令牌已用完，接下來的編輯都在排隊
+        edits = [asyncio.create_task(outbound.edit(message, content=str(i))) for i in range(5)]
+        await asyncio.gather(*edits)
+        outbound.close()
+        return outbound, channel, message
+
+    outbound, channel, message = run(main())
+    assert channel.edits == 1
+    assert message.content == '4'
+    assert outbound.stats['edits_coalesced'] == 4
+
+
+def test_player_updates_jump_ahead_of_status_messages(run):
+    async def main():
+        outbound = OutboundScheduler(rate=1, per=0.02, status_window=0)
+        channel = fakes.FakeChannel()
+        order = []
+        original = channel.send
+
+        async def send(content=None, **kwargs):
+            order.append(content)
+            return await original(content, **kwargs)
+
+        channel.send = send
+        await outbound.send(channel, 'first')
+        jobs = [asyncio.create_task(outbound.send(channel, f'status {i}', priority=PRIORITY_STATUS)) for i in range(2)]
+        await asyncio.sleep(0)
+        jobs.append(asyncio.create_task(outbound.send(channel, 'panel', priority=PRIORITY_PLAYER)))
+        await asyncio.gather(*jobs)
+        outbound.close()
+        return order
+
+    assert run(main()) == ['first', 'panel', 'status 0', 'status 1']
+
+
+def test_consecutive_status_lines_are_merged(run):
+    async def main():
+        outbound = OutboundScheduler(rate=100, per=1, status_window=30)
+        channel = fakes.FakeChannel()
+        first = await outbound.status(channel, 'paused')
+        second = await outbound.status(channel, 'resumed')
+        outbound.close()
+        return outbound, channel, first, second
+
+    outbound, channel, first, second = run(main())
+    assert channel.sends == 1
+    assert second is first
+    assert first.content == 'paused\nresumed'
+    assert outbound.stats['status_merged'] == 1
+
+
+def test_status_lines_are_not_merged_after_someone_else_posts(run):
+    async def main():
+        outbound = OutboundScheduler(rate=100, per=1, status_window=30)
+        channel = fakes.FakeChannel()
+        first = await outbound.status(channel, 'paused')
+        # 閘道收到其他人在狀態訊息之後發的訊息
+        channel.last_message_id = first.id + 10 ** 6
+        second = await outbound.status(channel, 'resumed')
+        outbound.close()
+        return channel, first, second
+
+    channel, first, second = run(main())
+    assert channel.sends == 2
+    assert second is not first
+    assert first.content == 'paused'
+
+
+def test_rate_limit_counter_reads_discord_http_log():
+    outbound = OutboundScheduler()
+    log = logging.getLogger('discord.http')
+    level = log.level
+    log.setLevel(logging.DEBUG)
+    try:
+        # discord.py 收到子速率限制的 429 時依序記錄這兩則
+        log.debug('%s %s received a 429 despite having %s remaining requests. This is a sub-ratelimit.', 'POST', '/x', 3)
+        log.warning('We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds.', 'POST', '/x', 1.0)
+        log.warning('We are being rate limited. %s %s responded with 429. Timeout of %.2f was too long, erroring instead.', 'POST', '/x', 90.0)
+        log.warning('Global rate limit has been hit. Retrying in %.2f seconds.', 1.0)
+        log.debug('POST /x has returned 200')
+    finally:
+        log.setLevel(level)
+        outbound.close()
+    assert outbound.stats['rate_limited'] == 2
+    assert outbound.stats['sub_rate_limited'] == 1
+    assert outbound.stats['global_rate_limited'] == 1
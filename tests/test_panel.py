@@ -0,0 +1,60 @@
+import asyncio
+
+import fakes
+from utils.panel import PanelRenderer, PanelSnapshot
+
+
+def snapshot(version, title='Song', current_time='00:01'):
+    return PanelSnapshot(version=version, state='playing', title=title, url='https://example.com',
+                         current_time=current_time, duration='03:00')
+
+
+def test_unchanged_snapshot_is_not_edited(run):
+    async def main():
+        panel = PanelRenderer(min_interval=0)
+        message = fakes.FakeMessage(fakes.FakeChannel())
+        panel.remember(message, snapshot(1))
+        # 版本與內容都相同
+        await panel.update(message, lambda: snapshot(1))
+        # 版本變了，但顯示的內容相同
+        await panel.update(message, lambda: snapshot(2))
+        await panel.update(message, lambda: snapshot(3, current_time='00:02'))
+        return panel, message
+
+    panel, message = run(main())
+    assert panel.stats['unchanged'] == 2
+    assert panel.stats['edits'] == 1
+    assert message.channel.edits == 1
+
+
+def test_updates_within_interval_are_debounced_to_the_latest_state(run):
+    async def main():
+        panel = PanelRenderer(min_interval=0.05)
+        message = fakes.FakeMessage(fakes.FakeChannel())
+        panel.remember(message, snapshot(0))
+        state = {'version': 0}
+        capture = lambda: snapshot(state['version'], title=f"Song {state['version']}")
+        for version in range(1, 6):
+            state['version'] = version
+            await panel.update(message, capture)
+        assert message.channel.edits == 0
+        await asyncio.sleep(0.1)
+        return panel, message
+
+    panel, message = run(main())
+    assert message.channel.edits == 1
+    assert panel.stats['coalesced'] == 5
+    assert 'Song 5' in message.embed.description
+
+
+def test_forget_cancels_pending_edit(run):
+    async def main():
+        panel = PanelRenderer(min_interval=0.05)
+        message = fakes.FakeMessage(fakes.FakeChannel())
+        panel.remember(message, snapshot(0))
+        await panel.update(message, lambda: snapshot(1, title='Other'))
+        panel.forget(message)
+        await asyncio.sleep(0.1)
+        return message
+
+    assert run(main()).channel.edits == 0
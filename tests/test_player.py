@@ -0,0 +1,89 @@
+from utils.player import GuildPlayer, Track
+
+
+def track(name):
+    return Track(id=name, title=name, duration=60)
+
+
+def player_with(*names):
+    player = GuildPlayer(1)
+    for name in names:
+        player.enqueue(track(name))
+    return player
+
+
+def ids(tracks):
+    return [t.id for t in tracks]
+
+
+def test_next_track_takes_tracks_in_order():
+    player = player_with('a', 'b')
+    player.current = player.next_track()
+    player.current = player.next_track()
+    assert player.current.id == 'b'
+    assert player.next_track() is None
+
+
+def test_loop_repeats_current_track():
+    player = player_with('a', 'b')
+    player.current = player.next_track()
+    player.set_loop(True)
+    assert player.peek_next().id == 'a'
+    player.current = player.next_track()
+    assert player.current.id == 'a'
+    assert ids(player.queue) == ['b']
+    assert not player.history
+
+
+def test_every_change_bumps_version():
+    player = player_with('a')
+    version = player.version
+    player.next_track()
+    player.shuffle()
+    player.clear()
+    assert player.version == version + 3
+
+
+def test_next_track_moves_current_to_history():
+    player = player_with('a', 'b')
+    player.current = player.next_track()
+    player.current = player.next_track()
+    assert player.current.id == 'b'
+    assert ids(player.history) == ['a']
+    assert player.next_track() is None
+    assert ids(player.history) == ['a', 'b']
+
+
+def test_rewind_puts_previous_and_current_back_in_front():
+    player = player_with('a', 'b', 'c')
+    player.current = player.next_track()
+    player.current = player.next_track()
+    assert player.rewind().id == 'a'
+    assert player.current is None
+    assert ids(player.queue) == ['a', 'b', 'c']
+    assert not player.history
+    assert player.rewind() is None
+
+
+def test_rewind_in_loop_mode_plays_previous_then_repeats_it():
+    player = player_with('a', 'b')
+    player.current = player.next_track()
+    player.current = player.next_track()
+    player.set_loop(True)
+    player.rewind()
+    # 循環模式不會把放回隊列的歌曲再記錄到歷史
+    player.current = player.next_track()
+    assert player.current.id == 'a'
+    player.current = player.next_track()
+    assert player.current.id == 'a'
+    assert ids(player.queue) == ['b']
+    assert not player.history
+
+
+def test_history_is_bounded():
+    player = GuildPlayer(1, history_size=2)
+    for name in 'abc':
+        player.enqueue(track(name))
+    for _ in range(4):
+        player.current = player.next_track()
+    assert ids(player.history) == ['b', 'c']
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+import fakes
+from utils.extractor import ExtractionService
+from utils.player import Track
+from utils.playlist_ingest import PlaylistIngestor
+
+
+@pytest.fixture
+def stub_ytdl():
+    fakes.install()
+    fakes.StubYoutubeDL.configure(latency=0, playlist_page_size=100)
+    yield fakes.StubYoutubeDL
+    fakes.StubYoutubeDL.configure(latency=0, playlist_page_size=100)
+
+
+def ingest(url, build, timeout=5, workers=4, **kwargs):
+    async def main():
+        extractor = ExtractionService({}, workers=2)
+        queue = []
+        ingestor = PlaylistIngestor(extractor, build, lambda owner, song: queue.append(song),
+                                    workers=workers, progress_interval=0, timeout=timeout)
+        try:
+            progress = await ingestor.ingest(url, owner=1, **kwargs)
+        finally:
+            extractor.shutdown()
+        return progress, queue
+
+    return asyncio.run(main())
+
+
+def test_songs_are_committed_in_playlist_order(stub_ytdl):
+    async def build(entry, owner):
+        # 前面的項目比較慢，完成順序與清單順序相反
+        index = int(entry['id'][2:])
+        await asyncio.sleep((20 - index) * 0.001)
+        return Track.from_entry(entry)
+
+    progress, queue = ingest('https://www.youtube.com/playlist?list=20', build)
+    assert progress.is_playlist and progress.done and not progress.timed_out
+    assert progress.added == 20
+    assert [track.id for track in queue] == [f'pl{i:09d}' for i in range(20)]
+
+
+def test_failed_entries_are_counted_without_blocking_later_ones(stub_ytdl):
+    async def build(entry, owner):
+        index = int(entry['id'][2:])
+        if index == 3:
+            return None
+        if index == 5:
+            raise RuntimeError('unavailable')
+        return Track.from_entry(entry)
+
+    progress, queue = ingest('https://www.youtube.com/playlist?list=10', build)
+    assert progress.added == 8
+    assert progress.failed == 2
+    assert [track.id for track in queue] == [f'pl{i:09d}' for i in range(10) if i not in (3, 5)]
+
+
+def test_on_first_runs_once(stub_ytdl):
+    firsts = []
+
+    async def build(entry, owner):
+        return Track.from_entry(entry)
+
+    async def on_first():
+        firsts.append(1)
+
+    progress, queue = ingest('https://www.youtube.com/playlist?list=5', build, on_first=on_first)
+    assert firsts == [1]
+    assert progress.added == 5
+
+
+def test_slow_but_progressing_playlist_is_not_timed_out(stub_ytdl):
+    stub_ytdl.configure(latency=0.05, playlist_page_size=5)
+
+    async def build(entry, owner):
+        return Track.from_entry(entry)
+
+    # 整體超過逾時時間，但每一頁都在逾時內讀到
+    progress, queue = ingest('https://www.youtube.com/playlist?list=20', build, timeout=0.15)
+    assert not progress.timed_out
+    assert progress.added == 20
+
+
+def test_stalled_playlist_times_out(stub_ytdl):
+    stub_ytdl.configure(latency=0.3)
+
+    async def build(entry, owner):
+        return Track.from_entry(entry)
+
+    progress, queue = ingest('https://www.youtube.com/playlist?list=5', build, timeout=0.1)
+    assert progress.timed_out
+    assert queue == []
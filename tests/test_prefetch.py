@@ -0,0 +1,25 @@
+import asyncio
+
+from utils.player import Track
+from utils.prefetch import StreamPrefetcher
+
+
+def test_failed_prefetch_does_not_stop_later_tracks(run):
+    async def main():
+        tracks = [Track(id='a', title='broken'), Track(id='b', title='fine')]
+        resolved = []
+
+        async def resolve(track, guild_id):
+            if track.id == 'a':
+                raise RuntimeError('unavailable')
+            resolved.append(track.id)
+
+        prefetcher = StreamPrefetcher(lambda guild_id, count: tracks[:count], resolve, count=2, window=30)
+        prefetcher.schedule(1)
+        task = prefetcher._tasks[1]
+        await task
+        return resolved, task
+
+    resolved, task = run(main())
+    assert resolved == ['b']
+    assert task.exception() is None
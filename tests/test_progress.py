@@ -0,0 +1,61 @@
+import asyncio
+
+from utils.progress import ProgressScheduler
+
+
+def test_inactive_guilds_are_dropped(run):
+    async def main():
+        refreshed = []
+        active = {1, 2, 3}
+
+        async def refresh(guild_id):
+            refreshed.append(guild_id)
+
+        progress = ProgressScheduler(refresh, active.__contains__, interval=0.02, budget=100)
+        for guild_id in (1, 2, 3):
+            progress.watch(guild_id)
+        await asyncio.sleep(0.06)
+        # 2 暫停或離開了語音頻道
+        active.discard(2)
+        refreshed.clear()
+        await asyncio.sleep(0.1)
+        count = progress.active_count()
+        progress.shutdown()
+        return refreshed, count, progress.stats
+
+    refreshed, count, stats = run(main())
+    assert count == 2
+    assert stats['dropped'] == 1
+    assert 2 not in refreshed
+    assert {1, 3} <= set(refreshed)
+
+
+def test_rewatching_a_dropped_guild_resumes_updates(run):
+    async def main():
+        refreshed = []
+        active = set()
+
+        async def refresh(guild_id):
+            refreshed.append(guild_id)
+
+        progress = ProgressScheduler(refresh, active.__contains__, interval=0.02, budget=100)
+        progress.watch(1)
+        await asyncio.sleep(0.06)
+        assert progress.active_count() == 0
+        active.add(1)
+        progress.watch(1)
+        await asyncio.sleep(0.06)
+        progress.shutdown()
+        return refreshed
+
+    assert 1 in run(main())
+
+
+def test_interval_grows_with_the_number_of_panels():
+    progress = ProgressScheduler(None, None, interval=10, max_interval=60, budget=2)
+    for guild_id in range(50):
+        progress._watching.add(guild_id)
+        progress._guilds.append(guild_id)
+    assert progress.current_interval() == 25
+    progress.backoff = 4
+    assert progress.current_interval() == 60
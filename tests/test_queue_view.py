@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from cogs.MusicCog import QueueView
+from utils.player import GuildPlayer, Track
+
+
+def queue_view(length, page_size=10):
+    player = GuildPlayer(1)
+    for i in range(length):
+        player.enqueue(Track(id=f'v{i}', title=f'Track {i}'))
+    cog = SimpleNamespace(players={1: player})
+    ctx = SimpleNamespace(guild=SimpleNamespace(id=1))
+    return QueueView(cog, ctx, page_size=page_size), player
+
+
+def test_pages_are_clamped_to_the_queue(run):
+    async def main():
+        view, player = queue_view(25)
+        assert view.page_count() == 3
+        view.page = 7
+        embed = view.build_embed()
+        assert view.page == 2
+        assert embed.description.splitlines() == ['`21.` Track 20', '`22.` Track 21', '`23.` Track 22',
+                                                  '`24.` Track 23', '`25.` Track 24']
+        assert view.next_button.disabled and not view.previous_button.disabled
+
+        view.page = -3
+        view.build_embed()
+        assert view.page == 0
+        assert view.previous_button.disabled and not view.next_button.disabled
+
+        # 翻頁期間隊列變短
+        view.page = 2
+        player.clear()
+        embed = view.build_embed()
+        assert view.page == 0
+        assert embed.description == '播放隊列是空的!'
+        assert view.jump_button.disabled
+
+    run(main())
+
+
+def test_long_titles_are_truncated_and_escaped():
+    title = QueueView.format_title('**bold**  ' + 'x' * 100)
+    assert title.startswith('\\*\\*bold\\*\\* x')
+    assert title.endswith('…')
+    assert QueueView.format_title(None) == '未知歌曲'
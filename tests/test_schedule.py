@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from utils.schedule import ScheduleEngine, ScheduleEntry, WeeklyIndex
+
+
+def test_weekly_index_lookup_and_next_after():
+    index = WeeklyIndex([
+        ScheduleEntry('daily', [(3, 0), (15, 0)]),
+        ScheduleEntry('weekend', [(21, 0)], days=[5, 6]),
+    ])
+    # 2024-01-05 是星期五
+    friday = datetime(2024, 1, 5, 15, 0)
+    assert [entry.name for entry in index.at(friday)] == ['daily']
+    assert index.at(datetime(2024, 1, 5, 21, 0)) == ()
+    assert [entry.name for entry in index.at(datetime(2024, 1, 6, 21, 0))] == ['weekend']
+    assert index.next_after(friday) == datetime(2024, 1, 6, 3, 0)
+    # 一週的最後一個排程之後回到下週一
+    assert index.next_after(datetime(2024, 1, 7, 22, 0)) == datetime(2024, 1, 8, 3, 0)
+    assert WeeklyIndex([]).next_after(friday) is None
+
+
+def test_engine_fires_entry_due_in_the_starting_minute(run):
+    async def main():
+        fired = []
+
+        async def fire(entry, local):
+            fired.append((entry.name, local))
+
+        # start_grace 涵蓋整分鐘，相當於剛好在分鐘邊界啟動
+        engine = ScheduleEngine(WeeklyIndex([]), 'Asia/Taipei', fire, start_grace=60)
+        now = engine.local_now()
+        engine.replace(WeeklyIndex([ScheduleEntry('now', [(now.hour, now.minute)])]))
+        task = asyncio.create_task(engine.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        return fired, now
+
+    fired, now = run(main())
+    # 剛好跨過分鐘邊界時，開始的那一分鐘仍會被處理
+    assert fired == [('now', now.replace(second=0, microsecond=0))]
+
+
+def test_engine_resumed_after_reload_does_not_fire_twice(run):
+    async def main():
+        fired = []
+
+        async def fire(entry, local):
+            fired.append(entry.name)
+
+        index = WeeklyIndex([])
+        first = ScheduleEngine(index, 'Asia/Taipei', fire, start_grace=60)
+        now = first.local_now()
+        index = WeeklyIndex([ScheduleEntry('now', [(now.hour, now.minute)])])
+        first.replace(index)
+        task = asyncio.create_task(first.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        # 重新載入：新的引擎從上一個引擎處理到的分鐘接續
+        second = ScheduleEngine(index, 'Asia/Taipei', fire, start_grace=60, resume=first.last)
+        task = asyncio.create_task(second.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        return fired
+
+    assert run(main()) == ['now']
+
+
+def test_engine_started_mid_minute_skips_the_current_minute(run):
+    async def main():
+        fired = []
+
+        async def fire(entry, local):
+            fired.append(entry.name)
+
+        engine = ScheduleEngine(WeeklyIndex([]), 'Asia/Taipei', fire, start_grace=-1)
+        now = engine.local_now()
+        engine.replace(WeeklyIndex([ScheduleEntry('now', [(now.hour, now.minute)])]))
+        task = asyncio.create_task(engine.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        return fired
+
+    # 重新啟動時這一分鐘的通知可能已經發過了
+    assert run(main()) == []
+
+
+def test_engine_skips_firings_later_than_catch_up(run):
+    async def main():
+        fired = []
+
+        async def fire(entry, local):
+            fired.append(entry.name)
+
+        engine = ScheduleEngine(WeeklyIndex([]), 'Asia/Taipei', fire, catch_up=300)
+        past = engine.local_now().replace(second=0, microsecond=0) - timedelta(hours=1)
+        engine.replace(WeeklyIndex([ScheduleEntry('old', [(past.hour, past.minute)])]))
+        await engine._fire_minute(past)
+        return fired, engine.stats
+
+    fired, stats = run(main())
+    assert fired == []
+    assert stats['skipped'] == 1
@@ -0,0 +1,95 @@
+import json
+import sqlite3
+
+from utils import session_store
+from utils.player import GuildPlayer, Track
+from utils.session_store import SessionStore
+
+
+def track(i):
+    return Track.from_entry({'id': f'v{i:010d}', 'title': f'Track {i}', 'duration': 180})
+
+
+def playing_player(guild_id=1, queued=3, offset=42):
+    player = GuildPlayer(guild_id)
+    for i in range(1, queued + 1):
+        player.enqueue(track(i))
+    player.set_loop(True)
+    player.start_track(track(0), offset)
+    return player
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    store = SessionStore(path)
+    players = {1: playing_player()}
+    store.flush(players)
+    store.shutdown(players)
+
+    store = SessionStore(path)
+    assert store.index() == [(1, None, None, 1)]
+    session = store.load(1)
+    assert session.current.id == 'v0000000000'
+    assert [t.id for t in session.queue] == ['v0000000001', 'v0000000002', 'v0000000003']
+    assert session.loop is True
+    assert 42 <= session.offset < 43
+    store.shutdown({})
+
+
+def test_unchanged_queue_only_updates_position(tmp_path, monkeypatch):
+    store = SessionStore(str(tmp_path / 'sessions.db'))
+    player = playing_player(queued=1000)
+    players = {1: player}
+    store.flush(players)
+    monkeypatch.setattr(session_store, 'POSITION_REFRESH', 0)
+
+    def capture(player):
+        raise AssertionError('隊列沒有變動時不應重新序列化')
+
+    monkeypatch.setattr(store, 'capture', capture)
+    player.started_at -= 60
+    store.flush(players)
+    assert store.stats['rows_written'] == 1
+    assert store.stats['positions_written'] == 1
+    assert 102 <= store.load(1).offset < 103
+    store.shutdown({})
+
+
+def test_flush_async_writes_in_executor(tmp_path, run):
+    store = SessionStore(str(tmp_path / 'sessions.db'))
+    players = {1: playing_player()}
+    run(store.flush_async(players))
+    assert len(store) == 1
+    assert store.stats['flushes'] == 1
+    store.shutdown({})
+
+
+def test_discard_removes_snapshot(tmp_path):
+    store = SessionStore(str(tmp_path / 'sessions.db'))
+    players = {1: playing_player(), 2: playing_player(2)}
+    store.flush(players)
+    store.discard(1)
+    del players[1]
+    assert store.load(1) is None
+    store.flush(players)
+    assert [row[0] for row in store.index()] == [2]
+    store.shutdown(players)
+
+
+def test_reads_offset_from_old_schema(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    db = sqlite3.connect(path)
+    db.execute(
+        'CREATE TABLE sessions (guild_id INTEGER PRIMARY KEY, voice_channel_id INTEGER, '
+        'text_channel_id INTEGER, playing INTEGER, data TEXT NOT NULL, updated_at REAL)'
+    )
+    data = {'loop': False, 'current': ['v0000000000', 'Track 0', 180, ''], 'offset': 12.5, 'queue': []}
+    db.execute('INSERT INTO sessions VALUES (1, 10, 20, 1, ?, 0)', (json.dumps(data),))
+    db.commit()
+    db.close()
+
+    store = SessionStore(path)
+    session = store.load(1)
+    assert session.offset == 12.5
+    assert session.voice_channel_id == 10
+    store.shutdown({})
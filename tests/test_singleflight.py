@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from utils.extractor import ExtractionCancelled
+from utils.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution(run):
+    async def main():
+        flights = SingleFlight()
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'song'
+
+        results = await asyncio.gather(*(flights.do('key', factory) for _ in range(5)))
+        return flights, calls, results
+
+    flights, calls, results = run(main())
+    assert results == ['song'] * 5
+    assert len(calls) == 1
+    assert flights.stats['executions'] == 1
+    assert flights.stats['coalesced'] == 4
+    assert flights.in_flight() == 0
+
+
+def test_failure_reaches_every_waiter(run):
+    async def main():
+        flights = SingleFlight()
+
+        async def factory():
+            await asyncio.sleep(0.01)
+            raise RuntimeError('boom')
+
+        return await asyncio.gather(*(flights.do('key', factory) for _ in range(3)), return_exceptions=True)
+
+    results = run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_cancelling_one_owner_keeps_the_shared_task_for_others(run):
+    async def main():
+        flights = SingleFlight()
+        started = asyncio.Event()
+
+        async def factory():
+            started.set()
+            await asyncio.sleep(0.05)
+            return 'song'
+
+        first = asyncio.create_task(flights.do('key', factory, owner=1))
+        second = asyncio.create_task(flights.do('key', factory, owner=2))
+        await started.wait()
+        assert flights.cancel(1) == 1
+        with pytest.raises(ExtractionCancelled):
+            await first
+        return await second
+
+    assert run(main()) == 'song'
+
+
+def test_shared_task_is_cancelled_when_nobody_waits(run):
+    async def main():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def factory():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.create_task(flights.do('key', factory, owner=1))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        flights.cancel(1)
+        with pytest.raises(ExtractionCancelled):
+            await waiter
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return flights
+
+    assert run(main()).in_flight() == 0
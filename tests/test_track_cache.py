@@ -0,0 +1,42 @@
+import os
+
+from utils.track_cache import TrackCache
+
+
+def make_cache(tmp_path, *video_ids, max_bytes=10 ** 6):
+    for video_id in video_ids:
+        (tmp_path / f'{video_id}.ogg').write_bytes(b'x' * 100)
+    return TrackCache(directory=str(tmp_path), max_bytes=max_bytes, min_plays=2)
+
+
+def test_peek_has_no_side_effects(tmp_path):
+    cache = make_cache(tmp_path, 'abc')
+    assert cache.peek('abc') == os.path.join(str(tmp_path), 'abc.ogg')
+    assert cache.peek('zzz') is None
+    assert cache.stats['hits'] == cache.stats['misses'] == cache.stats['bytes_saved'] == 0
+
+
+def test_lookup_counts_hits_and_drops_missing_files(tmp_path, run):
+    cache = make_cache(tmp_path, 'abc', 'def')
+    assert run(cache.lookup('abc'))
+    assert cache.stats['hits'] == 1 and cache.stats['bytes_saved'] == 100
+    os.remove(tmp_path / 'def.ogg')
+    assert run(cache.lookup('def')) is None
+    assert cache.stats['misses'] == 1
+    assert len(cache) == 1 and cache.bytes_cached == 100
+
+
+def test_record_play_waits_for_min_plays(tmp_path):
+    cache = make_cache(tmp_path)
+    assert not cache.record_play('abc')
+    assert cache.record_play('abc')
+
+
+def test_index_is_saved_and_oversized_cache_is_evicted(tmp_path, run):
+    cache = make_cache(tmp_path, 'abc')
+    cache.record_play('abc')
+    run(cache._save())
+    reloaded = make_cache(tmp_path, 'def', max_bytes=150)
+    # 超過上限時淘汰最久未播放的
+    assert len(reloaded) == 1
+    assert reloaded.bytes_cached <= 150
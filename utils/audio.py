@@ -0,0 +1,77 @@
+from collections import deque
+
+import discord
+
+
+class PrebufferedSource(discord.AudioSource):
+    """包裝音頻源：可以事先讀取幾個音框，並在送出第一個音框時通知"""
+
+    # 尚未關閉的音頻源數量（每個都對應一個 FFmpeg 行程）
+    open_count = 0
+
+    def __init__(self, source, on_first_frame=None):
+        self.source = source
+        self.on_first_frame = on_first_frame
+        self._buffer = deque()
+        self._started = False
+        self._closed = False
+        PrebufferedSource.open_count += 1
+
+    def prebuffer(self, frames):
+        """事先讀取音框（會阻塞，請在執行緒中呼叫），回傳實際讀到的數量"""
+        for _ in range(frames):
+            frame = self.source.read()
+            if not frame:
+                break
+            self._buffer.append(frame)
+        return len(self._buffer)
+
+    def read(self):
+        frame = self._buffer.popleft() if self._buffer else self.source.read()
+        if not self._started:
+            self._started = True
+            if self.on_first_frame is not None:
+                self.on_first_frame()
+        return frame
+
+    def is_opus(self):
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self._buffer.clear()
+        self.source.cleanup()
+        if not self._closed:
+            self._closed = True
+            PrebufferedSource.open_count -= 1
+
+
+class GapTracker:
+    """記錄歌曲之間的空白時間（上一首結束到下一首送出第一個音框）"""
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def percentile(self, pct):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self):
+        """回傳 (次數, 平均, p50, p95, 最大值)，單位為秒"""
+        if not self.samples:
+            return (self.count, None, None, None, None)
+        return (
+            self.count,
+            sum(self.samples) / len(self.samples),
+            self.percentile(50),
+            self.percentile(95),
+            max(self.samples),
+        )
+
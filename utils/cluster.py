@@ -0,0 +1,273 @@
+import asyncio
+import hmac
+import itertools
+import json
+import os
+import secrets
+import signal
+import sys
+import time
+
+
+def shard_ranges(shard_count, clusters):
+    """把 0..shard_count-1 的分片平均分成 clusters 段連續的範圍"""
+    clusters = max(1, min(clusters, shard_count))
+    size, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for i in range(clusters):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def parse_shard_ids(value):
+    """解析 "0,1,2" 或 "0-3" 格式的分片ID，空字串回傳None"""
+    ids = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '-' in item:
+            start, end = item.split('-', 1)
+            ids.extend(range(int(start), int(end) + 1))
+        else:
+            ids.append(int(item))
+    return ids or None
+
+
+def _encode(message):
+    return (json.dumps(message, ensure_ascii=False) + '\n').encode()
+
+
+class ClusterClient:
+    """工作行程與啟動器之間的連線
+
+    handlers 是 {指令名稱: async 函式}，啟動器轉送其他行程的廣播時呼叫；
+    broadcast() 把指令送到所有行程（包含自己）並收集每個行程的結果。
+    與啟動器的連線中斷時呼叫 on_lost，讓行程不會在啟動器結束後繼續執行。
+    """
+
+    def __init__(self, cluster_id, address, token, handlers, on_lost=None):
+        self.cluster_id = cluster_id
+        self.address = address
+        self.token = token
+        self.handlers = handlers
+        self.on_lost = on_lost
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._writer = None
+        self._task = None
+
+    async def start(self):
+        host, port = self.address.rsplit(':', 1)
+        reader, self._writer = await asyncio.open_connection(host, int(port))
+        self._writer.write(_encode({'op': 'hello', 'cluster': self.cluster_id, 'token': self.token}))
+        await self._writer.drain()
+        self._task = asyncio.create_task(self._read(reader))
+
+    async def _read(self, reader):
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                if message['op'] == 'request':
+                    asyncio.create_task(self._answer(message))
+                elif message['op'] == 'result':
+                    future = self._pending.pop(message['id'], None)
+                    if future is not None and not future.done():
+                        future.set_result(message['results'])
+        except ConnectionError:
+            pass
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("與啟動器的連線已中斷"))
+        self._pending.clear()
+        if self.on_lost is not None:
+            print("與叢集啟動器的連線已中斷")
+            await self.on_lost()
+
+    async def _answer(self, message):
+        handler = self.handlers.get(message['command'])
+        reply = {'op': 'reply', 'id': message['id']}
+        if handler is None:
+            reply['error'] = f"未知的指令: {message['command']}"
+        else:
+            try:
+                reply['result'] = await handler(*message['args'])
+            except Exception as e:
+                reply['error'] = str(e)
+        self._writer.write(_encode(reply))
+        await self._writer.drain()
+
+    async def broadcast(self, command, *args, timeout=15):
+        """回傳每個行程的結果列表：{'cluster', 'shards', 'result' 或 'error'}"""
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(_encode({
+            'op': 'broadcast', 'id': request_id, 'command': command, 'args': list(args), 'timeout': timeout,
+        }))
+        await self._writer.drain()
+        try:
+            # 啟動器本身會為每個行程套用 timeout，這裡多留一點時間
+            return await asyncio.wait_for(future, timeout + 5)
+        finally:
+            self._pending.pop(request_id, None)
+
+    def close(self):
+        self.on_lost = None
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+
+class ClusterLauncher:
+    """啟動多個工作行程，每個行程以 AutoShardedBot 負責一段連續的分片
+
+    - 啟動器開一個只接受本機連線的 IPC 伺服器，工作行程以隨機產生的 token 驗證
+    - 任何行程都可以廣播指令（load/reload/shutdown/stats…），啟動器轉送給所有行程並彙整結果
+    - 工作行程異常結束時自動重新啟動（退避時間逐次加倍）；收到 shutdown 時全部停止
+    """
+
+    def __init__(self, shard_count, clusters, script, env=None, host='127.0.0.1'):
+        self.shard_count = shard_count
+        self.ranges = shard_ranges(shard_count, clusters)
+        self.script = script
+        self.env = env or {}
+        self.host = host
+        self.token = secrets.token_hex(16)
+        self.address = None
+        self._ids = itertools.count(1)
+        self._workers = {}
+        self._pending = {}
+        self._procs = {}
+        self._stopping = False
+        self.restarts = [0] * len(self.ranges)
+
+    async def run(self):
+        server = await asyncio.start_server(self._handle, self.host, 0)
+        self.address = f"{self.host}:{server.sockets[0].getsockname()[1]}"
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, lambda: asyncio.create_task(self.stop()))
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows 不支援，改由 KeyboardInterrupt 結束
+        for cluster_id, shards in enumerate(self.ranges):
+            print(f"[launcher] 叢集 {cluster_id}: 分片 {shards[0]}-{shards[-1]} / {self.shard_count}")
+        try:
+            await asyncio.gather(*(self._supervise(i) for i in range(len(self.ranges))))
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    async def _supervise(self, cluster_id):
+        backoff = 5
+        while not self._stopping:
+            shards = self.ranges[cluster_id]
+            env = {
+                **os.environ,
+                **self.env,
+                'CLUSTER_ID': str(cluster_id),
+                'SHARD_COUNT': str(self.shard_count),
+                'SHARD_IDS': f"{shards[0]}-{shards[-1]}",
+                'CLUSTER_IPC': self.address,
+                'CLUSTER_TOKEN': self.token,
+                'PYTHONUNBUFFERED': '1',
+            }
+            started = time.monotonic()
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable, self.script, env=env,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            )
+            self._procs[cluster_id] = proc
+            async for line in proc.stdout:
+                print(f"[cluster {cluster_id}] {line.decode(errors='replace').rstrip()}")
+            code = await proc.wait()
+            self._procs.pop(cluster_id, None)
+            if self._stopping or code == 0:
+                print(f"[launcher] 叢集 {cluster_id} 已結束")
+                return
+            if time.monotonic() - started > 60:
+                backoff = 5
+            print(f"[launcher] 叢集 {cluster_id} 異常結束（代碼 {code}），{backoff} 秒後重新啟動")
+            self.restarts[cluster_id] += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 300)
+
+    async def _handle(self, reader, writer):
+        cluster_id = None
+        try:
+            hello = json.loads(await reader.readline() or 'null')
+            if not hello or hello.get('op') != 'hello' or not hmac.compare_digest(str(hello.get('token')), self.token):
+                return
+            cluster_id = hello['cluster']
+            self._workers[cluster_id] = writer
+            while line := await reader.readline():
+                message = json.loads(line)
+                if message['op'] == 'reply':
+                    future = self._pending.pop(message['id'], None)
+                    if future is not None and not future.done():
+                        future.set_result(message)
+                elif message['op'] == 'broadcast':
+                    asyncio.create_task(self._relay(writer, message))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            if cluster_id is not None and self._workers.get(cluster_id) is writer:
+                del self._workers[cluster_id]
+            writer.close()
+
+    async def _relay(self, writer, message):
+        if message['command'] == 'shutdown':
+            self._stopping = True
+        results = await self.request_all(message['command'], message['args'], message.get('timeout', 15))
+        try:
+            writer.write(_encode({'op': 'result', 'id': message['id'], 'results': results}))
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def request_all(self, command, args=(), timeout=15):
+        async def ask(cluster_id):
+            result = {'cluster': cluster_id, 'shards': self.ranges[cluster_id]}
+            writer = self._workers.get(cluster_id)
+            if writer is None:
+                result['error'] = '未連線'
+                return result
+            request_id = next(self._ids)
+            future = asyncio.get_running_loop().create_future()
+            self._pending[request_id] = future
+            try:
+                writer.write(_encode({'op': 'request', 'id': request_id, 'command': command, 'args': list(args)}))
+                await writer.drain()
+                reply = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                result['error'] = '逾時'
+                return result
+            except ConnectionError:
+                result['error'] = '連線中斷'
+                return result
+            finally:
+                self._pending.pop(request_id, None)
+            if 'error' in reply:
+                result['error'] = reply['error']
+            else:
+                result['result'] = reply.get('result')
+            return result
+
+        return list(await asyncio.gather(*(ask(i) for i in range(len(self.ranges)))))
+
+    async def stop(self, grace=15):
+        """要求所有行程正常關閉，超過 grace 秒仍未結束的行程直接終止"""
+        if self._stopping:
+            return
+        self._stopping = True
+        print("[launcher] 正在關閉所有叢集...")
+        await self.request_all('shutdown', timeout=5)
+        deadline = time.monotonic() + grace
+        while self._procs and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+        for proc in list(self._procs.values()):
+            proc.terminate()
@@ -0,0 +1,168 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+
+from utils.metrics import EXTRACT_SECONDS
+
+
+class ExtractionError(Exception):
+    """yt-dlp 解析失敗的基底例外"""
+
+
+class ExtractionTimeout(ExtractionError):
+    """解析超過時間限制"""
+
+
+class ExtractionCancelled(ExtractionError):
+    """發起請求的指令已被放棄（例如離開頻道或停止播放）"""
+
+
+class _PendingCall:
+    """追蹤一次進行中的解析，讓擁有者可以取消它"""
+    __slots__ = ('future', 'cancel_event', 'cancelled_by_owner')
+
+    def __init__(self):
+        self.future = None
+        self.cancel_event = threading.Event()
+        self.cancelled_by_owner = False
+
+
+class ExtractionService:
+    """在固定大小的執行緒池中執行 yt-dlp 解析，避免阻塞事件迴圈
+
+    每個工作執行緒會重複使用自己的 YoutubeDL 實例（依選項分別建立），
+    每次呼叫都有逾時限制，並可依擁有者（通常是伺服器ID）整批取消。
+    """
+
+    def __init__(self, ytdl_opts, workers=None, timeout=None, max_pending=None):
+        self.ytdl_opts = dict(ytdl_opts)
+        self.workers = workers or int(os.getenv('YTDL_WORKERS', '4'))
+        self.timeout = timeout or float(os.getenv('YTDL_TIMEOUT', '30'))
+        # 同時排隊＋執行中的解析上限，超過的請求在事件迴圈上等待而不是塞進執行緒池；
+        # 逾時後仍在工作執行緒中執行的解析也佔用名額，直到真正結束
+        self.max_pending = max_pending or int(os.getenv('YTDL_MAX_PENDING', str(self.workers * 8)))
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ytdl')
+        self._local = threading.local()
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._owners = {}
+        self._closed = False
+
+    @staticmethod
+    def _opts_key(opts):
+        return tuple(sorted((key, repr(value)) for key, value in opts.items()))
+
+    def _get_ytdl(self, opts_key, opts):
+        """取得目前工作執行緒專屬的 YoutubeDL 實例"""
+        instances = getattr(self._local, 'instances', None)
+        if instances is None:
+            instances = self._local.instances = {}
+
+        ytdl = instances.get(opts_key)
+        if ytdl is None:
+            ytdl = instances[opts_key] = yt_dlp.YoutubeDL(opts)
+        return ytdl
+
+    def _run(self, func, opts_key, opts, call):
+        # 排隊期間已被取消的請求不再浪費網路請求
+        if call.cancel_event.is_set():
+            raise ExtractionCancelled("解析已取消")
+        return func(self._get_ytdl(opts_key, opts), call.cancel_event)
+
+    async def run(self, func, *, opts=None, timeout=None, owner=None, kind=None):
+        """在工作執行緒中執行 func(ytdl, cancel_event) 並等待結果
+
+        kind（search、url、playlist_flat、playlist_entry）用來分類記錄解析時間，None 時不記錄。
+        """
+        if self._closed:
+            raise ExtractionError("解析服務已關閉")
+
+        merged_opts = dict(self.ytdl_opts)
+        if opts:
+            merged_opts.update(opts)
+        opts_key = self._opts_key(merged_opts)
+        timeout = timeout or self.timeout
+
+        call = _PendingCall()
+        calls = self._owners.setdefault(owner, set())
+        calls.add(call)
+        started = time.perf_counter()
+        outcome = 'error'
+
+        try:
+            await self._slots.acquire()
+            try:
+                if call.cancelled_by_owner:
+                    raise ExtractionCancelled("解析已取消")
+                loop = asyncio.get_running_loop()
+                work = self._executor.submit(self._run, func, opts_key, merged_opts, call)
+            except BaseException:
+                self._slots.release()
+                raise
+            # 名額在工作執行緒真正結束（或還沒開始就被取消）時才歸還，逾時不會讓新的請求擠進執行緒池
+            work.add_done_callback(functools.partial(self._release_slot, loop))
+            call.future = asyncio.wrap_future(work, loop=loop)
+            result = await asyncio.wait_for(call.future, timeout)
+            outcome = 'ok'
+            return result
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+            raise ExtractionTimeout(f"解析超過 {timeout:g} 秒，已放棄") from None
+        except asyncio.CancelledError:
+            outcome = 'cancelled'
+            if call.cancelled_by_owner:
+                raise ExtractionCancelled("解析已取消") from None
+            raise
+        finally:
+            if kind is not None:
+                EXTRACT_SECONDS.observe(time.perf_counter() - started, kind, outcome)
+            # 通知仍在執行的工作執行緒結果已不再需要
+            call.cancel_event.set()
+            calls.discard(call)
+            if not calls and self._owners.get(owner) is calls:
+                del self._owners[owner]
+
+    def _release_slot(self, loop, work):
+        # 在工作執行緒（或取消的呼叫端）中呼叫
+        try:
+            loop.call_soon_threadsafe(self._slots.release)
+        except RuntimeError:
+            pass  # 事件迴圈已關閉
+
+    async def extract(self, query, *, opts=None, timeout=None, owner=None, process=True, kind=None):
+        """解析單一查詢或URL，等同於 YoutubeDL.extract_info(query, download=False)"""
+        def _extract(ytdl, cancel_event):
+            return ytdl.extract_info(query, download=False, process=process)
+
+        if kind is None:
+            kind = 'search' if query.startswith('ytsearch') else 'url'
+        return await self.run(_extract, opts=opts, timeout=timeout, owner=owner, kind=kind)
+
+    def cancel(self, owner):
+        """取消某個擁有者所有排隊中或執行中的解析，回傳取消數量"""
+        calls = self._owners.pop(owner, None)
+        if not calls:
+            return 0
+
+        for call in calls:
+            call.cancelled_by_owner = True
+            call.cancel_event.set()
+            if call.future is not None:
+                call.future.cancel()
+        return len(calls)
+
+    def pending(self):
+        """目前排隊中或執行中的解析數量"""
+        return sum(len(calls) for calls in self._owners.values())
+
+    def shutdown(self):
+        """關閉執行緒池（卸載Cog時呼叫）"""
+        self._closed = True
+        for owner in list(self._owners):
+            self.cancel(owner)
+        self._executor.shutdown(wait=False, cancel_futures=True)
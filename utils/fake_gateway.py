@@ -0,0 +1,350 @@
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from aiohttp import web, WSMsgType
+
+DISCORD_EPOCH_MS = 1420070400000
+
+# 合成訊息的內容：大部分是一般聊天，少部分是指令
+CHAT_MESSAGES = ('今天晚上要打163嗎？', '好', '等我一下', '哈哈哈', '194 幾點開？')
+COMMAND_MESSAGES = ('$$', '$$help')
+
+
+def snowflake(ms, counter=0):
+    return ((ms - DISCORD_EPOCH_MS) << 22) | (counter & 0x3FFFFF)
+
+
+def _json(data, status=200):
+    # discord.py 只把 Content-Type 剛好是 application/json 的回應當成 JSON（不能帶 charset）
+    return web.Response(body=json.dumps(data).encode(), status=status, headers={'Content-Type': 'application/json'})
+
+
+def shard_for(guild_id, shard_count):
+    """Discord 的分片規則：(guild_id >> 22) % shard_count"""
+    return (guild_id >> 22) % shard_count
+
+
+class FakeGateway:
+    """本機測試用的假 Discord 閘道與 REST API
+
+    實作足夠讓 discord.py 登入、IDENTIFY、收到 READY 與 GUILD_CREATE 的最小協定，
+    每個分片只會收到屬於它的伺服器（與 Discord 相同的分片規則）。
+    可以用 message_rate 產生合成聊天訊息，也可以 POST /_fake/inject 注入指令；
+    機器人送出的訊息只計數並印出，不會真的送到任何地方。
+    每個伺服器有一個文字頻道（伺服器ID+1）與一個語音頻道（伺服器ID+2）；
+    voice_state() 與 press_button() 產生語音狀態與按鈕事件，按鈕的 custom_id 取自機器人送出的訊息。
+    """
+
+    def __init__(self, guild_count=10, shard_count=1, message_rate=0.0, owner_id=None):
+        self.shard_count = shard_count
+        self.message_rate = message_rate
+        base = int(time.time() * 1000) - 10 ** 8
+        self.bot_user = self._user(snowflake(base), 'FakeBot', bot=True)
+        self.owner = self._user(owner_id or snowflake(base + 1), 'FakeOwner')
+        # 伺服器ID的時間戳連續遞增，讓伺服器平均分佈到各分片
+        self.guilds = [self._guild(snowflake(base + 100 + i), i) for i in range(guild_count)]
+        self._ids = itertools.count(1)
+        self._sockets = {}
+        self._runner = None
+        self.url = None
+        self.verbose = True
+        self.stats = {
+            'identify': 0,
+            'messages_dispatched': 0,
+            'replies': 0,
+            'edits': 0,
+            'interactions': 0,
+            'interaction_responses': 0,
+        }
+        self.replies_by_shard = [0] * shard_count
+        # 帶有元件（按鈕）的訊息：訊息ID -> 訊息內容，只保留最近的
+        self.components = OrderedDict()
+        # 互動ID -> 機器人回應互動的時間（time.perf_counter()）
+        self.responded_at = OrderedDict()
+
+    def _user(self, user_id, name, bot=False):
+        return {
+            'id': str(user_id), 'username': name, 'discriminator': '0000',
+            'global_name': name, 'avatar': None, 'bot': bot,
+        }
+
+    def _guild(self, guild_id, number):
+        return {
+            'id': str(guild_id),
+            'name': f'Fake Guild {number}',
+            'icon': None,
+            'owner_id': self.owner['id'],
+            'unavailable': False,
+            'large': False,
+            'member_count': 1,
+            'members': [{'user': self.bot_user, 'roles': [], 'joined_at': self._now(), 'deaf': False, 'mute': False, 'flags': 0}],
+            'channels': [{
+                'id': str(guild_id + 1), 'type': 0, 'name': 'general', 'position': 0,
+                'permission_overwrites': [], 'guild_id': str(guild_id),
+            }, {
+                'id': str(guild_id + 2), 'type': 2, 'name': 'voice', 'position': 1, 'bitrate': 64000,
+                'user_limit': 0, 'rtc_region': None, 'permission_overwrites': [], 'guild_id': str(guild_id),
+            }],
+            'roles': [{
+                'id': str(guild_id), 'name': '@everyone', 'permissions': str((1 << 41) - 1),
+                'position': 0, 'color': 0, 'hoist': False, 'managed': False, 'mentionable': False,
+            }],
+            'emojis': [], 'stickers': [], 'features': [], 'voice_states': [], 'presences': [],
+            'threads': [], 'stage_instances': [], 'guild_scheduled_events': [],
+            'premium_tier': 0, 'verification_level': 0, 'explicit_content_filter': 0,
+            'default_message_notifications': 0, 'mfa_level': 0, 'nsfw_level': 0,
+        }
+
+    @staticmethod
+    def _now():
+        return datetime.now(timezone.utc).isoformat()
+
+    def guilds_for(self, shard_id):
+        return [g for g in self.guilds if shard_for(int(g['id']), self.shard_count) == shard_id]
+
+    def message_payload(self, guild, content, author=None):
+        guild_id = int(guild['id'])
+        return {
+            'id': str(snowflake(int(time.time() * 1000), next(self._ids))),
+            'channel_id': str(guild_id + 1),
+            'guild_id': str(guild_id),
+            'author': author or self.owner,
+            'member': {'roles': [], 'joined_at': self._now(), 'deaf': False, 'mute': False, 'flags': 0},
+            'content': content,
+            'timestamp': self._now(),
+            'edited_timestamp': None,
+            'tts': False, 'mention_everyone': False, 'mentions': [], 'mention_roles': [],
+            'attachments': [], 'embeds': [], 'pinned': False, 'type': 0, 'flags': 0,
+        }
+
+    def _member(self, user=None):
+        return {'user': user or self.owner, 'roles': [], 'joined_at': self._now(), 'deaf': False, 'mute': False,
+                'flags': 0, 'permissions': str((1 << 41) - 1)}
+
+    @staticmethod
+    def _remember(store, key, value, limit=5000):
+        store[key] = value
+        if len(store) > limit:
+            store.popitem(last=False)
+
+    # ---- REST API ----
+
+    async def _rest(self, request):
+        path = request.match_info['path']
+        if path == 'users/@me':
+            return _json(self.bot_user)
+        if path == 'oauth2/applications/@me':
+            return _json({
+                'id': self.bot_user['id'], 'name': 'FakeBot', 'description': '', 'icon': None,
+                'bot_public': False, 'bot_require_code_grant': False, 'owner': self.owner,
+                'verify_key': '', 'flags': 0, 'team': None,
+            })
+        if path in ('gateway', 'gateway/bot'):
+            return _json({
+                'url': self.url.replace('http', 'ws', 1), 'shards': self.shard_count,
+                'session_start_limit': {'total': 1000, 'remaining': 1000, 'reset_after': 0, 'max_concurrency': 16},
+            })
+        if path.startswith('channels/') and path.endswith('/messages') and request.method == 'POST':
+            channel_id = int(path.split('/')[1])
+            guild_id = channel_id - 1
+            self.stats['replies'] += 1
+            self.replies_by_shard[shard_for(guild_id, self.shard_count)] += 1
+            body = await self._message_body(request)
+            content = body.get('content')
+            if content and self.verbose:
+                print(f"[fake gateway] 伺服器 {guild_id} 收到回覆: {content}")
+            payload = self.message_payload({'id': str(guild_id)}, content or '', author=self.bot_user)
+            if body.get('components'):
+                payload['components'] = body['components']
+                self._remember(self.components, payload['id'], payload)
+            return _json(payload)
+        if path.startswith('channels/') and '/messages/' in path:
+            if request.method == 'PATCH':
+                self.stats['edits'] += 1
+                channel_id = int(path.split('/')[1])
+                return _json(self.message_payload({'id': str(channel_id - 1)}, '', author=self.bot_user))
+            return web.Response(status=204)
+        if path.startswith('interactions/') and path.endswith('/callback'):
+            interaction_id = path.split('/')[1]
+            self.stats['interaction_responses'] += 1
+            self._remember(self.responded_at, interaction_id, time.perf_counter())
+            return _json({'interaction': {'id': interaction_id, 'type': 3}})
+        if path.startswith('webhooks/'):
+            # 互動的後續訊息（followup）
+            if request.method == 'DELETE':
+                return web.Response(status=204)
+            return _json(self.message_payload({'id': '0'}, '', author=self.bot_user))
+        return _json({'message': 'Unknown endpoint', 'code': 0}, status=404)
+
+    @staticmethod
+    async def _message_body(request):
+        if request.content_type == 'application/json':
+            return await request.json()
+        if request.content_type.startswith('multipart/'):
+            form = await request.post()
+            payload = form.get('payload_json')
+            return json.loads(payload) if payload else {}
+        return {}
+
+    async def _inject(self, request):
+        """POST /_fake/inject {"content": "...", "guild": 編號} 以擁有者身分送出一則訊息"""
+        body = await request.json()
+        guild = self.guilds[int(body.get('guild', 0)) % len(self.guilds)]
+        shard_id = shard_for(int(guild['id']), self.shard_count)
+        if not await self.dispatch(shard_id, 'MESSAGE_CREATE', self.message_payload(guild, body['content'])):
+            return _json({'error': f'shard {shard_id} not connected'}, status=503)
+        return _json({'shard': shard_id, 'guild': guild['id']})
+
+    async def _stats(self, request):
+        return _json({
+            **self.stats,
+            'connected_shards': sorted(self._sockets),
+            'replies_by_shard': self.replies_by_shard,
+        })
+
+    def voice_state(self, guild, channel_id, self_mute=False):
+        """擁有者加入/離開（channel_id 為 None）語音頻道或改變靜音狀態的 VOICE_STATE_UPDATE"""
+        return {
+            'guild_id': guild['id'], 'channel_id': str(channel_id) if channel_id else None,
+            'user_id': self.owner['id'], 'member': self._member(), 'session_id': 'fake-voice',
+            'deaf': False, 'mute': False, 'self_deaf': False, 'self_mute': self_mute, 'self_video': False,
+            'suppress': False, 'request_to_speak_timestamp': None,
+        }
+
+    def button_press(self, message_id, custom_id):
+        """擁有者按下機器人訊息上按鈕的 INTERACTION_CREATE，訊息必須是機器人送出且帶有元件的訊息"""
+        message = self.components[str(message_id)]
+        self.stats['interactions'] += 1
+        return {
+            'id': str(snowflake(int(time.time() * 1000), next(self._ids))),
+            'application_id': self.bot_user['id'], 'type': 3, 'token': f'fake-token-{next(self._ids)}',
+            'version': 1, 'guild_id': message['guild_id'], 'channel_id': message['channel_id'],
+            'channel': {'id': message['channel_id'], 'type': 0, 'guild_id': message['guild_id'], 'name': 'general'},
+            'member': self._member(), 'message': message,
+            'data': {'custom_id': custom_id, 'component_type': 2},
+            'app_permissions': str((1 << 41) - 1), 'locale': 'zh-TW', 'guild_locale': 'zh-TW',
+            'attachment_size_limit': 8 * 1024 * 1024, 'entitlements': [], 'authorizing_integration_owners': {},
+            'context': 0,
+        }
+
+    def buttons(self, message_id):
+        """機器人訊息上的按鈕：{表情或標籤: custom_id}"""
+        message = self.components.get(str(message_id))
+        if message is None:
+            return {}
+        result = {}
+        for row in message['components']:
+            for component in row.get('components', ()):
+                if component.get('type') == 2 and component.get('custom_id'):
+                    name = (component.get('emoji') or {}).get('name') or component.get('label')
+                    result[name] = component['custom_id']
+        return result
+
+    # ---- 閘道 ----
+
+    async def dispatch(self, shard_id, event, data):
+        entry = self._sockets.get(shard_id)
+        if entry is None:
+            return False
+        ws, seq = entry
+        seq[0] += 1
+        await ws.send_str(json.dumps({'op': 0, 't': event, 's': seq[0], 'd': data}))
+        if event == 'MESSAGE_CREATE':
+            self.stats['messages_dispatched'] += 1
+        return True
+
+    async def _gateway(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        await ws.send_str(json.dumps({'op': 10, 'd': {'heartbeat_interval': 41250}}))
+        shard_id = None
+        seq = [0]
+        chatter = None
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                payload = json.loads(msg.data)
+                op = payload.get('op')
+                if op == 1:
+                    await ws.send_str(json.dumps({'op': 11}))
+                elif op == 2:
+                    self.stats['identify'] += 1
+                    shard_id = (payload['d'].get('shard') or [0, 1])[0]
+                    self._sockets[shard_id] = (ws, seq)
+                    guilds = self.guilds_for(shard_id)
+                    await self.dispatch(shard_id, 'READY', {
+                        'v': 10, 'user': self.bot_user, 'session_id': f'fake-{shard_id}',
+                        'resume_gateway_url': self.url.replace('http', 'ws', 1),
+                        'guilds': [{'id': g['id'], 'unavailable': True} for g in guilds],
+                        'shard': [shard_id, self.shard_count],
+                        'application': {'id': self.bot_user['id'], 'flags': 0},
+                    })
+                    for guild in guilds:
+                        await self.dispatch(shard_id, 'GUILD_CREATE', guild)
+                    if self.message_rate > 0 and guilds:
+                        chatter = asyncio.create_task(self._chatter(shard_id, guilds))
+                elif op == 6:
+                    # 不支援恢復連線，要求重新 IDENTIFY
+                    await ws.send_str(json.dumps({'op': 9, 'd': False}))
+                elif op == 8:
+                    guild_id = payload['d']['guild_id']
+                    await self.dispatch(shard_id, 'GUILD_MEMBERS_CHUNK', {
+                        'guild_id': guild_id, 'members': [], 'chunk_index': 0, 'chunk_count': 1,
+                        'nonce': payload['d'].get('nonce'),
+                    })
+        finally:
+            if chatter is not None:
+                chatter.cancel()
+            if shard_id is not None and self._sockets.get(shard_id, (None,))[0] is ws:
+                del self._sockets[shard_id]
+        return ws
+
+    async def _chatter(self, shard_id, guilds):
+        """依 message_rate（所有分片合計的每秒訊息數）產生合成訊息"""
+        interval = self.shard_count / self.message_rate
+        while True:
+            await asyncio.sleep(random.expovariate(1 / interval))
+            content = random.choice(COMMAND_MESSAGES if random.random() < 0.05 else CHAT_MESSAGES)
+            await self.dispatch(shard_id, 'MESSAGE_CREATE', self.message_payload(random.choice(guilds), content))
+
+    async def start(self, host='127.0.0.1', port=0):
+        app = web.Application()
+        app.router.add_get('/', self._gateway)
+        app.router.add_post('/_fake/inject', self._inject)
+        app.router.add_get('/_fake/stats', self._stats)
+        app.router.add_route('*', '/api/v{version}/{path:.*}', self._rest)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]  # port=0 時由系統選擇的埠號
+        self.url = f'http://{host}:{port}'
+        return self.url
+
+    async def stop(self):
+        for ws, _ in list(self._sockets.values()):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def summary(self):
+        return (
+            f"假閘道: IDENTIFY {self.stats['identify']} 次，合成訊息 {self.stats['messages_dispatched']} 則，"
+            f"機器人回覆 {self.stats['replies']} 則（各分片 {self.replies_by_shard}），編輯 {self.stats['edits']} 次"
+        )
+
+
+def use_fake_gateway(url):
+    """讓 discord.py 連到假閘道，必須在機器人登入前呼叫"""
+    import yarl
+    from discord.gateway import DiscordWebSocket
+    from discord.http import Route
+
+    Route.BASE = f'{url}/api/v10'
+    DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(url.replace('http', 'ws', 1) + '/')
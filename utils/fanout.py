@@ -0,0 +1,111 @@
+import asyncio
+import io
+import os
+import time
+
+import discord
+
+
+class BatchReport:
+    """一次群發的結果"""
+    __slots__ = ('name', 'targets', 'delivered', 'failed', 'uploads', 'elapsed', 'latencies')
+
+    def __init__(self, name, targets):
+        self.name = name
+        self.targets = targets
+        self.delivered = 0
+        self.failed = 0
+        self.uploads = 0
+        self.elapsed = 0.0
+        self.latencies = []
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def summary(self):
+        return (
+            f"{self.name}: {self.delivered}/{self.targets} 成功，{self.failed} 失敗，上傳 {self.uploads} 次，"
+            f"總耗時 {self.elapsed:.2f}s，p50 {self.percentile(50):.2f}s / 最大 {self.percentile(100):.2f}s"
+        )
+
+
+class NotificationFanout:
+    """把同一則通知同時送到多個頻道
+
+    - 圖片只從磁碟讀取一次並保存在記憶體中（檔案更新時重新讀取）
+    - 第一個頻道上傳圖片後，其餘頻道直接引用該附件的 CDN 網址，不再重複上傳
+    - 同時進行的發送數量受 concurrency 限制
+    """
+
+    def __init__(self, send, concurrency=None):
+        # send(channel, content, **kwargs) 負責送出訊息並回傳 Message
+        self.send = send
+        self.concurrency = concurrency or int(os.getenv('NOTIFY_CONCURRENCY', '10'))
+        self._images = {}
+        self.last_reports = {}
+
+    def image_bytes(self, path):
+        """讀取圖片，檔案不存在時回傳None"""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        cached = self._images.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'rb') as f:
+                cached = (mtime, f.read())
+            self._images[path] = cached
+        return cached[1]
+
+    async def broadcast(self, name, targets, embed, image_path=None, filename=None):
+        """targets 是 (頻道, 訊息內容) 的列表，回傳 BatchReport"""
+        report = BatchReport(name, len(targets))
+        started = time.monotonic()
+        pending = list(targets)
+        data = self.image_bytes(image_path) if image_path else None
+        filename = filename or (os.path.basename(image_path) if image_path else None)
+
+        async def deliver(channel, content, **kwargs):
+            sent_at = time.monotonic()
+            try:
+                message = await self.send(channel, content, embed=kwargs.pop('embed', embed), **kwargs)
+            except Exception as e:
+                report.failed += 1
+                print(f"發送通知到頻道 {getattr(channel, 'id', channel)} 時發生錯誤: {e}")
+                return None
+            report.delivered += 1
+            report.latencies.append(time.monotonic() - sent_at)
+            return message
+
+        if data is not None:
+            # 依序嘗試，直到有一個頻道成功上傳圖片
+            image_url = None
+            while pending and image_url is None:
+                channel, content = pending.pop(0)
+                upload_embed = embed.copy()
+                upload_embed.set_image(url=f"attachment://{filename}")
+                report.uploads += 1
+                message = await deliver(
+                    channel, content, embed=upload_embed, file=discord.File(io.BytesIO(data), filename=filename)
+                )
+                if message is not None and message.attachments:
+                    image_url = message.attachments[0].url
+            if image_url:
+                embed = embed.copy()
+                embed.set_image(url=image_url)
+
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def limited(channel, content):
+            async with limit:
+                await deliver(channel, content)
+
+        await asyncio.gather(*(limited(channel, content) for channel, content in pending))
+
+        report.elapsed = time.monotonic() - started
+        self.last_reports[name] = report
+        print(report.summary())
+        return report
@@ -0,0 +1,111 @@
+import asyncio
+import heapq
+import os
+import time
+
+
+def parse_guild_timeouts(value):
+    """解析 "伺服器ID:秒數,伺服器ID:秒數" 格式的個別逾時設定"""
+    timeouts = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        try:
+            guild_id, seconds = item.split(':', 1)
+            timeouts[int(guild_id)] = float(seconds)
+        except ValueError:
+            print(f"無法解析閒置逾時設定: {item}")
+    return timeouts
+
+
+class IdleScheduler:
+    """依每個伺服器的閒置期限排程自動離開語音頻道
+
+    期限放在最小堆積中，更新只需 O(log n)；背景任務只睡到最早的期限，
+    不需要定期掃描所有伺服器。舊的期限不會從堆積中刪除，取出時再比對是否仍然有效。
+
+    on_idle(guild_id) 在期限到達時被呼叫。
+    """
+
+    def __init__(self, on_idle, timeout=None, guild_timeouts=None):
+        self.on_idle = on_idle
+        self.timeout = timeout or float(os.getenv('VOICE_IDLE_TIMEOUT', str(30 * 60)))
+        self.guild_timeouts = guild_timeouts if guild_timeouts is not None else parse_guild_timeouts(os.getenv('VOICE_IDLE_TIMEOUTS', ''))
+        self._deadlines = {}
+        self._heap = []
+        self._wakeup = None
+        self._task = None
+
+    def timeout_for(self, guild_id):
+        return self.guild_timeouts.get(guild_id, self.timeout)
+
+    def set_timeout(self, guild_id, seconds):
+        """設定個別伺服器的逾時，None 表示使用預設值"""
+        if seconds is None:
+            self.guild_timeouts.pop(guild_id, None)
+        else:
+            self.guild_timeouts[guild_id] = seconds
+        if guild_id in self._deadlines:
+            self.touch(guild_id)
+
+    def touch(self, guild_id):
+        """記錄活動，把期限延後到現在加上逾時時間"""
+        self._schedule(guild_id, time.monotonic() + self.timeout_for(guild_id))
+
+    def expire_now(self, guild_id):
+        """立即視為閒置（例如語音頻道裡已經沒有其他人）"""
+        self._schedule(guild_id, time.monotonic())
+
+    def remove(self, guild_id):
+        self._deadlines.pop(guild_id, None)
+
+    def deadline(self, guild_id):
+        """剩餘秒數，沒有排程時回傳None"""
+        deadline = self._deadlines.get(guild_id)
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def __contains__(self, guild_id):
+        return guild_id in self._deadlines
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def _schedule(self, guild_id, deadline):
+        earliest = self._heap[0][0] if self._heap else None
+        self._deadlines[guild_id] = deadline
+        heapq.heappush(self._heap, (deadline, guild_id))
+        # 堆積裡過期的舊期限太多時重建
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(d, g) for g, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        elif earliest is None or deadline < earliest:
+            # 新的期限比目前等待的更早
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                deadline, guild_id = heapq.heappop(self._heap)
+                if self._deadlines.get(guild_id) != deadline:
+                    continue  # 已經被更新或移除的舊期限
+                del self._deadlines[guild_id]
+                try:
+                    await self.on_idle(guild_id)
+                except Exception as e:
+                    print(f"處理閒置伺服器 {guild_id} 時發生錯誤: {e}")
+
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
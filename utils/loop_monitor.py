@@ -0,0 +1,163 @@
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from utils.metrics import registry
+
+LOOP_LAG_SECONDS = registry.histogram(
+    'bot_event_loop_lag_seconds', '事件迴圈延遲（排定的喚醒時間與實際時間的差）',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+LOOP_BLOCKS = registry.counter(
+    'bot_event_loop_blocks_total', '事件迴圈被阻塞超過門檻的次數'
+)
+
+
+def percentile(sorted_values, fraction):
+    """已排序列表的百分位數（最近排名法），空列表回傳0"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class BlockReport:
+    """一次阻塞的紀錄：發生時間、偵測時已阻塞的秒數、當時的任務與堆疊"""
+    __slots__ = ('at', 'blocked', 'task', 'stack')
+
+    def __init__(self, at, blocked, task, stack):
+        self.at = at
+        self.blocked = blocked
+        self.task = task
+        self.stack = stack
+
+
+class LoopMonitor:
+    """持續量測事件迴圈延遲，迴圈被阻塞時從另一個執行緒擷取阻塞位置的堆疊
+
+    - 迴圈上的心跳每 interval 秒醒來一次，實際醒來時間與預定時間的差就是延遲，保留最近 window 秒的樣本
+    - 監視執行緒檢查心跳多久沒有更新，超過 threshold 秒時以 sys._current_frames() 取得迴圈執行緒的堆疊；
+      每次阻塞只擷取一次，而且 log_interval 秒內最多印出一次，其餘只計數
+    - 監視執行緒只讀取時間與堆疊，不碰迴圈上的任何物件，所以迴圈完全卡住時也能回報
+    """
+
+    def __init__(self, threshold=None, interval=None, window=None, log_interval=None, keep_reports=5):
+        self.threshold = threshold if threshold is not None else float(os.getenv('LOOP_LAG_THRESHOLD', '0.25'))
+        self.interval = interval or float(os.getenv('LOOP_LAG_INTERVAL', '0.5'))
+        self.window = window or float(os.getenv('LOOP_LAG_WINDOW', '600'))
+        self.log_interval = log_interval if log_interval is not None else float(os.getenv('LOOP_LAG_LOG_INTERVAL', '60'))
+        self.samples = deque()  # (時間, 延遲)
+        self.reports = deque(maxlen=keep_reports)
+        self._reports_lock = threading.Lock()  # 監視執行緒寫入、事件迴圈讀取
+        self.blocks = 0
+        self.suppressed = 0
+        self._beat = None
+        self._captured = False
+        self._last_log = None
+        self._loop = None
+        self._loop_thread = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def start(self):
+        """在事件迴圈中呼叫：開始心跳與監視執行緒"""
+        if not self.enabled or self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop = threading.Event()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, args=(self._stop,), name='loop-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._stop.set()
+        self._thread = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            self._captured = False
+            self.record(max(0.0, now - expected), now)
+
+    def record(self, lag, now=None):
+        now = now if now is not None else time.monotonic()
+        self.samples.append((now, lag))
+        LOOP_LAG_SECONDS.observe(lag)
+        cutoff = now - self.window
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    def _watch(self, stop):
+        # 檢查間隔取門檻的一半，阻塞最晚在 1.5 倍門檻時被發現
+        period = max(0.01, self.threshold / 2)
+        while not stop.wait(period):
+            blocked = time.monotonic() - self._beat - self.interval
+            if blocked < self.threshold or self._captured:
+                continue
+            self._captured = True
+            self.blocks += 1
+            LOOP_BLOCKS.inc()
+            report = self._capture(blocked)
+            if report is None:
+                continue
+            with self._reports_lock:
+                self.reports.append(report)
+            now = time.monotonic()
+            if self._last_log is not None and now - self._last_log < self.log_interval:
+                self.suppressed += 1
+                continue
+            self._last_log = now
+            self._log(report)
+
+    def _capture(self, blocked):
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return None
+        task = None
+        try:
+            current = asyncio.current_task(self._loop)
+            if current is not None:
+                task = current.get_name()
+        except RuntimeError:
+            pass
+        stack = ''.join(traceback.format_stack(frame))
+        return BlockReport(time.time(), blocked, task, stack)
+
+    def _log(self, report):
+        extra = f"（之前另有 {self.suppressed} 次阻塞未顯示）" if self.suppressed else ""
+        self.suppressed = 0
+        print(f"事件迴圈已被阻塞 {report.blocked:.2f} 秒，任務 {report.task or '無'}{extra}，堆疊:\n{report.stack}")
+
+    def snapshot(self):
+        """最近的阻塞紀錄（由舊到新）的複本，可以在事件迴圈上安全地走訪"""
+        with self._reports_lock:
+            return list(self.reports)
+
+    def summary(self):
+        """最近 window 秒的延遲統計（秒）"""
+        lags = sorted(lag for _, lag in self.samples)
+        return {
+            'samples': len(lags),
+            'p50': percentile(lags, 0.5),
+            'p90': percentile(lags, 0.9),
+            'p99': percentile(lags, 0.99),
+            'max': lags[-1] if lags else 0.0,
+            'blocks': self.blocks,
+        }
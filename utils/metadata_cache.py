@@ -0,0 +1,260 @@
+import asyncio
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+# 只保存長期有效的欄位，串流URL另外存放
+METADATA_FIELDS = ('title', 'duration', 'webpage_url', 'thumbnail')
+
+_VIDEO_ID_PATTERN = re.compile(
+    r'^(?:https?://)?(?:www\.|music\.|m\.)?(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/)|youtu\.be/)([a-zA-Z0-9_-]{11})'
+)
+
+
+def normalize_query(query):
+    """統一搜尋字串的大小寫與空白，讓相同的搜尋共用快取"""
+    return ' '.join(query.split()).casefold()
+
+
+def video_id_from_url(url):
+    """從YouTube連結中取出影片ID，不是單一影片連結時回傳None"""
+    match = _VIDEO_ID_PATTERN.match(url.strip())
+    return match.group(1) if match else None
+
+
+def stream_expiry(url, default_ttl):
+    """取得googlevideo串流URL的過期時間（unix秒）"""
+    try:
+        expire = parse_qs(urlparse(url).query).get('expire')
+        if expire:
+            return float(expire[0])
+    except ValueError:
+        pass
+    return time.time() + default_ttl
+
+
+class MetadataCache:
+    """兩層式歌曲資訊快取：記憶體LRU + 選用的SQLite
+
+    - 搜尋字串 -> 影片ID
+    - 影片ID -> 歌曲資訊（標題、長度、網址、縮圖）
+    - 影片ID -> 串流URL（只存在記憶體，並依過期時間判斷是否需要重新解析）
+
+    寫入SQLite的資料先放在待寫入區，每 flush_interval 秒在一個交易中寫入，
+    解析歌曲時不必等待磁碟同步。
+    """
+
+    def __init__(self, max_entries=None, db_path=None, stream_margin=None, stream_ttl=None, flush_interval=None):
+        self.max_entries = max_entries or int(os.getenv('MUSIC_CACHE_SIZE', '2048'))
+        db_path = db_path if db_path is not None else os.getenv('MUSIC_CACHE_DB', '')
+        self.flush_interval = flush_interval or float(os.getenv('MUSIC_CACHE_FLUSH', '5'))
+        # 串流URL在過期前多久就視為失效，避免播放途中過期
+        self.stream_margin = stream_margin if stream_margin is not None else float(os.getenv('MUSIC_STREAM_MARGIN', '300'))
+        # 無法從URL得知過期時間時使用的存活時間
+        self.stream_ttl = stream_ttl if stream_ttl is not None else float(os.getenv('MUSIC_STREAM_TTL', '1800'))
+
+        self._queries = OrderedDict()
+        self._metadata = OrderedDict()
+        self._streams = OrderedDict()
+        # 尚未寫入資料庫的資料：搜尋字串 -> 列、影片ID -> 列
+        self._pending_queries = {}
+        self._pending_videos = {}
+        self._flush_handle = None
+
+        self.stats = {
+            'query_hits': 0,
+            'query_misses': 0,
+            'metadata_hits': 0,
+            'metadata_disk_hits': 0,
+            'metadata_misses': 0,
+            'stream_hits': 0,
+            'stream_stale': 0,
+            'stream_misses': 0,
+            'flushes': 0,
+            'rows_written': 0,
+        }
+
+        self._db = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS queries (query TEXT PRIMARY KEY, video_id TEXT NOT NULL, updated_at REAL)'
+                )
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS videos (video_id TEXT PRIMARY KEY, title TEXT, duration INTEGER, '
+                    'webpage_url TEXT, thumbnail TEXT, updated_at REAL)'
+                )
+                self._db.commit()
+                print(f"歌曲資訊快取資料庫: {db_path}")
+            except sqlite3.Error as e:
+                print(f"無法開啟快取資料庫 {db_path}: {e}")
+                self._db = None
+
+    def _remember(self, table, key, value):
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+
+    def get_video_id(self, query):
+        """查詢搜尋字串或連結對應的影片ID"""
+        video_id = video_id_from_url(query)
+        if video_id:
+            return video_id
+
+        key = normalize_query(query)
+        video_id = self._queries.get(key)
+        if video_id is None and key in self._pending_queries:
+            video_id = self._pending_queries[key][1]
+        if video_id is None and self._db is not None:
+            row = self._db.execute('SELECT video_id FROM queries WHERE query = ?', (key,)).fetchone()
+            if row:
+                video_id = row[0]
+
+        if video_id is None:
+            self.stats['query_misses'] += 1
+            return None
+
+        self.stats['query_hits'] += 1
+        self._remember(self._queries, key, video_id)
+        return video_id
+
+    def put_query(self, query, video_id):
+        if video_id_from_url(query):
+            return
+        key = normalize_query(query)
+        self._remember(self._queries, key, video_id)
+        if self._db is not None:
+            self._pending_queries[key] = (key, video_id, time.time())
+            self._schedule_flush()
+
+    def get_metadata(self, video_id):
+        """取得影片的歌曲資訊（不含串流URL），沒有快取時回傳None"""
+        metadata = self._metadata.get(video_id)
+        if metadata is not None:
+            self.stats['metadata_hits'] += 1
+            self._metadata.move_to_end(video_id)
+            return dict(metadata)
+
+        pending = self._pending_videos.get(video_id)
+        if pending is not None:
+            self.stats['metadata_hits'] += 1
+            metadata = dict(zip(METADATA_FIELDS, pending[1:5]))
+            self._remember(self._metadata, video_id, metadata)
+            return dict(metadata)
+
+        if self._db is not None:
+            row = self._db.execute(
+                'SELECT title, duration, webpage_url, thumbnail FROM videos WHERE video_id = ?', (video_id,)
+            ).fetchone()
+            if row:
+                self.stats['metadata_disk_hits'] += 1
+                metadata = dict(zip(METADATA_FIELDS, row))
+                self._remember(self._metadata, video_id, metadata)
+                return dict(metadata)
+
+        self.stats['metadata_misses'] += 1
+        return None
+
+    def put_metadata(self, video_id, info):
+        metadata = {
+            'title': info.get('title', ''),
+            'duration': info.get('duration') or 0,
+            'webpage_url': info.get('webpage_url') or f"https://www.youtube.com/watch?v={video_id}",
+            'thumbnail': info.get('thumbnail') or '',
+        }
+        self._remember(self._metadata, video_id, metadata)
+        if self._db is not None:
+            self._pending_videos[video_id] = (
+                video_id, metadata['title'], metadata['duration'], metadata['webpage_url'],
+                metadata['thumbnail'], time.time()
+            )
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            try:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+            except RuntimeError:
+                # 沒有事件迴圈（例如在指令列工具中使用）時直接寫入
+                self.flush()
+
+    def flush(self):
+        """在一個交易中寫入所有待寫入的資料"""
+        self._flush_handle = None
+        if self._db is None or not (self._pending_queries or self._pending_videos):
+            return
+        queries, videos = list(self._pending_queries.values()), list(self._pending_videos.values())
+        self._pending_queries.clear()
+        self._pending_videos.clear()
+        try:
+            with self._db:
+                if queries:
+                    self._db.executemany(
+                        'INSERT OR REPLACE INTO queries (query, video_id, updated_at) VALUES (?, ?, ?)', queries
+                    )
+                if videos:
+                    self._db.executemany(
+                        'INSERT OR REPLACE INTO videos (video_id, title, duration, webpage_url, thumbnail, updated_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?)', videos
+                    )
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += len(queries) + len(videos)
+        except sqlite3.Error as e:
+            print(f"寫入快取資料庫時發生錯誤: {e}")
+
+    def get_stream(self, video_id):
+        """取得仍然有效的 (串流URL, 音訊編碼)，過期或不存在時回傳None"""
+        entry = self._streams.get(video_id)
+        if entry is None:
+            self.stats['stream_misses'] += 1
+            return None
+
+        url, expires_at, acodec = entry
+        if expires_at - self.stream_margin <= time.time():
+            self.stats['stream_stale'] += 1
+            del self._streams[video_id]
+            return None
+
+        self.stats['stream_hits'] += 1
+        self._streams.move_to_end(video_id)
+        return url, acodec
+
+    def stream_is_fresh(self, video_id, url=None):
+        """不影響統計地檢查串流URL是否仍然有效"""
+        entry = self._streams.get(video_id)
+        if entry is None or (url is not None and entry[0] != url):
+            return False
+        return entry[1] - self.stream_margin > time.time()
+
+    def put_stream(self, video_id, url, acodec=None):
+        self._remember(self._streams, video_id, (url, stream_expiry(url, self.stream_ttl), acodec))
+
+    def put_info(self, info, query=None):
+        """把一次完整解析的結果寫入所有快取層"""
+        video_id = info.get('id')
+        if not video_id:
+            return
+        self.put_metadata(video_id, info)
+        if info.get('url'):
+            self.put_stream(video_id, info['url'], info.get('acodec'))
+        if query:
+            self.put_query(query, video_id)
+
+    def hit_rate(self):
+        hits = self.stats['metadata_hits'] + self.stats['metadata_disk_hits']
+        total = hits + self.stats['metadata_misses']
+        return hits / total if total else 0.0
+
+    def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
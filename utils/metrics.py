@@ -0,0 +1,214 @@
+import bisect
+import math
+import os
+import threading
+import time
+
+# 預設的延遲分組（秒），涵蓋從毫秒級的指令到數十秒的播放清單解析
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+class Counter:
+    """只增不減的計數器"""
+
+    def __init__(self, registry, name, help, labels=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}'
+
+
+class Histogram:
+    """固定分組的延遲分佈，observe 只需要一次二分搜尋"""
+
+    def __init__(self, registry, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # 標籤值 -> [各分組的數量..., 總和, 次數]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, *label_values):
+        """with histogram.time(...): 記錄區塊執行的時間"""
+        return _Timer(self, label_values)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            items = [(label_values, list(series)) for label_values, series in self._series.items()]
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, ('le', _format_value(float(bound))))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labels, label_values, ('le', '+Inf'))
+            yield f'{self.name}_bucket{labels} {series[-1]}'
+            yield f'{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(series[-2])}'
+            yield f'{self.name}_count{_format_labels(self.labels, label_values)} {series[-1]}'
+
+
+class _Timer:
+    __slots__ = ('histogram', 'label_values', 'started')
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+        return False
+
+
+class MetricsRegistry:
+    """收集計數器與延遲分佈，以 Prometheus 文字格式輸出
+
+    - 設定 METRICS_PORT 才啟用；停用時 observe/inc 立即返回，幾乎沒有成本
+    - 已經有 stats 的元件（發送排程、控制面板…）以 collector 在抓取時讀取，不在熱路徑上多做事
+    - 所有記錄都可以從任何執行緒呼叫（例如語音執行緒送出第一個音框時）
+    """
+
+    def __init__(self, enabled=None):
+        self.port = os.getenv('METRICS_PORT', '')
+        self.host = os.getenv('METRICS_HOST', '127.0.0.1')
+        self.enabled = bool(self.port) if enabled is None else enabled
+        self._metrics = {}
+        self._collectors = {}
+        self._runner = None
+
+    def counter(self, name, help, labels=()):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Counter(self, name, help, labels)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Histogram(self, name, help, labels, buckets)
+        return metric
+
+    def collector(self, key, collect):
+        """註冊抓取時才讀取的數值；collect() 回傳 (名稱, 類型, 說明, [(標籤字典, 數值)]) 的列表
+
+        以同一個 key 重新註冊會取代舊的（例如重新載入 cog）。
+        """
+        self._collectors[key] = collect
+
+    def remove_collector(self, key):
+        self._collectors.pop(key, None)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for key, collect in list(self._collectors.items()):
+            try:
+                families = collect()
+            except Exception as e:
+                print(f"讀取指標 {key} 時發生錯誤: {e}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f'{name}{_format_labels(names, tuple(labels[n] for n in names))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    async def start(self, port=None):
+        """在 METRICS_HOST:METRICS_PORT 開啟 /metrics，回傳實際使用的埠號"""
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.render(), content_type='text/plain', charset='utf-8',
+                                headers={'X-Content-Type-Options': 'nosniff'})
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, int(port if port is not None else self.port))
+        await site.start()
+        port = self._runner.addresses[0][1]  # port=0 時由系統選擇的埠號
+        print(f"指標端點: http://{self.host}:{port}/metrics")
+        return port
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+# 整個行程共用的指標
+registry = MetricsRegistry()
+
+EXTRACT_SECONDS = registry.histogram(
+    'bot_extract_seconds', 'yt-dlp 解析時間', labels=('kind', 'outcome')
+)
+TIME_TO_FIRST_AUDIO = registry.histogram(
+    'bot_time_to_first_audio_seconds', '從 $$play/$$playlist 到送出第一個音框的時間', labels=('command',)
+)
+COMMAND_SECONDS = registry.histogram(
+    'bot_command_seconds', '指令處理時間', labels=('command', 'outcome')
+)
+PLAY_FAILURES = registry.counter(
+    'bot_play_failures_total', '無法播放而被略過的歌曲數'
+)
@@ -0,0 +1,158 @@
+import json
+import os
+
+import pytz
+
+from utils.schedule import ScheduleEntry, WeeklyIndex
+
+DAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+
+class ConfigError(Exception):
+    """通知設定檔格式錯誤"""
+
+
+def parse_time(value):
+    """把 "HH:MM" 轉成 (時, 分)"""
+    try:
+        hour, minute = (int(part) for part in str(value).split(':', 1))
+    except ValueError:
+        raise ConfigError(f"無法解析時間: {value}")
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ConfigError(f"時間超出範圍: {value}")
+    return hour, minute
+
+
+def parse_days(values):
+    """把星期列表（0 為星期一，或 "mon"~"sun"）轉成數字，None 表示每天"""
+    if values is None:
+        return None
+    days = []
+    for value in values:
+        if isinstance(value, str) and value[:3].lower() in DAY_NAMES:
+            days.append(DAY_NAMES.index(value[:3].lower()))
+        elif isinstance(value, int) and 0 <= value < 7:
+            days.append(value)
+        else:
+            raise ConfigError(f"無法解析星期: {value}")
+    return days
+
+
+def parse_id(value, field, required=True):
+    if value is None and not required:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ConfigError(f"{field} 必須是數字ID: {value}")
+
+
+class Subscription:
+    """一個通知訂閱：發到哪個頻道、提及哪個身分組、用哪張圖片"""
+    __slots__ = ('guild_id', 'channel_id', 'role_id', 'image', 'dungeons')
+
+    def __init__(self, channel_id, role_id=None, guild_id=None, image=None, dungeons=None):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.role_id = role_id
+        # None 表示使用副本預設的圖片
+        self.image = image
+        # None 表示訂閱所有副本
+        self.dungeons = None if dungeons is None else frozenset(dungeons)
+
+    def __repr__(self):
+        return f"Subscription(channel={self.channel_id}, role={self.role_id})"
+
+
+class NotificationConfig:
+    """編譯後的通知設定，建立後不再修改；重新載入時整個替換
+
+    - index 是一週分鐘索引，查詢「現在要觸發哪些副本」是 O(1)
+    - 每個副本的訂閱者在載入時就分好，觸發時不需要再解析
+    """
+
+    def __init__(self, timezone, dungeons, subscriptions, path=None, mtime=None):
+        self.timezone = timezone
+        self.dungeons = {dungeon['name']: dungeon for dungeon in dungeons}
+        self.subscriptions = list(subscriptions)
+        self.path = path
+        self.mtime = mtime
+        self.index = WeeklyIndex(
+            ScheduleEntry(dungeon['name'], dungeon['times'], dungeon.get('days'), dungeon)
+            for dungeon in dungeons
+        )
+        self._subscribers = {
+            name: tuple(sub for sub in self.subscriptions if sub.dungeons is None or name in sub.dungeons)
+            for name in self.dungeons
+        }
+
+    def subscribers(self, dungeon_name):
+        return self._subscribers.get(dungeon_name, ())
+
+    @classmethod
+    def load(cls, path, extra_subscriptions=()):
+        """讀取並編譯設定檔，格式錯誤時拋出 ConfigError
+
+        extra_subscriptions 是從環境變數讀到的訂閱，會套用到所有副本。
+        """
+        try:
+            mtime = os.path.getmtime(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ConfigError(f"無法讀取通知設定檔 {path}: {e}")
+        if not isinstance(raw, dict):
+            raise ConfigError("通知設定檔的最外層必須是物件")
+
+        base = os.path.dirname(os.path.abspath(path))
+        timezone = raw.get('timezone', 'Asia/Taipei')
+        try:
+            pytz.timezone(timezone)
+        except pytz.UnknownTimeZoneError:
+            raise ConfigError(f"未知的時區: {timezone}")
+
+        dungeons = []
+        for item in raw.get('dungeons', []):
+            try:
+                name = str(item['name'])
+                times = [parse_time(value) for value in item['times']]
+            except (KeyError, TypeError):
+                raise ConfigError(f"副本設定缺少 name 或 times: {item}")
+            image = item.get('image')
+            dungeons.append({
+                'name': name,
+                'title': item.get('title', name),
+                'times': times,
+                'days': parse_days(item.get('days')),
+                'image': os.path.join(base, image) if image else None,
+            })
+        names = {dungeon['name'] for dungeon in dungeons}
+        if len(names) != len(dungeons):
+            raise ConfigError("副本名稱重複")
+
+        subscriptions = []
+        for item in raw.get('subscriptions', []):
+            if not isinstance(item, dict):
+                raise ConfigError(f"無法解析通知訂閱設定: {item}")
+            wanted = item.get('dungeons')
+            if wanted is not None:
+                wanted = [str(name) for name in wanted]
+                unknown = set(wanted) - names
+                if unknown:
+                    raise ConfigError(f"訂閱了不存在的副本: {', '.join(sorted(unknown))}")
+            image = item.get('image')
+            subscriptions.append(Subscription(
+                parse_id(item.get('channel'), 'channel'),
+                parse_id(item.get('role'), 'role', required=False),
+                parse_id(item.get('guild'), 'guild', required=False),
+                os.path.join(base, image) if image else None,
+                wanted,
+            ))
+
+        known = {(sub.channel_id, sub.role_id) for sub in subscriptions}
+        for sub in extra_subscriptions:
+            if (sub.channel_id, sub.role_id) not in known:
+                subscriptions.append(sub)
+                known.add((sub.channel_id, sub.role_id))
+
+        return cls(timezone, dungeons, subscriptions, path=path, mtime=mtime)
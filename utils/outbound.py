@@ -0,0 +1,233 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+
+# 優先順序：數字越小越先送出
+PRIORITY_PLAYER = 0   # 控制面板
+PRIORITY_REPLY = 1    # 指令回覆、錯誤訊息、通知
+PRIORITY_STATUS = 2   # 狀態訊息（暫停、跳過、播放清單進度等）
+
+PRIORITY_NAMES = {
+    PRIORITY_PLAYER: 'player',
+    PRIORITY_REPLY: 'reply',
+    PRIORITY_STATUS: 'status',
+}
+
+
+class _Job:
+    __slots__ = ('priority', 'seq', 'kind', 'target', 'kwargs', 'future', 'enqueued_at')
+
+    def __init__(self, priority, seq, kind, target, kwargs):
+        self.priority = priority
+        self.seq = seq
+        self.kind = kind  # send / edit
+        self.target = target
+        self.kwargs = kwargs
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _ChannelState:
+    __slots__ = ('jobs', 'edits', 'tokens', 'refilled_at', 'worker',
+                 'status_message', 'status_lines', 'status_at', 'last_message_id')
+
+    def __init__(self, capacity):
+        self.jobs = []
+        self.edits = {}  # 訊息ID -> 尚未送出的編輯，用來合併
+        self.tokens = capacity
+        self.refilled_at = time.monotonic()
+        self.worker = None
+        self.status_message = None
+        self.status_lines = []
+        self.status_at = 0.0
+        self.last_message_id = None
+
+
+class _RateLimitCounter(logging.Handler):
+    """從 discord.py 的記錄中計算 429 次數（discord.py 會自行等待並重試）
+
+    比對格式字串而不是格式化後的訊息，不同版本的措辭略有不同，所以只比對 429。
+    子速率限制（剩餘請求數大於 0 仍收到 429）之後還會記錄一次 responded with 429，
+    另外計數以免同一個 429 算兩次；discord.py 2.x 以 DEBUG 記錄它，只有開啟除錯記錄時才看得到。
+    """
+
+    def __init__(self, stats):
+        super().__init__(logging.DEBUG)
+        self.stats = stats
+
+    def emit(self, record):
+        message = record.msg if isinstance(record.msg, str) else ''
+        if 'Global rate limit' in message:
+            self.stats['global_rate_limited'] += 1
+        elif '429' not in message:
+            return
+        elif 'sub-ratelimit' in message:
+            self.stats['sub_rate_limited'] += 1
+        else:
+            self.stats['rate_limited'] += 1
+
+
+class OutboundScheduler:
+    """集中送出訊息：每個頻道一個令牌桶，依優先順序排隊
+
+    - 控制面板的更新排在一般回覆與狀態訊息前面
+    - 同一則訊息尚未送出的編輯會合併成最後一次
+    - 短時間內送到同一頻道的狀態訊息會合併成一則，以編輯的方式追加
+    """
+
+    def __init__(self, rate=None, per=None, status_window=None, status_lines=None):
+        # 每個頻道每 per 秒最多 rate 則（Discord 的頻道限制約為 5 則 / 5 秒）
+        self.rate = rate or int(os.getenv('OUTBOUND_RATE', '5'))
+        self.per = per or float(os.getenv('OUTBOUND_PER', '5'))
+        # 狀態訊息在多少秒內可以合併，以及一則最多保留幾行
+        self.status_window = status_window if status_window is not None else float(os.getenv('OUTBOUND_STATUS_WINDOW', '30'))
+        self.status_lines = status_lines or int(os.getenv('OUTBOUND_STATUS_LINES', '10'))
+        self._channels = {}
+        self._seq = itertools.count()
+        self.stats = {
+            'sent': 0,
+            'edited': 0,
+            'failed': 0,
+            'edits_coalesced': 0,
+            'status_merged': 0,
+            'rate_limited': 0,
+            'sub_rate_limited': 0,
+            'global_rate_limited': 0,
+            'max_wait': 0.0,
+        }
+        self._rate_limit_counter = _RateLimitCounter(self.stats)
+        logging.getLogger('discord.http').addHandler(self._rate_limit_counter)
+
+    def _state(self, channel_id):
+        state = self._channels.get(channel_id)
+        if state is None:
+            if len(self._channels) >= 1000:
+                self._prune()
+            state = self._channels[channel_id] = _ChannelState(self.rate)
+        return state
+
+    def _prune(self):
+        """移除沒有待送訊息、狀態訊息也已過了合併時間的頻道"""
+        now = time.monotonic()
+        for channel_id, state in list(self._channels.items()):
+            if not state.jobs and (state.worker is None or state.worker.done()) \
+                    and now - state.status_at > self.status_window:
+                del self._channels[channel_id]
+
+    def _submit(self, channel_id, job):
+        state = self._state(channel_id)
+        heapq.heappush(state.jobs, job)
+        if state.worker is None or state.worker.done():
+            state.worker = asyncio.create_task(self._drain(channel_id, state))
+        return state
+
+    async def send(self, channel, content=None, *, priority=PRIORITY_REPLY, **kwargs):
+        """排隊送出新訊息，回傳送出的訊息"""
+        if content is not None:
+            kwargs['content'] = content
+        job = _Job(priority, next(self._seq), 'send', channel, kwargs)
+        state = self._submit(channel.id, job)
+        message = await job.future
+        state.last_message_id = message.id
+        return message
+
+    async def edit(self, message, *, priority=PRIORITY_REPLY, **kwargs):
+        """排隊編輯訊息；同一則訊息還沒送出的編輯會合併"""
+        state = self._state(message.channel.id)
+        pending = state.edits.get(message.id)
+        if pending is not None and not pending.future.done():
+            self.stats['edits_coalesced'] += 1
+            pending.kwargs.update(kwargs)
+            if priority < pending.priority:
+                # 提高優先順序需要重新排序
+                pending.priority = priority
+                heapq.heapify(state.jobs)
+            return await asyncio.shield(pending.future)
+
+        job = _Job(priority, next(self._seq), 'edit', message, kwargs)
+        state.edits[message.id] = job
+        self._submit(message.channel.id, job)
+        return await asyncio.shield(job.future)
+
+    async def status(self, channel, line):
+        """送出一行狀態訊息；如果頻道最後一則是最近的狀態訊息，就把這行合併進去"""
+        state = self._state(channel.id)
+        now = time.monotonic()
+        message = state.status_message
+        # state.last_message_id 只記錄這裡送出的訊息；channel.last_message_id 由閘道更新，
+        # 比狀態訊息新代表之後有其他人發言（閘道事件晚到時會比較舊，仍可合併）
+        channel_last = getattr(channel, 'last_message_id', None)
+        if (message is not None and state.last_message_id == message.id
+                and (channel_last is None or channel_last <= message.id)
+                and now - state.status_at <= self.status_window
+                and len(state.status_lines) < self.status_lines):
+            state.status_lines.append(line)
+            state.status_at = now
+            self.stats['status_merged'] += 1
+            return await self.edit(message, content="\n".join(state.status_lines), priority=PRIORITY_STATUS)
+
+        state.status_lines = [line]
+        state.status_at = now
+        message = await self.send(channel, line, priority=PRIORITY_STATUS)
+        state.status_message = message
+        return message
+
+    async def _take_token(self, state):
+        while True:
+            now = time.monotonic()
+            state.tokens = min(self.rate, state.tokens + (now - state.refilled_at) * self.rate / self.per)
+            state.refilled_at = now
+            if state.tokens >= 1:
+                state.tokens -= 1
+                return
+            await asyncio.sleep((1 - state.tokens) * self.per / self.rate)
+
+    async def _drain(self, channel_id, state):
+        while state.jobs:
+            await self._take_token(state)
+            # 等待令牌期間可能有更高優先的工作加入，所以拿到令牌後才取出
+            job = heapq.heappop(state.jobs)
+            if job.kind == 'edit' and state.edits.get(job.target.id) is job:
+                del state.edits[job.target.id]
+
+            wait = time.monotonic() - job.enqueued_at
+            if wait > self.stats['max_wait']:
+                self.stats['max_wait'] = wait
+            try:
+                if job.kind == 'send':
+                    result = await job.target.send(**job.kwargs)
+                    self.stats['sent'] += 1
+                else:
+                    result = await job.target.edit(**job.kwargs)
+                    self.stats['edited'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                continue
+            if not job.future.done():
+                job.future.set_result(result if result is not None else job.target)
+
+    def queue_depth(self):
+        """各優先順序目前排隊中的訊息數"""
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for state in self._channels.values():
+            for job in state.jobs:
+                depth[PRIORITY_NAMES.get(job.priority, str(job.priority))] += 1
+        return depth
+
+    def close(self):
+        logging.getLogger('discord.http').removeHandler(self._rate_limit_counter)
+        for state in self._channels.values():
+            if state.worker is not None:
+                state.worker.cancel()
+            for job in state.jobs:
+                if not job.future.done():
+                    job.future.cancel()
+        self._channels.clear()
@@ -0,0 +1,195 @@
+import asyncio
+import os
+import time
+
+import discord
+
+
+class PanelSnapshot:
+    """某一刻的控制面板內容，只包含顯示需要的欄位
+
+    version 是擷取時播放器的狀態版本，和進度文字一起作為快速比對的依據。
+    """
+    __slots__ = ('version', 'state', 'title', 'url', 'thumbnail', 'loop', 'paused',
+                 'current_time', 'duration', 'progress_bar', 'upcoming', 'queue_length')
+
+    EMPTY_BAR = "`──────────────────────`"
+
+    def __init__(self, version=None, state='idle', title='', url='', thumbnail='', loop=False, paused=False,
+                 current_time="00:00", duration="00:00", progress_bar=EMPTY_BAR, upcoming=(), queue_length=0):
+        self.version = version
+        self.state = state  # idle / unknown / playing
+        self.title = title
+        self.url = url
+        self.thumbnail = thumbnail
+        self.loop = loop
+        self.paused = paused
+        self.current_time = current_time
+        self.duration = duration
+        self.progress_bar = progress_bar
+        self.upcoming = upcoming
+        self.queue_length = queue_length
+
+    @classmethod
+    def capture(cls, player, progress=None):
+        """由播放器擷取快照，progress 是 (目前時間, 總時長, 進度條) 的顯示文字"""
+        if not player or not player.voice_client:
+            return cls()
+
+        current = player.current
+        vc = player.voice_client
+        if not current:
+            if vc.is_playing() or vc.is_paused():
+                # 正在播放但沒有歌曲資訊
+                return cls(version=player.version, state='unknown')
+            return cls(version=player.version)
+
+        snapshot = cls(
+            version=player.version,
+            state='playing',
+            title=current.title or '未知歌曲',
+            url=current.webpage_url,
+            thumbnail=current.thumbnail,
+            loop=player.loop,
+            paused=vc.is_paused(),
+            upcoming=tuple(song.title or '未知歌曲' for song in player.upcoming(3)),
+            queue_length=len(player.queue),
+        )
+        if progress:
+            snapshot.current_time, snapshot.duration, snapshot.progress_bar = progress
+        return snapshot
+
+    def key(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+
+def build_panel_embed(snapshot):
+    """把快照轉成控制面板的嵌入訊息"""
+    embed = discord.Embed(title="🎵 音樂播放器", color=discord.Color.purple())
+
+    if snapshot.state == 'unknown':
+        embed.description = "正在播放音樂，但無法獲取歌曲信息。"
+        return embed
+    if snapshot.state != 'playing':
+        embed.description = "目前沒有播放任何歌曲"
+        return embed
+
+    status = "⏸️" if snapshot.paused else "▶️"
+    loop_status = "🔁 循環模式: 開啟" if snapshot.loop else "🔁 循環模式: 關閉"
+    embed.description = (
+        f"**正在播放:** [{snapshot.title}]({snapshot.url})\n\n{loop_status}\n\n"
+        f"{status}  {snapshot.current_time}  {snapshot.progress_bar}  {snapshot.duration}"
+    )
+
+    if snapshot.thumbnail:
+        embed.set_thumbnail(url=snapshot.thumbnail)
+
+    # 展示隊列中的下一首歌曲
+    if snapshot.upcoming:
+        queue_text = "\n".join(f"{i+1}. {title}" for i, title in enumerate(snapshot.upcoming))
+        if snapshot.queue_length > len(snapshot.upcoming):
+            queue_text += f"\n... 還有 {snapshot.queue_length - len(snapshot.upcoming)} 首歌"
+        embed.add_field(name="播放隊列", value=queue_text, inline=False)
+
+    return embed
+
+
+class _PanelState:
+    __slots__ = ('key', 'content', 'last_edit', 'task')
+
+    def __init__(self):
+        self.key = None
+        self.content = None
+        self.last_edit = 0.0
+        self.task = None
+
+
+class PanelRenderer:
+    """合併控制面板的編輯
+
+    - 內容與上次送出的相同時不編輯
+    - 同一則訊息的編輯間隔至少 min_interval 秒；間隔內的更新只排一次，
+      觸發時才擷取快照，所以只會送出最後的狀態
+    """
+
+    def __init__(self, min_interval=None, edit=None):
+        # edit(message, **kwargs) 負責實際送出編輯，預設直接呼叫 message.edit
+        self.edit = edit or (lambda message, **kwargs: message.edit(**kwargs))
+        self.min_interval = min_interval if min_interval is not None else float(os.getenv('MUSIC_PANEL_INTERVAL', '1.5'))
+        self._states = {}
+        self.stats = {
+            'requests': 0,
+            'edits': 0,
+            'unchanged': 0,
+            'coalesced': 0,
+        }
+
+    def _state(self, message):
+        state = self._states.get(message.id)
+        if state is None:
+            state = self._states[message.id] = _PanelState()
+        return state
+
+    def remember(self, message, snapshot, embed=None):
+        """記錄剛送出的新控制面板內容"""
+        state = self._state(message)
+        state.key = snapshot.key()
+        state.content = (embed or build_panel_embed(snapshot)).to_dict()
+        state.last_edit = time.monotonic()
+
+    def forget(self, message):
+        state = self._states.pop(message.id, None)
+        if state is not None and state.task is not None:
+            state.task.cancel()
+
+    async def update(self, message, capture):
+        """要求更新控制面板，capture() 在真正編輯前才擷取快照"""
+        self.stats['requests'] += 1
+        state = self._state(message)
+        if state.task is not None:
+            # 已經排了一次更新，它會送出最新的狀態
+            self.stats['coalesced'] += 1
+            return
+
+        wait = state.last_edit + self.min_interval - time.monotonic()
+        if wait > 0:
+            self.stats['coalesced'] += 1
+            state.task = asyncio.create_task(self._delayed(message, state, capture, wait))
+            return
+
+        await self._render(message, state, capture)
+
+    async def _delayed(self, message, state, capture, wait):
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            return
+        state.task = None
+        await self._render(message, state, capture)
+
+    async def _render(self, message, state, capture):
+        snapshot = capture()
+        key = snapshot.key()
+        if key == state.key:
+            self.stats['unchanged'] += 1
+            return
+
+        embed = build_panel_embed(snapshot)
+        content = embed.to_dict()
+        state.key = key
+        if content == state.content:
+            # 狀態版本變了，但顯示的內容相同
+            self.stats['unchanged'] += 1
+            return
+
+        state.content = content
+        state.last_edit = time.monotonic()
+        try:
+            await self.edit(message, embed=embed)
+            self.stats['edits'] += 1
+        except discord.NotFound:
+            # 控制面板已被刪除
+            self.forget(message)
+        except Exception as e:
+            print(f"更新播放器錯誤: {e}")
+            state.key = state.content = None
@@ -0,0 +1,193 @@
+import random
+import sys
+import time
+from collections import deque
+
+
+class Track:
+    """隊列中的一首歌，只保存播放與顯示需要的欄位"""
+    __slots__ = ('id', 'title', 'duration', 'webpage_url', 'thumbnail', 'url', 'acodec')
+
+    def __init__(self, id='', title='', duration=0, webpage_url='', thumbnail='', url=None, acodec=None):
+        self.id = id
+        self.title = title
+        self.duration = duration
+        self.webpage_url = webpage_url
+        self.thumbnail = thumbnail
+        self.url = url  # 串流URL，會過期，播放前才解析
+        self.acodec = acodec  # 串流的音訊編碼（例如 opus），與串流URL一起更新
+
+    @classmethod
+    def from_info(cls, info):
+        """由 yt-dlp 的完整解析結果建立"""
+        return cls(
+            id=info.get('id', ''),
+            title=info['title'],
+            duration=int(info.get('duration') or 0),
+            webpage_url=info.get('webpage_url', ''),
+            thumbnail=info.get('thumbnail', ''),
+            url=info['url'],
+            acodec=info.get('acodec')
+        )
+
+    @classmethod
+    def from_entry(cls, entry):
+        """由播放清單的扁平解析結果建立（不含串流URL）"""
+        video_id = entry['id']
+        thumbnails = entry.get('thumbnails') or []
+        return cls(
+            id=video_id,
+            title=entry.get('title') or video_id,
+            duration=int(entry.get('duration') or 0),
+            webpage_url=f"https://www.youtube.com/watch?v={video_id}",
+            thumbnail=thumbnails[-1].get('url', '') if thumbnails else ''
+        )
+
+    def copy(self):
+        return Track(self.id, self.title, self.duration, self.webpage_url, self.thumbnail, self.url, self.acodec)
+
+    def update(self, other):
+        """用重新解析的結果更新這首歌"""
+        for name in self.__slots__:
+            setattr(self, name, getattr(other, name))
+
+    def size(self):
+        """估計這首歌佔用的記憶體（位元組）"""
+        return sys.getsizeof(self) + sum(sys.getsizeof(getattr(self, name)) for name in self.__slots__)
+
+
+class GuildPlayer:
+    """單一伺服器的所有播放狀態：語音連線、隊列、目前歌曲與控制面板"""
+
+    def __init__(self, guild_id, history_size=20):
+        self.guild_id = guild_id
+        self.voice_client = None
+        self.queue = deque()
+        # 最近播放過的歌曲（保留已解析的資料），超過上限時自動丟棄最舊的
+        self.history = deque(maxlen=history_size)
+        self.current = None
+        self.loop = False
+        self.ctx = None  # 控制面板上下文
+        self.control_message = None  # 控制面板訊息
+        self.advancing = False  # 正在準備下一首歌
+        # 預先啟動的下一首音頻源 (歌曲, 音頻源, 是否為本機快取) 與負責準備它的任務
+        self.prepared = None
+        self.prepare_task = None
+        self.ended_at = None  # 上一首歌結束的時間，用來計算歌曲之間的空白
+        # 從快照恢復時 (歌曲, 秒數)：這首歌開始播放時從該位置接著播
+        self.resume_at = None
+        # (指令名稱, 時間)：等待送出第一個音框的 $$play/$$playlist，用來計算開始播放的延遲
+        self.audio_requested = None
+
+        self.started_at = None
+        self.paused_at = None
+        self.duration = 0
+        # 每次影響控制面板顯示的改變都會遞增，用來判斷面板是否需要重繪
+        self.version = 0
+
+    def is_connected(self):
+        return self.voice_client is not None and self.voice_client.is_connected()
+
+    def is_busy(self):
+        """正在播放、暫停中或正在切換歌曲"""
+        vc = self.voice_client
+        return self.advancing or (vc is not None and (vc.is_playing() or vc.is_paused()))
+
+    def enqueue(self, track):
+        self.queue.append(track)
+        self.version += 1
+
+    def set_loop(self, enabled):
+        self.loop = enabled
+        self.version += 1
+
+    def next_track(self):
+        """取出下一首歌；循環模式時重複目前的歌曲，否則把目前的歌曲記錄到歷史"""
+        self.version += 1
+        if self.current is not None:
+            if self.loop:
+                self.queue.appendleft(self.current)
+            else:
+                self.history.append(self.current)
+        if not self.queue:
+            return None
+        return self.queue.popleft()
+
+    def peek_next(self):
+        """下一首會播放的歌曲（不從隊列取出）"""
+        if self.loop and self.current is not None:
+            return self.current
+        return self.queue[0] if self.queue else None
+
+    def upcoming(self, count):
+        """接下來的幾首歌，不複製整個隊列"""
+        queue = self.queue
+        return [queue[i] for i in range(min(count, len(queue)))]
+
+    def rewind(self):
+        """把上一首歌放回隊列最前面（目前的歌曲排在它後面），沒有歷史時回傳None"""
+        if not self.history:
+            return None
+        previous = self.history.pop()
+        self.version += 1
+        if self.current is not None:
+            self.queue.appendleft(self.current)
+            # 目前的歌曲已經放回隊列，不應再被記錄到歷史
+            self.current = None
+        self.queue.appendleft(previous)
+        return previous
+
+    def history_bytes(self):
+        """播放歷史估計佔用的記憶體（位元組）"""
+        return sys.getsizeof(self.history) + sum(track.size() for track in self.history)
+
+    def shuffle(self):
+        tracks = list(self.queue)
+        random.shuffle(tracks)
+        self.queue = deque(tracks)
+        self.version += 1
+
+    def clear(self):
+        self.queue.clear()
+        self.version += 1
+
+    def start_track(self, track, offset=0):
+        """記錄新歌曲開始播放，offset 是從歌曲的第幾秒開始"""
+        self.current = track
+        self.duration = track.duration or 0
+        self.started_at = time.monotonic() - offset
+        self.paused_at = None
+        self.version += 1
+
+    def reset_track(self):
+        self.current = None
+        self.duration = 0
+        self.started_at = None
+        self.paused_at = None
+        self.version += 1
+
+    def mark_paused(self):
+        if self.started_at is not None and self.paused_at is None:
+            self.paused_at = time.monotonic()
+            self.version += 1
+
+    def mark_resumed(self):
+        if self.paused_at is not None:
+            # 暫停的時間不算進播放進度
+            self.started_at += time.monotonic() - self.paused_at
+            self.paused_at = None
+            self.version += 1
+
+    def elapsed(self):
+        """目前歌曲已播放的秒數"""
+        if self.started_at is None:
+            return None
+        now = self.paused_at if self.paused_at is not None else time.monotonic()
+        return now - self.started_at
+
+    def remaining(self):
+        """目前歌曲剩餘的秒數，無法得知時回傳None"""
+        elapsed = self.elapsed()
+        if elapsed is None or not self.duration:
+            return None
+        return max(0.0, self.duration - elapsed)
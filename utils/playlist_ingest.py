@@ -0,0 +1,181 @@
+import asyncio
+import math
+import os
+import time
+
+from utils.extractor import ExtractionCancelled
+
+
+class IngestProgress:
+    """一次播放清單匯入的進度"""
+    __slots__ = ('is_playlist', 'title', 'seen', 'added', 'failed', 'done', 'cancelled', 'timed_out', 'started_at')
+
+    def __init__(self):
+        self.is_playlist = None
+        self.title = None
+        self.seen = 0
+        self.added = 0
+        self.failed = 0
+        self.done = False
+        self.cancelled = False
+        self.timed_out = False  # 翻頁太久沒有新項目而放棄，已讀到的項目仍會加入
+        self.started_at = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+
+class PlaylistIngestor:
+    """串流式播放清單匯入：邊翻頁邊處理，並行解析但依清單順序加入隊列
+
+    build(entry, owner) 把扁平解析的項目轉成歌曲資料（失敗回傳None），
+    commit(owner, song) 把歌曲加入隊列。
+    """
+
+    def __init__(self, extractor, build, commit, workers=None, progress_interval=None, timeout=None):
+        self.extractor = extractor
+        self.build = build
+        self.commit = commit
+        self.workers = workers or int(os.getenv('PLAYLIST_WORKERS', '4'))
+        # 進度訊息最短的編輯間隔（秒）
+        self.progress_interval = progress_interval if progress_interval is not None else float(os.getenv('PLAYLIST_PROGRESS_INTERVAL', '2'))
+        # 翻頁時多久沒有讀到新項目就放棄（大型播放清單只要持續有進度就不會被中斷）
+        self.timeout = timeout or float(os.getenv('PLAYLIST_TIMEOUT', '300'))
+        self._active = {}
+
+    def cancel(self, owner):
+        """停止某個擁有者所有進行中的匯入"""
+        for progress in self._active.pop(owner, ()):
+            progress.cancelled = True
+
+    async def ingest(self, url, *, opts=None, owner=None, on_first=None, on_progress=None):
+        """匯入播放清單，第一首歌加入隊列後立即呼叫 on_first，過程中節流呼叫 on_progress"""
+        loop = asyncio.get_running_loop()
+        progress = IngestProgress()
+        entries = asyncio.Queue()
+        results = {}
+        state = {'next': 0, 'first_done': False, 'last_report': 0.0, 'reporting': False,
+                 'last_entry': time.monotonic()}
+        self._active.setdefault(owner, set()).add(progress)
+
+        def produce(ytdl, cancel_event):
+            # 在工作執行緒中逐頁讀取播放清單，每個項目一出現就交給事件迴圈
+            info = ytdl.extract_info(url, download=False, process=False)
+            for _ in range(3):
+                if not info or info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                info = ytdl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+
+            if not info or 'entries' not in info:
+                return False
+
+            progress.is_playlist = True
+            progress.title = info.get('title')
+            index = 0
+            for entry in info['entries']:
+                state['last_entry'] = time.monotonic()
+                if cancel_event.is_set() or progress.cancelled:
+                    break
+                if entry is None:
+                    continue
+                loop.call_soon_threadsafe(entries.put_nowait, (index, entry))
+                index += 1
+            return True
+
+        async def report(force=False):
+            if on_progress is None or state['reporting']:
+                return
+            now = time.monotonic()
+            if not force and now - state['last_report'] < self.progress_interval:
+                return
+            state['reporting'] = True
+            state['last_report'] = now
+            try:
+                await on_progress(progress)
+            except Exception as e:
+                print(f"更新播放清單進度時發生錯誤: {e}")
+            finally:
+                state['reporting'] = False
+
+        async def drain():
+            # 只依清單順序提交：前面的項目還沒完成時，後面的結果先留在緩衝區
+            committed_first = False
+            while state['next'] in results:
+                song = results.pop(state['next'])
+                state['next'] += 1
+                if progress.cancelled:
+                    continue
+                if song is None:
+                    progress.failed += 1
+                    continue
+                self.commit(owner, song)
+                progress.added += 1
+                if not state['first_done']:
+                    state['first_done'] = committed_first = True
+
+            if committed_first and on_first is not None:
+                await on_first()
+            await report()
+
+        async def worker():
+            while True:
+                item = await entries.get()
+                if item is None:
+                    return
+                index, entry = item
+                progress.seen += 1
+                song = None
+                if not progress.cancelled:
+                    try:
+                        song = await self.build(entry, owner)
+                    except ExtractionCancelled:
+                        progress.cancelled = True
+                    except Exception as e:
+                        print(f"處理播放清單項目時發生錯誤: {e}")
+                results[index] = song
+                await drain()
+
+        async def watchdog(producer):
+            # 只在翻頁停滯時放棄，不限制整個匯入的時間
+            while not producer.done():
+                idle = time.monotonic() - state['last_entry']
+                if idle >= self.timeout:
+                    progress.timed_out = True
+                    producer.cancel()
+                    return
+                await asyncio.wait({producer}, timeout=self.timeout - idle)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        producer = asyncio.create_task(self.extractor.run(
+            produce, opts=opts, timeout=math.inf, owner=owner, kind='playlist_flat'
+        ))
+        stalled = asyncio.create_task(watchdog(producer))
+        try:
+            try:
+                progress.is_playlist = await producer
+            except ExtractionCancelled:
+                progress.cancelled = True
+            except asyncio.CancelledError:
+                if not progress.timed_out:
+                    raise
+                print(f"播放清單已 {self.timeout:g} 秒沒有新項目，保留已讀到的 {progress.seen} 首")
+            finally:
+                # 等翻頁結束後，讓每個工作者在處理完剩餘項目後結束
+                for _ in workers:
+                    entries.put_nowait(None)
+            await asyncio.gather(*workers)
+        finally:
+            producer.cancel()
+            stalled.cancel()
+            for task in workers:
+                task.cancel()
+            active = self._active.get(owner)
+            if active is not None:
+                active.discard(progress)
+                if not active:
+                    del self._active[owner]
+
+        progress.done = True
+        await report(force=True)
+        return progress
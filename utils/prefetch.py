@@ -0,0 +1,58 @@
+import asyncio
+import os
+
+from utils.extractor import ExtractionCancelled
+
+
+class StreamPrefetcher:
+    """在目前歌曲快結束前，預先解析接下來幾首歌的串流URL
+
+    upcoming(guild_id, count) 回傳即將播放的歌曲，
+    resolve(song, guild_id) 負責替歌曲取得可用的串流URL。
+    """
+
+    def __init__(self, upcoming, resolve, count=None, window=None):
+        self.upcoming = upcoming
+        self.resolve = resolve
+        # 預先解析的歌曲數量
+        self.count = count if count is not None else int(os.getenv('MUSIC_PREFETCH_COUNT', '2'))
+        # 在歌曲結束前幾秒開始解析
+        self.window = window if window is not None else float(os.getenv('MUSIC_PREFETCH_WINDOW', '30'))
+        self._tasks = {}
+
+    def schedule(self, guild_id, remaining=None):
+        """安排在剩餘時間只剩 window 秒時預先解析，remaining 未知時立即解析"""
+        if self.count <= 0:
+            return
+
+        self.cancel(guild_id)
+        delay = max(0.0, remaining - self.window) if remaining else 0.0
+        self._tasks[guild_id] = asyncio.create_task(self._run(guild_id, delay))
+
+    async def _run(self, guild_id, delay):
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            # 在觸發時才讀取隊列，期間的新增、跳過或隨機排序都會反映出來
+            for song in self.upcoming(guild_id, self.count):
+                try:
+                    await self.resolve(song, guild_id)
+                except ExtractionCancelled:
+                    return
+                except Exception as e:
+                    # 預先解析失敗不影響播放，輪到這首歌時會再即時解析一次
+                    print(f"預先解析 {song.title or '未知歌曲'} 失敗: {e}")
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if self._tasks.get(guild_id) is asyncio.current_task():
+                del self._tasks[guild_id]
+
+    def cancel(self, guild_id):
+        task = self._tasks.pop(guild_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+
+    def shutdown(self):
+        for guild_id in list(self._tasks):
+            self.cancel(guild_id)
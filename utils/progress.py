@@ -0,0 +1,113 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+
+
+class ProgressScheduler:
+    """所有伺服器共用的控制面板進度更新排程
+
+    只有一個背景任務，依序輪流更新正在播放的控制面板：
+    面板越多，間隔越長，讓每秒的編輯次數不超過 budget；
+    編輯變慢（遇到速率限制）時會自動放慢，恢復後再加快。
+    暫停、閒置或已離開的伺服器會自動停止更新。
+
+    refresh(guild_id) 負責重繪面板，is_active(guild_id) 判斷是否還需要更新。
+    """
+
+    def __init__(self, refresh, is_active, interval=None, max_interval=None, budget=None, batch_size=5):
+        self.refresh = refresh
+        self.is_active = is_active
+        # 只有少數面板時的更新間隔（秒）
+        self.interval = interval or float(os.getenv('MUSIC_PROGRESS_INTERVAL', '10'))
+        self.max_interval = max_interval or float(os.getenv('MUSIC_PROGRESS_MAX_INTERVAL', '60'))
+        # 所有進度更新加起來每秒最多幾次編輯
+        self.budget = budget or float(os.getenv('MUSIC_PROGRESS_BUDGET', '2'))
+        self.batch_size = batch_size
+        self._guilds = deque()
+        self._watching = set()
+        self._wakeup = None
+        self._task = None
+        self.backoff = 1.0
+        self.stats = {
+            'ticks': 0,
+            'refreshes': 0,
+            'dropped': 0,
+        }
+
+    def watch(self, guild_id):
+        """開始（或繼續）自動更新某個伺服器的控制面板"""
+        if guild_id not in self._watching:
+            self._watching.add(guild_id)
+            self._guilds.append(guild_id)
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def unwatch(self, guild_id):
+        if guild_id in self._watching:
+            self._watching.discard(guild_id)
+            self._guilds.remove(guild_id)
+
+    def active_count(self):
+        return len(self._guilds)
+
+    def current_interval(self):
+        """依面板數量與速率限制狀況計算目前的更新間隔"""
+        interval = max(self.interval, len(self._guilds) / self.budget) * self.backoff
+        return min(interval, self.max_interval)
+
+    async def _run(self):
+        while True:
+            if not self._guilds:
+                # 沒有需要更新的面板時不佔用任何資源，直到下一次 watch
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            interval = self.current_interval()
+            try:
+                await asyncio.sleep(interval)
+                await self._tick(interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"更新播放進度時發生錯誤: {e}")
+
+    async def _tick(self, interval):
+        self.stats['ticks'] += 1
+        # 這一輪最多更新的面板數；超過時下一輪從沒輪到的面板開始
+        limit = max(1, min(len(self._guilds), math.ceil(self.budget * interval)))
+        due = []
+        for _ in range(limit):
+            if not self._guilds:
+                break
+            guild_id = self._guilds.popleft()
+            if not self.is_active(guild_id):
+                self._watching.discard(guild_id)
+                self.stats['dropped'] += 1
+                continue
+            self._guilds.append(guild_id)
+            due.append(guild_id)
+
+        started = time.monotonic()
+        for i in range(0, len(due), self.batch_size):
+            batch = due[i:i + self.batch_size]
+            await asyncio.gather(*(self.refresh(guild_id) for guild_id in batch), return_exceptions=True)
+            self.stats['refreshes'] += len(batch)
+
+        # 編輯被速率限制拖慢時放慢節奏，順利時逐步恢復
+        expected = len(due) / self.budget
+        if due and time.monotonic() - started > max(1.0, expected * 2):
+            self.backoff = min(self.backoff * 2, 8.0)
+        else:
+            self.backoff = max(1.0, self.backoff * 0.75)
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._guilds.clear()
+        self._watching.clear()
@@ -0,0 +1,168 @@
+import asyncio
+import bisect
+import os
+from datetime import datetime, timedelta
+
+import pytz
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def minute_of_week(local):
+    """當地時間在一週中的第幾分鐘（星期一 00:00 為 0）"""
+    return local.weekday() * MINUTES_PER_DAY + local.hour * 60 + local.minute
+
+
+class ScheduleEntry:
+    """一個排程：在 times 列出的當地時間觸發
+
+    times 是 (時, 分) 的列表，days 是觸發的星期（0 為星期一），None 表示每天。
+    data 是觸發時交給回呼的資料。
+    """
+    __slots__ = ('name', 'times', 'days', 'data')
+
+    def __init__(self, name, times, days=None, data=None):
+        self.name = name
+        self.times = sorted(times)
+        self.days = None if days is None else frozenset(days)
+        self.data = data
+
+    def slots(self):
+        for day in range(7) if self.days is None else sorted(self.days):
+            for hour, minute in self.times:
+                yield day * MINUTES_PER_DAY + hour * 60 + minute
+
+
+class WeeklyIndex:
+    """把所有排程預先編成「一週中的第幾分鐘 -> 觸發的排程」索引
+
+    查詢某一分鐘要觸發哪些排程是 O(1)，找下一次觸發時間是 O(log n)。
+    """
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+        slots = {}
+        for entry in self.entries:
+            for slot in entry.slots():
+                slots.setdefault(slot, []).append(entry)
+        self.slots = {slot: tuple(entries) for slot, entries in slots.items()}
+        self.keys = sorted(self.slots)
+
+    def at(self, local):
+        return self.slots.get(minute_of_week(local), ())
+
+    def next_after(self, local):
+        """local（不含時區的當地時間）之後下一個有排程的分鐘，沒有排程時回傳None"""
+        if not self.keys:
+            return None
+        current = minute_of_week(local)
+        i = bisect.bisect_right(self.keys, current)
+        slot = self.keys[i] if i < len(self.keys) else self.keys[0] + MINUTES_PER_WEEK
+        start = local.replace(second=0, microsecond=0) - timedelta(minutes=current)
+        return start + timedelta(minutes=slot)
+
+
+class ScheduleEngine:
+    """睡到索引中最近的下一次觸發時間，醒來時逐分鐘處理錯過的排程
+
+    以當地時間逐分鐘前進：日光節約時間往前跳過的分鐘仍會補上，
+    往回撥而重複的分鐘不會觸發第二次。延遲超過 catch_up 秒的觸發視為過期而略過。
+    可以隨時用 replace() 換上新的索引，不需要重新啟動，也不會漏掉尚未處理的觸發。
+
+    fire(entry, local_time) 在觸發時被呼叫。
+    resume 是上一個引擎最後處理的分鐘（last），重新載入時從這裡接續，同一分鐘不會發出兩次；
+    沒有 resume 時，只有在一分鐘開始後 start_grace 秒內啟動才會處理這一分鐘。
+    """
+
+    def __init__(self, index, timezone, fire, catch_up=None, max_sleep=300, resume=None, start_grace=None):
+        self.index = index
+        self.timezone = pytz.timezone(timezone) if isinstance(timezone, str) else timezone
+        self.fire = fire
+        self.catch_up = catch_up if catch_up is not None else float(os.getenv('SCHEDULE_CATCHUP_SECONDS', '300'))
+        self.start_grace = start_grace if start_grace is not None else float(os.getenv('SCHEDULE_START_GRACE', '5'))
+        # 最後一個已處理的當地分鐘
+        self.last = resume
+        # 單次最長睡眠，讓系統時間被調整時也能及時修正
+        self.max_sleep = max_sleep
+        self._wakeup = asyncio.Event()
+        self.stats = {
+            'fired': 0,
+            'late': 0,
+            'skipped': 0,
+        }
+
+    def replace(self, index, timezone=None):
+        """換上新的排程索引（一次替換），並讓引擎重新計算下一次觸發時間"""
+        if timezone is not None:
+            self.timezone = pytz.timezone(timezone) if isinstance(timezone, str) else timezone
+        self.index = index
+        self._wakeup.set()
+
+    def local_now(self):
+        """目前的當地時間（不含時區）"""
+        return datetime.now(pytz.utc).astimezone(self.timezone).replace(tzinfo=None)
+
+    def to_utc(self, local):
+        try:
+            aware = self.timezone.localize(local, is_dst=None)
+        except pytz.NonExistentTimeError:
+            aware = self.timezone.normalize(self.timezone.localize(local, is_dst=False))
+        except pytz.AmbiguousTimeError:
+            aware = self.timezone.localize(local, is_dst=True)
+        return aware.astimezone(pytz.utc)
+
+    def next_occurrence(self):
+        """下一次觸發的 (當地時間, 排程列表)，沒有排程時回傳None"""
+        index = self.index
+        local = index.next_after(self.local_now())
+        return None if local is None else (local, index.slots[minute_of_week(local)])
+
+    async def _fire_minute(self, local):
+        entries = self.index.at(local)
+        if not entries:
+            return
+        # 以實際經過的時間計算延遲（日光節約時間跳過的分鐘會換算成跳躍後的時刻）
+        late = (datetime.now(pytz.utc) - self.to_utc(local)).total_seconds()
+        for entry in entries:
+            if late > self.catch_up:
+                self.stats['skipped'] += 1
+                print(f"略過過期的排程 {entry.name} {local:%Y-%m-%d %H:%M}（延遲 {late:.0f} 秒）")
+                continue
+            if late > 5:
+                self.stats['late'] += 1
+                print(f"補發延遲的排程 {entry.name} {local:%Y-%m-%d %H:%M}（延遲 {late:.0f} 秒）")
+            try:
+                await self.fire(entry, local)
+                self.stats['fired'] += 1
+            except Exception as e:
+                print(f"執行排程 {entry.name} 時發生錯誤: {e}")
+
+    async def run(self):
+        if self.last is None:
+            now = self.local_now()
+            self.last = now.replace(second=0, microsecond=0)
+            if (now - self.last).total_seconds() <= self.start_grace:
+                # 剛跨過分鐘邊界就啟動：這一分鐘的排程還沒有發出
+                self.last -= timedelta(minutes=1)
+        while True:
+            now = self.local_now()
+            minute = self.last + timedelta(minutes=1)
+            if now - minute > timedelta(days=7):
+                # 停頓太久，一週以前的分鐘都已經過期
+                minute = now.replace(second=0, microsecond=0) - timedelta(days=7)
+            while minute <= now:
+                await self._fire_minute(minute)
+                self.last = minute
+                minute += timedelta(minutes=1)
+
+            self._wakeup.clear()
+            upcoming = self.index.next_after(self.last)
+            if upcoming is None:
+                delay = self.max_sleep
+            else:
+                delay = (self.to_utc(upcoming) - datetime.now(pytz.utc)).total_seconds()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), min(max(delay, 0), self.max_sleep))
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils.player import Track
+
+# 播放中的伺服器即使隊列沒有改變，也每隔這麼久更新一次播放位置，當機時最多只會倒退這麼多
+POSITION_REFRESH = 30
+
+
+def pack_track(track):
+    """只保存影片ID與長期有效的歌曲資訊，不保存會過期的串流URL"""
+    return [track.id, track.title, track.duration, track.thumbnail]
+
+
+def unpack_track(data):
+    video_id, title, duration, thumbnail = data
+    return Track(
+        id=video_id, title=title, duration=duration,
+        webpage_url=f"https://www.youtube.com/watch?v={video_id}", thumbnail=thumbnail
+    )
+
+
+class SavedSession:
+    """從快照讀回的伺服器播放狀態"""
+    __slots__ = ('guild_id', 'voice_channel_id', 'text_channel_id', 'current', 'offset', 'loop', 'queue')
+
+    def __init__(self, guild_id, voice_channel_id, text_channel_id, data, position=0.0):
+        self.guild_id = guild_id
+        self.voice_channel_id = voice_channel_id
+        self.text_channel_id = text_channel_id
+        self.current = unpack_track(data['current']) if data.get('current') else None
+        # 舊版快照把播放位置存在 data 中
+        self.offset = position or data.get('offset') or 0.0
+        self.loop = data.get('loop', False)
+        self.queue = [unpack_track(item) for item in data.get('queue', ())]
+
+
+class SessionStore:
+    """把每個伺服器的隊列、目前歌曲、播放位置與循環模式存到 SQLite，重新啟動後接著播放
+
+    - 每個伺服器一列；改變只標記為待寫入，每 flush_interval 秒在一個交易中寫入所有有變動的伺服器，
+      連續加入大量歌曲（例如匯入播放清單）只會寫入幾次
+    - 以 GuildPlayer.version 判斷是否有變動，不需要在每個修改隊列的地方通知；
+      隊列沒有變動時只用 UPDATE 更新 position 欄位的播放位置，不重新序列化整個隊列
+    - 定期寫入在執行緒中進行，不阻塞事件迴圈
+    - 啟動時只讀取輕量的索引（伺服器與頻道ID），隊列內容等到真正需要時才讀取
+    """
+
+    def __init__(self, db_path=None, flush_interval=None):
+        db_path = db_path if db_path is not None else os.getenv('MUSIC_SESSION_DB', '')
+        self.flush_interval = flush_interval or float(os.getenv('MUSIC_SESSION_FLUSH', '5'))
+        self._saved = {}  # guild_id -> (已寫入的版本, 寫入時間)
+        self._text_channels = {}
+        self._deleted = set()
+        self._task = None
+        # 連線會在寫入執行緒與事件迴圈之間共用，每次使用都要持有這個鎖
+        self._lock = threading.Lock()
+        self.stats = {
+            'flushes': 0,
+            'rows_written': 0,
+            'positions_written': 0,
+            'restored': 0,
+        }
+
+        self._db = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS sessions (guild_id INTEGER PRIMARY KEY, voice_channel_id INTEGER, '
+                    'text_channel_id INTEGER, playing INTEGER, data TEXT NOT NULL, updated_at REAL, '
+                    'position REAL NOT NULL DEFAULT 0)'
+                )
+                columns = {row[1] for row in self._db.execute('PRAGMA table_info(sessions)')}
+                if 'position' not in columns:
+                    # 舊版資料庫：播放位置原本存在 data 中
+                    self._db.execute('ALTER TABLE sessions ADD COLUMN position REAL NOT NULL DEFAULT 0')
+                self._db.commit()
+                print(f"播放狀態快照資料庫: {db_path}")
+            except sqlite3.Error as e:
+                print(f"無法開啟播放狀態資料庫 {db_path}: {e}")
+                self._db = None
+
+    @property
+    def enabled(self):
+        return self._db is not None
+
+    def __len__(self):
+        with self._lock:
+            if self._db is None:
+                return 0
+            return self._db.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+    def index(self):
+        """所有快照的 (伺服器ID, 語音頻道ID, 文字頻道ID, 是否正在播放)，最近更新的在前"""
+        with self._lock:
+            if self._db is None:
+                return []
+            return self._db.execute(
+                'SELECT guild_id, voice_channel_id, text_channel_id, playing FROM sessions ORDER BY updated_at DESC'
+            ).fetchall()
+
+    def load(self, guild_id):
+        """讀取伺服器的快照，沒有時回傳None"""
+        if guild_id in self._deleted:
+            return None
+        with self._lock:
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                'SELECT voice_channel_id, text_channel_id, data, position FROM sessions WHERE guild_id = ?', (guild_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            session = SavedSession(guild_id, row[0], row[1], json.loads(row[2]), row[3])
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"無法讀取伺服器 {guild_id} 的播放狀態: {e}")
+            return None
+        if session.text_channel_id:
+            self._text_channels[guild_id] = session.text_channel_id
+        self.stats['restored'] += 1
+        return session
+
+    def discard(self, guild_id):
+        """伺服器已停止播放（離開語音頻道），下次寫入時刪除它的快照"""
+        if self._db is None:
+            return
+        self._saved.pop(guild_id, None)
+        self._text_channels.pop(guild_id, None)
+        self._deleted.add(guild_id)
+
+    def capture(self, player):
+        """把播放器目前的狀態轉成 (語音頻道ID, 文字頻道ID, 是否正在播放, 資料, 播放位置)
+
+        暫停中的伺服器不算正在播放：重新啟動後不會自動恢復，等有人使用音樂指令時才從中斷的位置繼續。
+        """
+        vc = player.voice_client
+        voice_channel_id = vc.channel.id if vc is not None and vc.channel is not None else None
+        if player.ctx is not None:
+            self._text_channels[player.guild_id] = player.ctx.channel.id
+        current = player.current if player.current is not None and player.current.id else None
+        data = {
+            'loop': player.loop,
+            'current': pack_track(current) if current else None,
+            'queue': [pack_track(track) for track in player.queue if track.id],
+        }
+        playing = current is not None and player.paused_at is None
+        return voice_channel_id, self._text_channels.get(player.guild_id), playing, data, self.position(player)
+
+    @staticmethod
+    def position(player):
+        if player.current is None or not player.current.id:
+            return 0.0
+        return round(player.elapsed() or 0.0, 1)
+
+    def _collect(self, players, force):
+        """找出要寫入的資料：(完整寫入的列, 只更新播放位置的列, 要刪除的伺服器)，沒有要寫入時回傳None
+
+        force 時完整寫入所有伺服器（關閉前呼叫，保存最新的播放位置）。
+        """
+        now = time.monotonic()
+        rows = []
+        positions = []
+        for guild_id, player in list(players.items()):
+            saved = self._saved.get(guild_id)
+            if not force and saved is not None and saved[0] == player.version:
+                # 隊列沒有變動：播放中的伺服器每 POSITION_REFRESH 秒只更新一次播放位置
+                if player.current is not None and player.paused_at is None \
+                        and now - saved[1] >= POSITION_REFRESH:
+                    self._saved[guild_id] = (player.version, now)
+                    positions.append((self.position(player), time.time(), guild_id))
+                continue
+            self._saved[guild_id] = (player.version, now)
+            if not player.queue and player.current is None:
+                # 沒有任何歌曲時不需要快照
+                self._deleted.add(guild_id)
+                continue
+            voice_channel_id, text_channel_id, playing, data, position = self.capture(player)
+            rows.append((
+                guild_id, voice_channel_id, text_channel_id, int(playing),
+                json.dumps(data, ensure_ascii=False, separators=(',', ':')), time.time(), position
+            ))
+            self._deleted.discard(guild_id)
+
+        if not rows and not positions and not self._deleted:
+            return None
+        return rows, positions, tuple(self._deleted)
+
+    def _write(self, rows, positions, deleted):
+        """在一個交易中寫入（可在執行緒中執行），成功時回傳True"""
+        with self._lock:
+            if self._db is None:
+                # 寫入排隊時資料庫已經關閉，關閉前已經完整寫入過所有伺服器
+                return False
+            try:
+                with self._db:
+                    if rows:
+                        self._db.executemany(
+                            'INSERT OR REPLACE INTO sessions (guild_id, voice_channel_id, text_channel_id, playing, '
+                            'data, updated_at, position) VALUES (?, ?, ?, ?, ?, ?, ?)', rows
+                        )
+                    if positions:
+                        self._db.executemany(
+                            'UPDATE sessions SET position = ?, updated_at = ? WHERE guild_id = ?', positions
+                        )
+                    if deleted:
+                        self._db.executemany('DELETE FROM sessions WHERE guild_id = ?', [(g,) for g in deleted])
+            except sqlite3.Error as e:
+                print(f"寫入播放狀態時發生錯誤: {e}")
+                return False
+        return True
+
+    def _finish(self, batch, ok):
+        rows, positions, deleted = batch
+        if not ok:
+            # 下次重新完整寫入這些伺服器
+            for row in rows:
+                self._saved.pop(row[0], None)
+            for row in positions:
+                self._saved.pop(row[-1], None)
+            return
+        self._deleted.difference_update(deleted)
+        self.stats['flushes'] += 1
+        self.stats['rows_written'] += len(rows)
+        self.stats['positions_written'] += len(positions)
+
+    def flush(self, players, force=False):
+        """在目前的執行緒中寫入所有有變動的伺服器；force 時寫入全部"""
+        if self._db is None:
+            return
+        batch = self._collect(players, force)
+        if batch is not None:
+            self._finish(batch, self._write(*batch))
+
+    async def flush_async(self, players):
+        """與 flush 相同，但在執行緒中寫入資料庫"""
+        if self._db is None:
+            return
+        batch = self._collect(players, False)
+        if batch is not None:
+            ok = await asyncio.get_running_loop().run_in_executor(None, self._write, *batch)
+            self._finish(batch, ok)
+
+    def start(self, players):
+        """開始定期寫入 players（伺服器ID -> GuildPlayer）的變動"""
+        if self._db is not None and self._task is None:
+            self._task = asyncio.create_task(self._run(players))
+
+    async def _run(self, players):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_async(players)
+
+    def shutdown(self, players):
+        """停止定期寫入，保存所有伺服器的最新狀態並關閉資料庫"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._db is not None:
+            self.flush(players, force=True)
+            with self._lock:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,83 @@
+import asyncio
+
+from utils.extractor import ExtractionCancelled
+
+
+class _Flight:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = {}
+
+
+class SingleFlight:
+    """讓相同鍵的並行請求共用同一次執行
+
+    第一個請求會建立共用任務，之後相同鍵的請求只等待它的結果；
+    失敗會傳給所有等待者。取消某個擁有者只會讓它自己的等待結束，
+    只有在沒有任何等待者時才會取消共用任務。
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self.stats = {
+            'calls': 0,
+            'executions': 0,
+            'coalesced': 0,
+            'failures': 0,
+        }
+
+    def _finish(self, key, flight, task):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+        if task.cancelled():
+            error = ExtractionCancelled("解析已取消")
+        else:
+            error = task.exception()
+        if error is not None:
+            self.stats['failures'] += 1
+
+        for waiter in flight.waiters:
+            if waiter.done():
+                continue
+            if error is not None:
+                waiter.set_exception(error)
+            else:
+                waiter.set_result(task.result())
+
+    async def do(self, key, factory, owner=None):
+        """執行 factory() 或加入相同鍵正在進行的執行，並回傳結果"""
+        self.stats['calls'] += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            self.stats['executions'] += 1
+            flight = _Flight(asyncio.create_task(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task, key=key, flight=flight: self._finish(key, flight, task))
+        else:
+            self.stats['coalesced'] += 1
+
+        waiter = asyncio.get_running_loop().create_future()
+        flight.waiters[waiter] = owner
+        try:
+            return await waiter
+        finally:
+            flight.waiters.pop(waiter, None)
+            if not flight.waiters and not flight.task.done():
+                # 已經沒有人需要這個結果
+                flight.task.cancel()
+
+    def cancel(self, owner):
+        """結束某個擁有者所有的等待，回傳結束的數量"""
+        count = 0
+        for flight in list(self._flights.values()):
+            for waiter, waiter_owner in list(flight.waiters.items()):
+                if waiter_owner == owner and not waiter.done():
+                    waiter.set_exception(ExtractionCancelled("解析已取消"))
+                    count += 1
+        return count
+
+    def in_flight(self):
+        return len(self._flights)
@@ -0,0 +1,273 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class _CachedTrack:
+    __slots__ = ('size', 'last_used', 'plays')
+
+    def __init__(self, size, last_used, plays=0):
+        self.size = size
+        self.last_used = last_used
+        self.plays = plays
+
+
+class TrackCache:
+    """常播歌曲的本機 Opus 檔案快取
+
+    歌曲播放次數達到門檻後，會在播放期間於背景用 FFmpeg 把串流存成 Ogg/Opus 檔，
+    之後播放同一首歌時直接讀取本機檔案，不必再解析與下載。
+    總大小超過上限時依 LRU（最久未播放）或 LFU（最少播放）淘汰。
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, directory=None, max_bytes=None, policy=None, min_plays=None, executable='ffmpeg', max_fills=1):
+        directory = directory if directory is not None else os.getenv('MUSIC_DISK_CACHE_DIR', '')
+        self.directory = directory or None
+        self.max_bytes = max_bytes or int(float(os.getenv('MUSIC_DISK_CACHE_MB', '1024')) * 1024 * 1024)
+        self.policy = (policy or os.getenv('MUSIC_DISK_CACHE_POLICY', 'lru')).lower()
+        if self.policy not in ('lru', 'lfu'):
+            print(f"未知的快取淘汰策略 {self.policy}，改用 lru")
+            self.policy = 'lru'
+        # 播放幾次後才存到本機，避免只播一次的歌曲佔用空間
+        self.min_plays = min_plays if min_plays is not None else int(os.getenv('MUSIC_DISK_CACHE_MIN_PLAYS', '2'))
+        self.executable = executable
+        self.max_fills = max_fills
+
+        self._entries = {}
+        self._plays = OrderedDict()  # 尚未存到本機的歌曲播放次數
+        self._fills = {}
+        self._fill_slots = None
+        self._index_lock = threading.Lock()
+        self._index_seq = 0  # 最新的索引版本
+        self._index_written = 0  # 已寫入檔案的索引版本
+        self.bytes_cached = 0
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'fills': 0,
+            'fill_failures': 0,
+            'evictions': 0,
+            'bytes_saved': 0,
+        }
+
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                self._load()
+                print(f"本機歌曲快取: {self.directory}（{len(self._entries)} 首，{self.bytes_cached / 1024 / 1024:.1f} MB）")
+            except OSError as e:
+                print(f"無法使用本機歌曲快取 {self.directory}: {e}")
+                self.directory = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def _path(self, video_id):
+        return os.path.join(self.directory, f"{video_id}.ogg")
+
+    def _load(self):
+        """從目錄內容重建索引，播放次數從索引檔讀回"""
+        try:
+            with open(os.path.join(self.directory, self.INDEX_FILE), encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.part'):
+                # 上次未完成的寫入
+                os.remove(path)
+                continue
+            if not name.endswith('.ogg'):
+                continue
+            video_id = name[:-4]
+            stat = os.stat(path)
+            plays, last_used = saved.get(video_id, (0, stat.st_mtime))
+            self._entries[video_id] = _CachedTrack(stat.st_size, last_used, plays)
+            self.bytes_cached += stat.st_size
+        self._remove_all(self._evict())
+
+    def _index_snapshot(self):
+        self._index_seq += 1
+        data = {video_id: (entry.plays, entry.last_used) for video_id, entry in self._entries.items()}
+        return data, self._index_seq
+
+    def _write_index(self, data, seq):
+        """在執行緒中寫入索引檔；較舊的版本晚到時不覆蓋較新的"""
+        path = os.path.join(self.directory, self.INDEX_FILE)
+        with self._index_lock:
+            if seq <= self._index_written:
+                return
+            try:
+                with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(path + '.tmp', path)
+                self._index_written = seq
+            except OSError as e:
+                print(f"無法儲存本機歌曲快取索引: {e}")
+
+    async def _save(self):
+        await asyncio.get_running_loop().run_in_executor(None, self._write_index, *self._index_snapshot())
+
+    def peek(self, video_id):
+        """已存到本機時回傳檔案路徑，否則回傳None
+
+        只查記憶體中的索引，不讀取磁碟也不計入命中率，供預先準備音頻源使用
+        （準備好的音頻源可能因為跳過或隨機排序而被丟棄）。
+        """
+        if not self.enabled or not video_id or video_id not in self._entries:
+            return None
+        return self._path(video_id)
+
+    def record_hit(self, video_id):
+        """本機檔案真的被拿來播放時計入命中"""
+        entry = self._entries.get(video_id)
+        if entry is not None:
+            self.stats['hits'] += 1
+            self.stats['bytes_saved'] += entry.size
+
+    async def lookup(self, video_id):
+        """取得要播放的本機檔案路徑並計入命中率，沒有時回傳None"""
+        if not self.enabled or not video_id:
+            return None
+        path = self.peek(video_id)
+        if path is not None and not await asyncio.to_thread(os.path.exists, path):
+            # 檔案被外部刪除
+            entry = self._entries.pop(video_id, None)
+            if entry is not None:
+                self.bytes_cached -= entry.size
+            path = None
+        if path is None:
+            self.stats['misses'] += 1
+            return None
+        self.record_hit(video_id)
+        return path
+
+    def record_play(self, video_id):
+        """記錄一次播放，回傳是否應該在背景存到本機"""
+        if not self.enabled or not video_id:
+            return False
+        entry = self._entries.get(video_id)
+        if entry is not None:
+            entry.plays += 1
+            entry.last_used = time.time()
+            return False
+
+        plays = self._plays.pop(video_id, 0) + 1
+        self._plays[video_id] = plays
+        while len(self._plays) > 4096:
+            self._plays.popitem(last=False)
+        return plays >= self.min_plays and video_id not in self._fills
+
+    def fill(self, video_id, stream_url, acodec=None, duration=0):
+        """在背景把串流存到本機，同一首歌同時只會有一個寫入"""
+        if not self.enabled or video_id in self._fills or video_id in self._entries:
+            return None
+        # 以 128kbps 估計，單首歌不應佔用超過十分之一的空間
+        if duration and duration * 16 * 1024 > self.max_bytes // 10:
+            return None
+        task = asyncio.create_task(self._fill(video_id, stream_url, acodec))
+        self._fills[video_id] = task
+        task.add_done_callback(lambda _: self._fills.pop(video_id, None))
+        return task
+
+    async def _fill(self, video_id, stream_url, acodec):
+        if self._fill_slots is None:
+            self._fill_slots = asyncio.Semaphore(self.max_fills)
+        path = self._path(video_id)
+        temp_path = path + '.part'
+        codec = 'copy' if (acodec or '').startswith('opus') else 'libopus'
+        args = [
+            self.executable, '-nostdin', '-loglevel', 'error',
+            '-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5',
+            '-i', stream_url, '-vn', '-map_metadata', '-1',
+            '-c:a', codec, '-ar', '48000', '-ac', '2',
+        ]
+        if codec == 'libopus':
+            args += ['-b:a', '128k']
+        args += ['-f', 'ogg', '-y', temp_path]
+
+        async with self._fill_slots:
+            process = None
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+                )
+                _, stderr = await process.communicate()
+                if process.returncode != 0:
+                    raise RuntimeError(stderr.decode(errors='replace').strip()[-200:] or f"FFmpeg 結束代碼 {process.returncode}")
+                size = await asyncio.to_thread(self._commit_file, temp_path, path)
+            except asyncio.CancelledError:
+                if process is not None and process.returncode is None:
+                    process.kill()
+                await asyncio.to_thread(self._remove, temp_path)
+                raise
+            except Exception as e:
+                print(f"存到本機歌曲快取時發生錯誤 ({video_id}): {e}")
+                self.stats['fill_failures'] += 1
+                await asyncio.to_thread(self._remove, temp_path)
+                return
+
+        self._entries[video_id] = _CachedTrack(size, time.time(), self._plays.pop(video_id, 0))
+        self.bytes_cached += size
+        self.stats['fills'] += 1
+        evicted = self._evict()
+        if evicted:
+            await asyncio.to_thread(self._remove_all, evicted)
+        await self._save()
+
+    @staticmethod
+    def _commit_file(temp_path, path):
+        os.replace(temp_path, path)
+        return os.path.getsize(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _remove_all(self, paths):
+        for path in paths:
+            self._remove(path)
+
+    def _evict(self):
+        """從索引移除超過上限的歌曲，回傳要刪除的檔案路徑"""
+        if self.bytes_cached <= self.max_bytes:
+            return []
+        if self.policy == 'lfu':
+            key = lambda item: (item[1].plays, item[1].last_used)
+        else:
+            key = lambda item: item[1].last_used
+        # 正在播放的檔案已被 FFmpeg 開啟，刪除不影響播放
+        evicted = []
+        for video_id, entry in sorted(self._entries.items(), key=key):
+            if self.bytes_cached <= self.max_bytes:
+                break
+            del self._entries[video_id]
+            self.bytes_cached -= entry.size
+            self.stats['evictions'] += 1
+            evicted.append(self._path(video_id))
+        return evicted
+
+    def hit_rate(self):
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+
+    def shutdown(self):
+        for task in list(self._fills.values()):
+            task.cancel()
+        if self.enabled:
+            # 卸載時事件迴圈可能已經要結束，直接寫入
+            self._write_index(*self._index_snapshot())